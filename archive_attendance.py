@@ -0,0 +1,13 @@
+import sys
+from main import app, db
+from modules.attendance_archive import archive_attendance_year, refresh_history_view
+
+# Usage: python archive_attendance.py <year> [<year> ...]
+with app.app_context():
+    if len(sys.argv) < 2:
+        refresh_history_view()
+        db.session.commit()
+        print("Attendance history view refreshed.")
+    for year in sys.argv[1:]:
+        moved = archive_attendance_year(int(year))
+        print(f"Archived {moved} attendance rows for {year}.")
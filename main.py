@@ -18,6 +18,7 @@ from modules.models import User, DutyStation, Product, PurchaseOrder, Customer,
 from modules.purchasing_models import PurchaseRequest, ProcurementOrder, Supplier, YearlyPurchasePlan
 from modules.production_models import Machine, ProductionConfig, ProductionRecord
 from modules.admin_activities import admin_activities_bp
+from modules.pagination import load_more_url
 
 try:
     import pandas as pd
@@ -47,6 +48,25 @@ app.config['PRODUCT_UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'ima
 app.config['LETTER_UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads', 'letters')
 app.config['CONTRACT_UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads', 'contracts')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.config['DASHBOARD_SNAPSHOT_TTL'] = int(os.getenv('DASHBOARD_SNAPSHOT_TTL', 60))
+app.config['REPORT_CACHE_SIZE'] = int(os.getenv('REPORT_CACHE_SIZE', 64))
+app.config['CHART_CACHE_SIZE'] = int(os.getenv('CHART_CACHE_SIZE', 128))
+app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+app.config['REPORT_JOB_WORKERS'] = int(os.getenv('REPORT_JOB_WORKERS', 2))
+app.config['REPORT_JOB_RETENTION_HOURS'] = int(os.getenv('REPORT_JOB_RETENTION_HOURS', 24))
+app.config['PDF_WORKERS'] = int(os.getenv('PDF_WORKERS', os.cpu_count() or 1))
+app.config['REPORT_JOB_FOLDER'] = os.getenv('REPORT_JOB_FOLDER', os.path.join(basedir, 'instance', 'report_jobs'))
+app.config['PAGE_SIZE'] = int(os.getenv('PAGE_SIZE', 50))
+app.config['PAGE_COUNT_TTL'] = int(os.getenv('PAGE_COUNT_TTL', 300))
+app.config['MACHINE_READING_TOKEN'] = os.getenv('MACHINE_READING_TOKEN')
+app.config['MACHINE_READING_BATCH_SIZE'] = int(os.getenv('MACHINE_READING_BATCH_SIZE', 500))
+app.config['MACHINE_READING_FLUSH_SECONDS'] = int(os.getenv('MACHINE_READING_FLUSH_SECONDS', 5))
+app.config['MACHINE_READING_PERIOD'] = os.getenv('MACHINE_READING_PERIOD', 'Daily')
+app.config['MACHINE_READING_UOM'] = os.getenv('MACHINE_READING_UOM', 'Pcs')
+app.config['MACHINE_READING_RETENTION_DAYS'] = int(os.getenv('MACHINE_READING_RETENTION_DAYS', 90))
+app.config['PRODUCTION_HOUR_RETENTION_DAYS'] = int(os.getenv('PRODUCTION_HOUR_RETENTION_DAYS', 30))
+app.config['PRODUCTION_DAY_RETENTION_DAYS'] = int(os.getenv('PRODUCTION_DAY_RETENTION_DAYS', 730))
+app.config['PRODUCTION_REFERENCE_TTL'] = int(os.getenv('PRODUCTION_REFERENCE_TTL', 300))
 
 for folder in [app.config['UPLOAD_FOLDER'], app.config['PRODUCT_UPLOAD_FOLDER'], app.config['LETTER_UPLOAD_FOLDER'], app.config['CONTRACT_UPLOAD_FOLDER']]:
     if not os.path.exists(folder):
@@ -64,6 +84,7 @@ login_manager.login_view = 'user_management.login'
 migrate = Migrate(app, db)
 
 csrf.exempt('purchasing.search_suppliers')
+csrf.exempt('production.ingest_readings')
 
 logger.debug(f"Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
 
@@ -95,6 +116,8 @@ def import_blueprints():
         from modules.user_management import user_management_bp
         from modules.chat import chat_bp
         from modules.resources import resources_bp
+        from modules.report_jobs import report_jobs_bp
+        from modules.chart_renderer import charts_bp
         return [
             (dashboard_bp, '/dashboard'),
             (order_bp, '/order'),
@@ -110,7 +133,9 @@ def import_blueprints():
             (system_setup_bp, '/system_setup'),
             (user_management_bp, '/user_management'),
             (chat_bp, '/chat'),
-            (resources_bp, '/resources')
+            (resources_bp, '/resources'),
+            (report_jobs_bp, '/jobs'),
+            (charts_bp, '/charts')
         ]
     except ImportError as e:
         logger.error(f"Blueprint import failed: {str(e)}")
@@ -161,6 +186,7 @@ def date_filter(value, format='%Y-%m-%d'):
 
 app.jinja_env.filters['format_currency'] = format_currency_filter
 app.jinja_env.filters['date'] = date_filter
+app.jinja_env.globals['load_more_url'] = load_more_url
 
 from flask.json.provider import DefaultJSONProvider
 
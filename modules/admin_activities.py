@@ -1,31 +1,88 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, abort
 from flask_login import login_required
 from datetime import datetime
 from modules.models import db, Bill, FoodFuelRecord, SecurityIncident, PettyCash, ProjectFunding, PropertyItem, AdminLetter, DutyStation, Employee, Project, User
+from modules.pdf_service import pdf_file
+from modules.pagination import paginate, page_args, page_data
+from sqlalchemy.orm import joinedload
 import io
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
 from docx import Document
 from openpyxl import Workbook
 
 admin_activities_bp = Blueprint('admin_activities', __name__)
 
+# Tab -> (model, relationships shown in its rows, rows template, list name in the template)
+SECTIONS = {
+    'bills': (Bill, ['duty_station'], 'admin_bill_rows.html', 'bills'),
+    'food_fuel': (FoodFuelRecord, ['duty_station', 'payee'], 'admin_food_fuel_rows.html', 'food_fuel_records'),
+    'security': (SecurityIncident, ['duty_station'], 'admin_security_rows.html', 'security_incidents'),
+    'petty_cash': (PettyCash, ['duty_station', 'employee', 'approver'], 'admin_petty_cash_rows.html', 'petty_cash_requests'),
+    'project_funding': (ProjectFunding, ['duty_station', 'project'], 'admin_project_funding_rows.html', 'project_funding'),
+    'property_items': (PropertyItem, ['duty_station', 'employee'], 'admin_property_item_rows.html', 'property_items'),
+    'admin_letters': (AdminLetter, ['duty_station'], 'admin_letter_rows.html', 'admin_letters'),
+}
+
+# Dropdowns the add forms need besides duty stations
+SECTION_OPTIONS = {
+    'food_fuel': 'employees',
+    'petty_cash': 'employees',
+    'property_items': 'employees',
+    'project_funding': 'projects',
+}
+
+def section_page(section, cursor=None, size=None):
+    """One keyset page of a tab's records, newest first, with its relationships loaded in the same query."""
+    model, relationships, _, _ = SECTIONS[section]
+    query = model.query.options(*[joinedload(getattr(model, name)) for name in relationships])
+    return paginate(query, (model.id,), cursor, size, descending=True)
+
+def section_options(section):
+    option = SECTION_OPTIONS.get(section)
+    if option == 'employees':
+        return {option: db.session.query(Employee.id, Employee.name).order_by(Employee.name).all()}
+    if option == 'projects':
+        return {option: db.session.query(Project.id, Project.name).order_by(Project.name).all()}
+    return {}
+
+def _dated(rows):
+    return [row[0].strftime('%Y-%m-%d') if hasattr(row[0], 'strftime') else str(row[0]) for row in rows]
+
+def section_chart(section):
+    """A tab's chart figures, aggregated in SQL: {'labels': [...], 'datasets': [[...], ...]}."""
+    def status_counts(model, statuses):
+        counts = dict(db.session.query(model.status, db.func.count(model.id)).filter(model.status.in_(statuses)).group_by(model.status).all())
+        return {'labels': statuses, 'datasets': [[counts.get(status, 0) for status in statuses]]}
+
+    if section == 'bills':
+        return status_counts(Bill, ['Pending', 'Paid'])
+    if section == 'petty_cash':
+        return status_counts(PettyCash, ['Pending', 'Approved'])
+    if section == 'property_items':
+        return status_counts(PropertyItem, ['In Use', 'Returned'])
+    if section == 'food_fuel':
+        rows = db.session.query(
+            FoodFuelRecord.date,
+            db.func.sum(db.case((FoodFuelRecord.type == 'Food', FoodFuelRecord.cost), else_=0)),
+            db.func.sum(db.case((FoodFuelRecord.type == 'Fuel', FoodFuelRecord.cost), else_=0))
+        ).group_by(FoodFuelRecord.date).order_by(FoodFuelRecord.date).all()
+        return {'labels': _dated(rows), 'datasets': [[row[1] for row in rows], [row[2] for row in rows]]}
+    if section == 'security':
+        rows = db.session.query(SecurityIncident.reported_date, db.func.count(SecurityIncident.id)).group_by(
+            SecurityIncident.reported_date).order_by(SecurityIncident.reported_date).all()
+        return {'labels': _dated(rows), 'datasets': [[row[1] for row in rows]]}
+    if section == 'project_funding':
+        rows = db.session.query(ProjectFunding.funding_date, db.func.sum(ProjectFunding.amount)).group_by(
+            ProjectFunding.funding_date).order_by(ProjectFunding.funding_date).all()
+        return {'labels': _dated(rows), 'datasets': [[row[1] for row in rows]]}
+    if section == 'admin_letters':
+        day = db.func.date(AdminLetter.created_at)
+        rows = db.session.query(day, db.func.count(AdminLetter.id)).group_by(day).order_by(day).all()
+        return {'labels': _dated(rows), 'datasets': [[row[1] for row in rows]]}
+    return {'labels': [], 'datasets': []}
+
 @admin_activities_bp.route('/admin_activities', methods=['GET', 'POST'])
 @login_required
 def admin_activities():
-    duty_stations = DutyStation.query.all()
-    employees = Employee.query.all()
-    projects = Project.query.all()
-    bills = Bill.query.all()
-    food_fuel_records = FoodFuelRecord.query.all()
-    security_incidents = SecurityIncident.query.all()
-    petty_cash_requests = PettyCash.query.all()
-    project_funding = ProjectFunding.query.all()
-    property_items = PropertyItem.query.all()
-    admin_letters = AdminLetter.query.all()
-
     if request.method == 'POST':
         section = request.form.get('section')
         
@@ -151,12 +208,32 @@ def admin_activities():
             db.session.commit()
             flash('Letter added successfully!', 'success')
 
-        return redirect(url_for('admin_activities.admin_activities'))
+        return redirect(url_for('admin_activities.admin_activities', tab=section if section in SECTIONS else None))
 
-    return render_template('admin_activities.html', bills=bills, food_fuel_records=food_fuel_records,
-                           security_incidents=security_incidents, petty_cash_requests=petty_cash_requests,
-                           project_funding=project_funding, property_items=property_items, admin_letters=admin_letters,
-                           duty_stations=duty_stations, employees=employees, projects=projects)
+    # Only the active tab is queried here; the others fetch section_data when first shown
+    tab = request.args.get('tab', 'bills')
+    if tab not in SECTIONS:
+        tab = 'bills'
+    page = section_page(tab)
+    lists = {name: [] for _, _, _, name in SECTIONS.values()}
+    lists[SECTIONS[tab][3]] = page.items
+    duty_stations = DutyStation.query.order_by(DutyStation.name).all()
+    return render_template('admin_activities.html', tab=tab, page=page, chart=section_chart(tab),
+                           options=section_options(tab), duty_stations=duty_stations, **lists)
+
+@admin_activities_bp.route('/admin_activities/<section>/data', methods=['GET'])
+@login_required
+def section_data(section):
+    """A tab's next page of rows as JSON; the first page also carries its chart and form dropdowns."""
+    if section not in SECTIONS:
+        abort(404)
+    cursor, size = page_args()
+    page = section_page(section, cursor, size)
+    data = page_data(page, SECTIONS[section][2], **{SECTIONS[section][3]: page.items})
+    if not cursor:
+        data['chart'] = section_chart(section)
+        data['options'] = {name: [[id, label] for id, label in rows] for name, rows in section_options(section).items()}
+    return jsonify(data)
 
 # Edit Routes
 @admin_activities_bp.route('/edit_bill/<int:id>', methods=['POST'])
@@ -210,114 +287,119 @@ def delete_food_fuel(id):
     return redirect(url_for('admin_activities.admin_activities'))
 
 # Overview Routes
+# Each overview is one GROUP BY duty_station_id; stations without records still appear with an empty figure
+def _per_station(figures, empty):
+    names = dict(db.session.query(DutyStation.id, DutyStation.name).all())
+    overview = {name: empty() for name in names.values()}
+    for station_id, figure in figures:
+        if station_id in names:
+            overview[names[station_id]] = figure
+    return overview
+
+def _nested(rows):
+    # (station, key, figure) rows -> (station, {key: figure}) pairs
+    grouped = {}
+    for station_id, key, figure in rows:
+        grouped.setdefault(station_id, {})[key] = figure
+    return grouped.items()
+
+def _between(query, column, start_date, end_date):
+    if start_date and end_date:
+        query = query.filter(column.between(start_date, end_date))
+    return query
+
+def bills_summary(start_date=None, end_date=None):
+    query = _between(db.session.query(Bill.duty_station_id, db.func.sum(Bill.amount)), Bill.due_date, start_date, end_date)
+    return _per_station(query.group_by(Bill.duty_station_id).all(), int)
+
+def petty_cash_summary(start_date=None, end_date=None):
+    query = db.session.query(PettyCash.duty_station_id, db.func.sum(PettyCash.amount)).filter(PettyCash.status == 'Approved')
+    query = _between(query, PettyCash.request_date, start_date, end_date)
+    return _per_station(query.group_by(PettyCash.duty_station_id).all(), int)
+
+def project_funding_summary(start_date=None, end_date=None):
+    project_name = db.func.coalesce(Project.name, 'N/A')
+    query = db.session.query(ProjectFunding.duty_station_id, project_name, db.func.sum(ProjectFunding.amount)).outerjoin(
+        Project, ProjectFunding.project_id == Project.id)
+    query = _between(query, ProjectFunding.funding_date, start_date, end_date)
+    return _per_station(_nested(query.group_by(ProjectFunding.duty_station_id, project_name).all()), dict)
+
+def property_items_summary(start_date=None, end_date=None):
+    query = db.session.query(PropertyItem.duty_station_id, PropertyItem.item_type, db.func.count(PropertyItem.id))
+    query = _between(query, PropertyItem.assigned_date, start_date, end_date)
+    return _per_station(_nested(query.group_by(PropertyItem.duty_station_id, PropertyItem.item_type).all()), dict)
+
+def admin_letters_summary(start_date=None, end_date=None):
+    query = db.session.query(
+        AdminLetter.duty_station_id,
+        db.func.count(AdminLetter.id).filter(AdminLetter.letter_type == 'Internal'),
+        db.func.count(AdminLetter.id).filter(AdminLetter.letter_type == 'External')
+    )
+    query = _between(query, AdminLetter.created_at, start_date, end_date)
+    rows = query.group_by(AdminLetter.duty_station_id).all()
+    return _per_station([(station_id, {'Internal': internal, 'External': external}) for station_id, internal, external in rows],
+                        lambda: {'Internal': 0, 'External': 0})
+
+OVERVIEWS = {
+    'bills': bills_summary,
+    'petty_cash': petty_cash_summary,
+    'project_funding': project_funding_summary,
+    'property_items': property_items_summary,
+    'admin_letters': admin_letters_summary,
+}
+
 @admin_activities_bp.route('/bills_overview', methods=['POST'])
 @login_required
 def bills_overview():
-    duty_stations = DutyStation.query.all()
-    start_date = request.form.get('start_date')
-    end_date = request.form.get('end_date')
-    overview = {}
-    for ds in duty_stations:
-        query = Bill.query.filter_by(duty_station_id=ds.id)
-        if start_date and end_date:
-            query = query.filter(Bill.due_date.between(start_date, end_date))
-        total = sum(bill.amount for bill in query.all())
-        overview[ds.name] = total
+    overview = bills_summary(request.form.get('start_date'), request.form.get('end_date'))
     return render_template('bills_overview.html', overview=overview)
 
 @admin_activities_bp.route('/petty_cash_overview', methods=['POST'])
 @login_required
 def petty_cash_overview():
-    duty_stations = DutyStation.query.all()
-    start_date = request.form.get('start_date')
-    end_date = request.form.get('end_date')
-    overview = {}
-    for ds in duty_stations:
-        query = PettyCash.query.filter_by(duty_station_id=ds.id, status='Approved')
-        if start_date and end_date:
-            query = query.filter(PettyCash.request_date.between(start_date, end_date))
-        total = sum(req.amount for req in query.all())
-        overview[ds.name] = total
+    overview = petty_cash_summary(request.form.get('start_date'), request.form.get('end_date'))
     return render_template('petty_cash_overview.html', overview=overview)
 
 @admin_activities_bp.route('/project_funding_overview', methods=['POST'])
 @login_required
 def project_funding_overview():
-    duty_stations = DutyStation.query.all()
-    start_date = request.form.get('start_date')
-    end_date = request.form.get('end_date')
-    overview = {}
-    for ds in duty_stations:
-        query = ProjectFunding.query.filter_by(duty_station_id=ds.id)
-        if start_date and end_date:
-            query = query.filter(ProjectFunding.funding_date.between(start_date, end_date))
-        projects_funds = {}
-        for funding in query.all():
-            project_name = funding.project.name if funding.project else 'N/A'
-            projects_funds[project_name] = projects_funds.get(project_name, 0) + funding.amount
-        overview[ds.name] = projects_funds
+    overview = project_funding_summary(request.form.get('start_date'), request.form.get('end_date'))
     return render_template('project_funding_overview.html', overview=overview)
 
 @admin_activities_bp.route('/property_items_overview', methods=['POST'])
 @login_required
 def property_items_overview():
-    duty_stations = DutyStation.query.all()
-    overview = {}
-    for ds in duty_stations:
-        items = PropertyItem.query.filter_by(duty_station_id=ds.id).all()
-        type_count = {}
-        for item in items:
-            type_count[item.item_type] = type_count.get(item.item_type, 0) + 1
-        overview[ds.name] = type_count
+    overview = property_items_summary(request.form.get('start_date'), request.form.get('end_date'))
     return render_template('property_items_overview.html', overview=overview)
 
 @admin_activities_bp.route('/admin_letters_overview', methods=['POST'])
 @login_required
 def admin_letters_overview():
-    duty_stations = DutyStation.query.all()
-    start_date = request.form.get('start_date')
-    end_date = request.form.get('end_date')
-    overview = {}
-    for ds in duty_stations:
-        query = AdminLetter.query.filter_by(duty_station_id=ds.id)
-        if start_date and end_date:
-            query = query.filter(AdminLetter.created_at.between(start_date, end_date))
-        letters = query.all()
-        internal = sum(1 for l in letters if l.letter_type == 'Internal')
-        external = sum(1 for l in letters if l.letter_type == 'External')
-        overview[ds.name] = {'Internal': internal, 'External': external}
+    overview = admin_letters_summary(request.form.get('start_date'), request.form.get('end_date'))
     return render_template('admin_letters_overview.html', overview=overview)
 
+@admin_activities_bp.route('/admin_activities/overviews', methods=['GET'])
+@login_required
+def overviews():
+    """All overviews (or ?sections=bills,petty_cash...) for one date range in a single response."""
+    sections = request.args.get('sections')
+    names = [name for name in sections.split(',') if name in OVERVIEWS] if sections else list(OVERVIEWS)
+    start_date, end_date = request.args.get('start_date'), request.args.get('end_date')
+    return jsonify({name: OVERVIEWS[name](start_date, end_date) for name in names})
+
 # Export Routes
 @admin_activities_bp.route('/export_pdf/<section>')
 @login_required
 def export_pdf(section):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
     data = []
 
     if section == 'bills':
         data.append(['Bill #', 'Receipt #', 'Type', 'Amount', 'Due Date', 'Duty Station', 'Status'])
-        for bill in Bill.query.all():
+        for bill in Bill.query.options(joinedload(Bill.duty_station)).all():
             data.append([bill.bill_number, bill.receipt_number, bill.bill_type, bill.amount, bill.due_date, bill.duty_station.name, bill.status])
     # Add similar logic for other sections
 
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"{section}_report.pdf", mimetype='application/pdf')
+    return pdf_file(f"{section}_report.pdf", tables=[{'rows': data}] if data else [])
 
 @admin_activities_bp.route('/export_word/<section>')
 @login_required
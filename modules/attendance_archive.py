@@ -0,0 +1,78 @@
+from database import db
+from modules.models import Attendance, Employee, DutyStation
+from modules.pagination import watch_view, invalidate_counts
+from datetime import date
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Past years can be moved out of `attendance` into attendance_archive_<year> tables.
+# attendance_history is a UNION ALL view over the live table and every archive.
+ARCHIVE_PREFIX = 'attendance_archive_'
+HISTORY_VIEW = 'attendance_history'
+ATTENDANCE_COLUMNS = ['id', 'employee_id', 'date', 'check_in', 'check_out', 'badge_id', 'status', 'created_at']
+
+watch_view(HISTORY_VIEW, Attendance.__tablename__)
+
+def archived_years():
+    tables = db.inspect(db.engine).get_table_names()
+    return sorted(int(name[len(ARCHIVE_PREFIX):]) for name in tables if name.startswith(ARCHIVE_PREFIX) and name[len(ARCHIVE_PREFIX):].isdigit())
+
+def refresh_history_view():
+    columns = ', '.join(ATTENDANCE_COLUMNS)
+    selects = [f"SELECT {columns} FROM attendance"]
+    selects += [f"SELECT {columns} FROM {ARCHIVE_PREFIX}{year}" for year in archived_years()]
+    db.session.execute(db.text(f"DROP VIEW IF EXISTS {HISTORY_VIEW}"))
+    db.session.execute(db.text(f"CREATE VIEW {HISTORY_VIEW} AS " + " UNION ALL ".join(selects)))
+
+def archive_attendance_year(year):
+    if year >= date.today().year:
+        raise ValueError("Only past years can be archived.")
+    table = f"{ARCHIVE_PREFIX}{int(year)}"
+    columns = ', '.join(ATTENDANCE_COLUMNS)
+    params = {'start': date(year, 1, 1), 'end': date(year + 1, 1, 1)}
+    try:
+        db.session.execute(db.text(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT {columns} FROM attendance WHERE 0"))
+        db.session.execute(db.text(f"CREATE INDEX IF NOT EXISTS ix_{table}_date_employee ON {table} (date, employee_id)"))
+        db.session.execute(db.text(f"CREATE INDEX IF NOT EXISTS ix_{table}_employee_date ON {table} (employee_id, date)"))
+        moved = db.session.execute(db.text(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM attendance WHERE date >= :start AND date < :end"
+        ), params).rowcount
+        db.session.execute(db.text("DELETE FROM attendance WHERE date >= :start AND date < :end"), params)
+        refresh_history_view()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # The move ran as SQL text, which the list count cache does not see
+    invalidate_counts(Attendance.__tablename__, HISTORY_VIEW)
+    logger.info(f"Archived {moved} attendance rows for {year} into {table}")
+    return moved
+
+def attendance_source(start=None, year=None):
+    """Table to read attendance from: the live table unless the range reaches into an archived year."""
+    years = archived_years()
+    if not years:
+        return Attendance.__table__
+    first_year = year if year is not None else (start.year if start is not None else None)
+    if first_year is not None and first_year > years[-1]:
+        return Attendance.__table__
+    return db.Table(HISTORY_VIEW, db.MetaData(), *[db.Column(name, Attendance.__table__.c[name].type) for name in ATTENDANCE_COLUMNS])
+
+def attendance_rows(start=None, end=None, duty_station_id=None, batch_size=1000):
+    source = attendance_source(start)
+    query = db.select(
+        Employee.name.label('employee'),
+        DutyStation.name.label('duty_station'),
+        source.c.date, source.c.check_in, source.c.check_out, source.c.status
+    ).select_from(source).join(Employee, source.c.employee_id == Employee.id).outerjoin(
+        DutyStation, Employee.duty_station_id == DutyStation.id
+    )
+    if start is not None:
+        query = query.where(source.c.date >= start)
+    if end is not None:
+        query = query.where(source.c.date <= end)
+    if duty_station_id is not None:
+        query = query.where(Employee.duty_station_id == duty_station_id)
+    return db.session.execute(query.order_by(source.c.date, source.c.id).execution_options(yield_per=batch_size))
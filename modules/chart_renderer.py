@@ -0,0 +1,111 @@
+from flask import Blueprint, current_app, has_request_context, send_file, url_for, abort
+from flask_login import login_required
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from collections import OrderedDict
+from io import BytesIO
+import pandas as pd
+import seaborn as sns
+import threading
+import hashlib
+import base64
+import json
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+charts_bp = Blueprint('charts', __name__)
+
+DEFAULT_CHART_CACHE_SIZE = 128
+
+# chart key -> PNG bytes; the key is a hash of the data and the spec, so entries never go stale
+_charts = OrderedDict()
+_charts_lock = threading.Lock()
+
+def _cache_size():
+    try:
+        return current_app.config.get('CHART_CACHE_SIZE', DEFAULT_CHART_CACHE_SIZE)
+    except RuntimeError:
+        return DEFAULT_CHART_CACHE_SIZE
+
+def chart_key(df, spec):
+    digest = hashlib.sha1()
+    digest.update(json.dumps(list(map(str, df.columns))).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(json.dumps(spec, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def _draw(ax, df, spec):
+    kind = spec['kind']
+    if kind == 'bar':
+        palette = {'palette': spec['palette']} if spec.get('palette') else {}
+        sns.barplot(x=spec['x'], y=spec['y'], hue=spec.get('hue'), data=df, ax=ax, **palette)
+    elif kind == 'line':
+        sns.lineplot(x=spec['x'], y=spec['y'], data=df, marker=spec.get('marker'), ax=ax)
+    elif kind == 'pie':
+        ax.pie(df[spec['y']], labels=df[spec['x']], autopct='%1.1f%%', startangle=90)
+    else:
+        raise ValueError(f"Unknown chart kind: {kind}")
+
+    if spec.get('grid'):
+        ax.set_axisbelow(True)
+        ax.grid(True, color='.85')
+    if spec.get('title'):
+        ax.set_title(spec['title'], fontsize=spec.get('title_size'), pad=spec.get('title_pad', 6))
+    if spec.get('xlabel'):
+        ax.set_xlabel(spec['xlabel'], fontsize=spec.get('label_size'))
+    if spec.get('ylabel'):
+        ax.set_ylabel(spec['ylabel'], fontsize=spec.get('label_size'))
+    if spec.get('rotate_xticks'):
+        for label in ax.get_xticklabels():
+            label.set_rotation(spec['rotate_xticks'])
+            label.set_horizontalalignment('right')
+    if spec.get('legend_title') and ax.get_legend() is not None:
+        ax.legend(title=spec['legend_title'], bbox_to_anchor=(1.05, 1), loc='upper left')
+
+def _render_png(df, spec):
+    # Figure + Agg canvas instead of pyplot: no global figure state shared between requests
+    fig = Figure(figsize=tuple(spec.get('figsize', (10, 6))))
+    FigureCanvasAgg(fig)
+    _draw(fig.add_subplot(), df, spec)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=spec.get('dpi', 100))
+    return buf.getvalue()
+
+def _cached_png(df, spec):
+    key = chart_key(df, spec)
+    with _charts_lock:
+        if key in _charts:
+            _charts.move_to_end(key)
+            return key, _charts[key]
+    png = _render_png(df, spec)
+    with _charts_lock:
+        _charts[key] = png
+        while len(_charts) > _cache_size():
+            _charts.popitem(last=False)
+    return key, png
+
+def render_chart(df, spec):
+    """Render df as described by spec and return the chart key; repeated inputs are served from the LRU cache."""
+    return _cached_png(df, spec)[0]
+
+def chart_png(key):
+    with _charts_lock:
+        return _charts.get(key)
+
+def chart_src(df, spec):
+    """Image src for a chart: its /charts URL inside a request, a data URI elsewhere (e.g. report jobs)."""
+    key, png = _cached_png(df, spec)
+    if has_request_context():
+        return url_for('charts.chart', key=key)
+    return 'data:image/png;base64,' + base64.b64encode(png).decode('utf-8')
+
+@charts_bp.route('/<key>.png', methods=['GET'])
+@login_required
+def chart(key):
+    png = chart_png(key)
+    if png is None:
+        abort(404)
+    return send_file(BytesIO(png), mimetype='image/png', max_age=86400)
@@ -0,0 +1,128 @@
+from flask import current_app
+from database import db
+from modules.models import Customer, Order, ProductionPlan, ProductionActual, RevenuePlan, RevenueActual, DutyStation, Employee, Product, Sale, SalesRollup, Overtime, Attendance, AnnualLeave
+from modules.sales_rollup import rollup_period
+from modules.report_cache import on_commit_of
+from datetime import datetime, date
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_TTL = 60
+
+# Dropped when a commit writes a sales or order table; the TTL covers everything else on the dashboard
+_snapshot = {'data': None, 'expires_at': 0.0, 'version': 0}
+_snapshot_lock = threading.Lock()
+SNAPSHOT_TABLES = {Sale.__tablename__, SalesRollup.__tablename__, Order.__tablename__, Customer.__tablename__}
+
+def _month_start(year, month):
+    if month > 12:
+        return date(year + 1, month - 12, 1)
+    if month < 1:
+        return date(year - 1, month + 12, 1)
+    return date(year, month, 1)
+
+def _period_sum(column, period_column, first, last):
+    return db.func.coalesce(db.func.sum(db.case((db.and_(period_column >= first, period_column <= last), column), else_=0)), 0)
+
+def _scalar(query):
+    return query.scalar_subquery()
+
+def compute_dashboard_metrics():
+    today = date.today()
+
+    # Counts and plain totals in a single SELECT of scalar subqueries
+    totals = db.session.query(
+        _scalar(db.session.query(db.func.count(Customer.id))).label('num_customers'),
+        _scalar(db.session.query(db.func.count(Order.id))).label('num_orders'),
+        _scalar(db.session.query(db.func.coalesce(db.func.sum(ProductionPlan.planned_quantity), 0))).label('planned_production'),
+        _scalar(db.session.query(db.func.coalesce(db.func.sum(ProductionActual.actual_quantity), 0))).label('actual_production'),
+        _scalar(db.session.query(db.func.coalesce(db.func.sum(RevenuePlan.planned_revenue), 0.0))).label('planned_revenue'),
+        _scalar(db.session.query(db.func.coalesce(db.func.sum(RevenueActual.actual_revenue), 0.0))).label('actual_revenue'),
+        _scalar(db.session.query(db.func.count(Employee.id))).label('total_employees'),
+        _scalar(db.session.query(db.func.coalesce(db.func.sum(Overtime.hours), 0))).label('total_ot_hours'),
+        _scalar(db.session.query(db.func.count(Attendance.id)).filter(Attendance.date == today)).label('attendance_today'),
+        _scalar(db.session.query(db.func.count(AnnualLeave.id)).filter(AnnualLeave.status == 'Pending')).label('leave_pending')
+    ).one()
+
+    # Month/year revenue from the monthly sales rollup: a few rows per period instead of every sale
+    this_month = rollup_period(today)
+    last_month = rollup_period(_month_start(today.year, today.month - 1))
+    this_year = f"{today.year:04d}-01"
+    year_end = f"{today.year:04d}-12"
+    last_year = f"{today.year - 1:04d}-01"
+    revenue = db.session.query(
+        _period_sum(SalesRollup.amount, SalesRollup.period, this_month, this_month).label('current_month_revenue'),
+        _period_sum(SalesRollup.amount, SalesRollup.period, last_month, last_month).label('last_month_revenue'),
+        _period_sum(SalesRollup.amount, SalesRollup.period, this_year, year_end).label('current_year_revenue'),
+        _period_sum(SalesRollup.amount, SalesRollup.period, last_year, f"{today.year - 1:04d}-12").label('last_year_revenue')
+    ).filter(SalesRollup.period >= last_year, SalesRollup.period <= year_end).one()
+
+    quantity_subquery = db.session.query(db.func.coalesce(db.func.sum(Order.quantity), 0)).filter(Order.product_id == Product.id).correlate(Product).scalar_subquery()
+    top_row = db.session.query(
+        Product.name,
+        db.func.sum(Sale.amount).label('total_revenue'),
+        quantity_subquery.label('total_quantity')
+    ).join(Order, Order.product_id == Product.id).join(Sale, Sale.order_id == Order.id).group_by(Product.id).order_by(db.func.sum(Sale.amount).desc()).first()
+    top_product = {
+        'name': top_row.name,
+        'total_revenue': float(top_row.total_revenue or 0.0),
+        'total_quantity': int(top_row.total_quantity or 0)
+    } if top_row else None
+
+    duty_station_counts = dict(db.session.query(DutyStation.name, db.func.count(Employee.id)).join(Employee).group_by(DutyStation.name).all())
+
+    return {
+        'num_customers': totals.num_customers,
+        'num_orders': totals.num_orders,
+        'planned_production': totals.planned_production,
+        'actual_production': totals.actual_production,
+        'planned_revenue': float(totals.planned_revenue),
+        'actual_revenue': float(totals.actual_revenue),
+        'current_month_revenue': float(revenue.current_month_revenue),
+        'last_month_revenue': float(revenue.last_month_revenue),
+        'current_year_revenue': float(revenue.current_year_revenue),
+        'last_year_revenue': float(revenue.last_year_revenue),
+        'customer_month_diff': 0.0,
+        'order_month_diff': 0.0,
+        'revenue_month_diff': 0.0,
+        'revenue_year_diff': 0.0,
+        'top_product': top_product,
+        'duty_station_counts': duty_station_counts,
+        'hr_summary': {
+            'total_employees': totals.total_employees,
+            'total_ot_hours': totals.total_ot_hours,
+            'attendance_today': totals.attendance_today,
+            'leave_pending': totals.leave_pending
+        },
+        'computed_at': datetime.now().isoformat(timespec='seconds')
+    }
+
+def get_dashboard_snapshot():
+    ttl = current_app.config.get('DASHBOARD_SNAPSHOT_TTL', DEFAULT_SNAPSHOT_TTL)
+    snapshot = _snapshot['data']
+    if snapshot is not None and time.monotonic() < _snapshot['expires_at']:
+        return snapshot
+    # Only one request recomputes; the others wait and reuse its result
+    with _snapshot_lock:
+        if _snapshot['data'] is not None and time.monotonic() < _snapshot['expires_at']:
+            return _snapshot['data']
+        version = _snapshot['version']
+        snapshot = compute_dashboard_metrics()
+        # A commit that landed while computing may be missing from it; serve it once but do not keep it
+        if version == _snapshot['version']:
+            _snapshot['data'] = snapshot
+            _snapshot['expires_at'] = time.monotonic() + ttl
+            logger.debug(f"Dashboard snapshot refreshed, valid for {ttl}s")
+        return snapshot
+
+def invalidate_dashboard_snapshot():
+    # No lock: a commit must not wait for a recompute in progress, which the version bump discards instead
+    _snapshot['version'] += 1
+    _snapshot['expires_at'] = 0.0
+    _snapshot['data'] = None
+
+on_commit_of(SNAPSHOT_TABLES, invalidate_dashboard_snapshot)
@@ -0,0 +1,72 @@
+from flask import Response, current_app
+import xlsxwriter
+import tempfile
+import os
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def query_rows(query, row, batch_size=None):
+    """Yield row(obj) for each result, fetching batch_size rows at a time."""
+    if batch_size is None:
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', DEFAULT_EXPORT_BATCH_SIZE)
+    for obj in query.yield_per(batch_size):
+        yield row(obj)
+
+def _stream_file(path):
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+def write_excel(path, sheets):
+    """Write sheets to a constant-memory workbook at path and return the number of data rows.
+
+    sheets is a list of (sheet_name, headers, rows) where rows is any iterable of sequences,
+    typically query_rows(...). Rows are written as they arrive, so only one batch is held in memory.
+    """
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'remove_timezone': True
+    })
+    header_format = workbook.add_format({'bold': True})
+    row_count = 0
+    for sheet_name, headers, rows in sheets:
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        worksheet.write_row(0, 0, headers, header_format)
+        for row_index, values in enumerate(rows, start=1):
+            worksheet.write_row(row_index, 0, values)
+            row_count += 1
+    workbook.close()
+    return row_count
+
+def stream_excel(sheets, download_name):
+    """Write sheets to a temp file with write_excel and stream it back in chunks."""
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        row_count = write_excel(path, sheets)
+    except Exception:
+        os.remove(path)
+        raise
+    logger.info(f"Exported {row_count} rows to {download_name}")
+    return Response(
+        _stream_file(path),
+        mimetype=XLSX_MIMETYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={download_name}',
+            'Content-Length': str(os.path.getsize(path))
+        },
+        direct_passthrough=True
+    )
@@ -3,15 +3,19 @@ from flask_login import login_required, current_user
 from database import db
 from modules.models import Employee, DutyStation, Overtime, Attendance, AnnualLeave, EmploymentLetter, Contract, Position
 from modules.forms import EmployeeForm
+from modules.hr_stats import hr_dashboard_stats
+from modules.attendance_archive import attendance_rows, attendance_source
+from modules.excel_export import stream_excel, query_rows
+from modules.pdf_service import render_pdf, pdf_file
+from modules.pagination import paginate, page_args, page_json, wants_page_json
+from sqlalchemy.orm import joinedload, contains_eager
 from flask_wtf.csrf import validate_csrf, CSRFError
 from werkzeug.utils import secure_filename
 from datetime import datetime, date
 import os
 import logging
 from sqlalchemy.exc import OperationalError, IntegrityError
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+import xlsxwriter
 from io import BytesIO
 import qrcode
 import cv2
@@ -35,15 +39,13 @@ def ensure_upload_dirs():
 
 # Generate PDF function
 def generate_pdf(content, file_path):
-    c = canvas.Canvas(file_path, pagesize=letter)
-    width, height = letter
-    c.drawString(100, height - 50, "ASBM ERP Document")
-    text = c.beginText(100, height - 100)
-    text.setFont("Helvetica", 12)
-    for line in content.split('\n'):
-        text.textLine(line)
-    c.drawText(text)
-    c.save()
+    with open(file_path, 'wb') as f:
+        f.write(render_pdf(title="ASBM ERP Document", lines=content.split('\n')))
+
+# Chart figures: the query's rows grouped by duty station name and the other key columns, last column aggregated
+def by_duty_station(query, station_column, *columns):
+    keys = [DutyStation.name, *columns[:-1]]
+    return query.join(DutyStation, station_column == DutyStation.id).with_entities(*keys, columns[-1]).group_by(*keys).all()
 
 @hr_bp.route('/employees_by_duty_station', methods=['GET'])
 @login_required
@@ -69,190 +71,7 @@ def hr():
     form.manager_id.choices = [(0, 'None')] + [(emp.id, emp.name) for emp in active_employees]
     form.position_id.choices = [(0, 'None')] + [(pos.id, pos.title) for pos in positions]
 
-    tab = request.args.get('tab', 'employees')
-    search_name = request.args.get('search_name', '')
-    duty_station_id = request.args.get('duty_station_id', 'all')
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    gender = request.args.get('gender', 'all')
-    department = request.args.get('department', 'all')
-
-    departments = sorted(set(emp.department for emp in Employee.query.all() if emp.department))
-
-    # Filter queries
-    emp_query = Employee.query
-    if search_name:
-        emp_query = emp_query.filter(Employee.name.ilike(f'%{search_name}%'))
-    if duty_station_id != 'all':
-        emp_query = emp_query.filter(Employee.duty_station_id == int(duty_station_id))
-    if start_date:
-        try:
-            emp_query = emp_query.filter(Employee.hire_date >= datetime.strptime(start_date, '%Y-%m-%d'))
-        except ValueError:
-            flash('Invalid start date format.', 'danger')
-            start_date = ''
-    if end_date:
-        try:
-            emp_query = emp_query.filter(Employee.hire_date <= datetime.strptime(end_date, '%Y-%m-%d'))
-        except ValueError:
-            flash('Invalid end date format.', 'danger')
-            end_date = ''
-    if gender != 'all':
-        emp_query = emp_query.filter(Employee.gender == gender)
-    if department != 'all':
-        emp_query = emp_query.filter(Employee.department == department)
-    employees = emp_query.all()
-
-    # Modified query to explicitly specify the join condition
-    ot_query = Overtime.query.join(Employee, Overtime.employee_id == Employee.id)
-    att_query = Attendance.query.join(Employee, Attendance.employee_id == Employee.id)
-    leave_query = AnnualLeave.query.join(Employee, AnnualLeave.employee_id == Employee.id)
-    letter_query = EmploymentLetter.query.join(Employee, EmploymentLetter.employee_id == Employee.id)
-    contract_query = Contract.query.join(Employee, Contract.employee_id == Employee.id)
-    pos_query = Position.query
-
-    if duty_station_id != 'all':
-        ot_query = ot_query.filter(Employee.duty_station_id == int(duty_station_id))
-        att_query = att_query.filter(Employee.duty_station_id == int(duty_station_id))
-        leave_query = leave_query.filter(Employee.duty_station_id == int(duty_station_id))
-        letter_query = letter_query.filter(Employee.duty_station_id == int(duty_station_id))
-        contract_query = contract_query.filter(Employee.duty_station_id == int(duty_station_id))
-        pos_query = pos_query.filter(Position.duty_station_id == int(duty_station_id))
-
-    if start_date:
-        try:
-            start = datetime.strptime(start_date, '%Y-%m-%d')
-            ot_query = ot_query.filter(Overtime.date >= start)
-            att_query = att_query.filter(Attendance.date >= start)
-            leave_query = leave_query.filter(AnnualLeave.start_date >= start)
-            letter_query = letter_query.filter(EmploymentLetter.created_at >= start)
-            contract_query = contract_query.filter(Contract.start_date >= start)
-        except ValueError:
-            pass
-    if end_date:
-        try:
-            end = datetime.strptime(end_date, '%Y-%m-%d')
-            ot_query = ot_query.filter(Overtime.date <= end)
-            att_query = att_query.filter(Attendance.date <= end)
-            leave_query = leave_query.filter(AnnualLeave.end_date <= end)
-            letter_query = letter_query.filter(EmploymentLetter.created_at <= end)
-            contract_query = contract_query.filter(Contract.end_date <= end)
-        except ValueError:
-            pass
-
-    # Debug: Print the query to inspect the SQL
-    print("Overtime Query:", ot_query)
-
-    overtime_records = ot_query.all()
-    attendance_records = att_query.all()
-    leave_records = leave_query.all()
-    letters = letter_query.all()
-    contracts = contract_query.all()
-    positions = pos_query.all()
-
-    # Chart data generation
-    chart_data = {'title': '', 'type': 'bar', 'labels': [], 'datasets': [], 'data': [], 'backgroundColor': '#000000'}
-    if tab == 'employees':
-        emp_by_month = {ds.name: {f"{i+1}": 0 for i in range(12)} for ds in duty_stations}
-        for emp in employees:
-            if emp.duty_station_id and emp.hire_date:
-                ds = DutyStation.query.get(emp.duty_station_id)
-                emp_by_month[ds.name][f"{emp.hire_date.month}"] += 1
-        chart_data = {
-            'title': 'Employee Count by Month per Duty Station',
-            'type': 'line',
-            'labels': [f"Month {i+1}" for i in range(12)],
-            'datasets': [
-                {'label': ds_name, 'data': list(months.values()), 'borderColor': f'rgba({i*50 % 255}, {i*100 % 255}, {i*150 % 255}, 1)', 'fill': False}
-                for i, (ds_name, months) in enumerate(emp_by_month.items())
-            ]
-        }
-    elif tab == 'overtime':
-        ot_by_ds = {ds.name: 0 for ds in duty_stations}
-        for ot in overtime_records:
-            if ot.employee.duty_station_id:
-                ot_by_ds[ot.employee.duty_station.name] += ot.hours
-        chart_data = {
-            'title': 'Total Overtime Hours by Duty Station',
-            'type': 'bar',
-            'labels': list(ot_by_ds.keys()),
-            'data': list(ot_by_ds.values()),
-            'backgroundColor': 'rgba(255, 99, 132, 0.6)'
-        }
-    elif tab == 'attendance':
-        att_by_ds = {ds.name: {'Present': 0, 'Late': 0, 'Absent': 0} for ds in duty_stations}
-        for att in attendance_records:
-            if att.employee.duty_station_id:
-                att_by_ds[att.employee.duty_station.name][att.status] += 1
-        chart_data = {
-            'title': 'Attendance Status by Duty Station',
-            'type': 'bar',
-            'labels': list(att_by_ds.keys()),
-            'datasets': [
-                {'label': 'Present', 'data': [data['Present'] for data in att_by_ds.values()], 'backgroundColor': '#36A2EB'},
-                {'label': 'Late', 'data': [data['Late'] for data in att_by_ds.values()], 'backgroundColor': '#FFCE56'},
-                {'label': 'Absent', 'data': [data['Absent'] for data in att_by_ds.values()], 'backgroundColor': '#FF6384'}
-            ]
-        }
-    elif tab == 'leave':
-        leave_by_ds = {ds.name: {'Pending': 0, 'Approved': 0, 'Rejected': 0} for ds in duty_stations}
-        for leave in leave_records:
-            if leave.employee.duty_station_id:
-                leave_by_ds[leave.employee.duty_station.name][leave.status] += 1
-        chart_data = {
-            'title': 'Leave Status by Duty Station',
-            'type': 'bar',
-            'labels': list(leave_by_ds.keys()),
-            'datasets': [
-                {'label': 'Pending', 'data': [data['Pending'] for data in leave_by_ds.values()], 'backgroundColor': '#FFCE56'},
-                {'label': 'Approved', 'data': [data['Approved'] for data in leave_by_ds.values()], 'backgroundColor': '#36A2EB'},
-                {'label': 'Rejected', 'data': [data['Rejected'] for data in leave_by_ds.values()], 'backgroundColor': '#FF6384'}
-            ]
-        }
-    elif tab == 'letters':
-        letter_types = set(letter.letter_type for letter in letters)
-        letter_by_ds = {ds.name: {lt: 0 for lt in letter_types} for ds in duty_stations}
-        for letter in letters:
-            if letter.employee.duty_station_id:
-                letter_by_ds[letter.employee.duty_station.name][letter.letter_type] += 1
-        chart_data = {
-            'title': 'Letters by Type per Duty Station',
-            'type': 'bar',
-            'labels': list(letter_by_ds.keys()),
-            'datasets': [
-                {'label': lt, 'data': [data[lt] for data in letter_by_ds.values()], 'backgroundColor': f'rgba({i*50 % 255}, {i*100 % 255}, {i*150 % 255}, 0.6)'}
-                for i, lt in enumerate(letter_types)
-            ]
-        }
-    elif tab == 'contracts':
-        contract_by_ds = {ds.name: {'Active': 0, 'Expired': 0} for ds in duty_stations}
-        for contract in contracts:
-            if contract.employee.duty_station_id:
-                status = 'Active' if (contract.end_date is None or contract.end_date > date.today()) else 'Expired'
-                contract_by_ds[contract.employee.duty_station.name][status] += 1
-        chart_data = {
-            'title': 'Contract Status by Duty Station',
-            'type': 'bar',
-            'labels': list(contract_by_ds.keys()),
-            'datasets': [
-                {'label': 'Active', 'data': [data['Active'] for data in contract_by_ds.values()], 'backgroundColor': '#36A2EB'},
-                {'label': 'Expired', 'data': [data['Expired'] for data in contract_by_ds.values()], 'backgroundColor': '#FF6384'}
-            ]
-        }
-    elif tab == 'positions':
-        pos_by_ds = {ds.name: 0 for ds in duty_stations}
-        for pos in positions:
-            if pos.duty_station_id:
-                pos_by_ds[pos.duty_station.name] += 1
-        chart_data = {
-            'title': 'Positions by Duty Station',
-            'type': 'bar',
-            'labels': list(pos_by_ds.keys()),
-            'data': list(pos_by_ds.values()),
-            'backgroundColor': 'rgba(75, 192, 192, 0.2)'
-        }
-
-    # POST handling
+    # POST handling; every action answers before any list below is read
     if request.method == 'POST':
         try:
             validate_csrf(request.form.get('csrf_token'))
@@ -504,113 +323,248 @@ def hr():
         logger.error(f"Invalid action: {action}")
         return jsonify({'status': 'error', 'message': 'Invalid action.'}), 400
 
-    return render_template('hr.html', form=form, employees=employees, duty_stations=duty_stations,
-                           overtime_records=overtime_records, attendance_records=attendance_records,
-                           leave_records=leave_records, letters=letters, contracts=contracts, positions=positions,
-                           chart_data=chart_data, departments=departments,
-                           tab=tab, search_name=search_name, duty_station_id=duty_station_id,
-                           start_date=start_date, end_date=end_date, gender=gender, department=department)
-
-@hr_bp.route('/dashboard', methods=['GET'])
-@login_required
-def hr_dashboard():
-    duty_stations = DutyStation.query.all()
+    tab = request.args.get('tab', 'employees')
+    search_name = request.args.get('search_name', '')
+    duty_station_id = request.args.get('duty_station_id', 'all')
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
-    duty_station_id = request.args.get('duty_station_id', 'all')
-    month = request.args.get('month', 'all')
-    year = request.args.get('year', 'all')
+    gender = request.args.get('gender', 'all')
+    department = request.args.get('department', 'all')
 
+    departments = [department for (department,) in db.session.query(Employee.department).filter(
+        Employee.department.isnot(None), Employee.department != ''
+    ).distinct().order_by(Employee.department)]
+
+    # Filter queries
     emp_query = Employee.query
-    leave_query = AnnualLeave.query
-    letter_query = EmploymentLetter.query
-    contract_query = Contract.query
-    ot_query = Overtime.query
-    att_query = Attendance.query
+    if search_name:
+        emp_query = emp_query.filter(Employee.name.ilike(f'%{search_name}%'))
+    if duty_station_id != 'all':
+        emp_query = emp_query.filter(Employee.duty_station_id == int(duty_station_id))
+    if start_date:
+        try:
+            emp_query = emp_query.filter(Employee.hire_date >= datetime.strptime(start_date, '%Y-%m-%d'))
+        except ValueError:
+            flash('Invalid start date format.', 'danger')
+            start_date = ''
+    if end_date:
+        try:
+            emp_query = emp_query.filter(Employee.hire_date <= datetime.strptime(end_date, '%Y-%m-%d'))
+        except ValueError:
+            flash('Invalid end date format.', 'danger')
+            end_date = ''
+    if gender != 'all':
+        emp_query = emp_query.filter(Employee.gender == gender)
+    if department != 'all':
+        emp_query = emp_query.filter(Employee.department == department)
+
+    # Modified query to explicitly specify the join condition
+    ot_query = Overtime.query.join(Employee, Overtime.employee_id == Employee.id)
+    # Attendance reads through the attendance_history view once the range reaches an archived year
+    attendance = attendance_source(datetime.strptime(start_date, '%Y-%m-%d') if start_date else None)
+    att_query = db.session.query(attendance.c.id).select_from(attendance).join(Employee, attendance.c.employee_id == Employee.id)
+    leave_query = AnnualLeave.query.join(Employee, AnnualLeave.employee_id == Employee.id)
+    letter_query = EmploymentLetter.query.join(Employee, EmploymentLetter.employee_id == Employee.id)
+    contract_query = Contract.query.join(Employee, Contract.employee_id == Employee.id)
     pos_query = Position.query
 
+    if duty_station_id != 'all':
+        ot_query = ot_query.filter(Employee.duty_station_id == int(duty_station_id))
+        att_query = att_query.filter(Employee.duty_station_id == int(duty_station_id))
+        leave_query = leave_query.filter(Employee.duty_station_id == int(duty_station_id))
+        letter_query = letter_query.filter(Employee.duty_station_id == int(duty_station_id))
+        contract_query = contract_query.filter(Employee.duty_station_id == int(duty_station_id))
+        pos_query = pos_query.filter(Position.duty_station_id == int(duty_station_id))
+
     if start_date:
         try:
             start = datetime.strptime(start_date, '%Y-%m-%d')
-            emp_query = emp_query.filter(Employee.hire_date >= start)
+            ot_query = ot_query.filter(Overtime.date >= start)
+            att_query = att_query.filter(attendance.c.date >= start)
             leave_query = leave_query.filter(AnnualLeave.start_date >= start)
             letter_query = letter_query.filter(EmploymentLetter.created_at >= start)
             contract_query = contract_query.filter(Contract.start_date >= start)
-            ot_query = ot_query.filter(Overtime.date >= start)
-            att_query = att_query.filter(Attendance.date >= start)
         except ValueError:
-            start_date = ''
+            pass
     if end_date:
         try:
             end = datetime.strptime(end_date, '%Y-%m-%d')
-            emp_query = emp_query.filter(Employee.hire_date <= end)
+            ot_query = ot_query.filter(Overtime.date <= end)
+            att_query = att_query.filter(attendance.c.date <= end)
             leave_query = leave_query.filter(AnnualLeave.end_date <= end)
             letter_query = letter_query.filter(EmploymentLetter.created_at <= end)
             contract_query = contract_query.filter(Contract.end_date <= end)
-            ot_query = ot_query.filter(Overtime.date <= end)
-            att_query = att_query.filter(Attendance.date <= end)
+        except ValueError:
+            pass
+
+    # Debug: Print the query to inspect the SQL
+    print("Overtime Query:", ot_query)
+
+    # Only the active tab's list is read, one keyset page at a time
+    tab_lists = {
+        'employees': (emp_query.options(joinedload(Employee.duty_station)), (Employee.id,), False, 'hr_employee_rows.html', 'employees'),
+        'overtime': (ot_query.options(contains_eager(Overtime.employee).joinedload(Employee.duty_station)),
+                     (Overtime.date, Overtime.id), True, 'hr_overtime_rows.html', 'overtime_records'),
+        'attendance': (att_query.outerjoin(DutyStation, Employee.duty_station_id == DutyStation.id).with_entities(
+                           attendance.c.id, attendance.c.date, attendance.c.check_in, attendance.c.check_out, attendance.c.status,
+                           Employee.name.label('employee_name'), DutyStation.name.label('duty_station_name')),
+                       (attendance.c.date, attendance.c.id), True, 'hr_attendance_rows.html', 'attendance_records'),
+        'leave': (leave_query.options(contains_eager(AnnualLeave.employee).joinedload(Employee.duty_station)),
+                  (AnnualLeave.start_date, AnnualLeave.id), True, 'hr_leave_rows.html', 'leave_records'),
+        'letters': (letter_query.options(contains_eager(EmploymentLetter.employee).joinedload(Employee.duty_station)),
+                    (EmploymentLetter.created_at, EmploymentLetter.id), True, 'hr_letter_rows.html', 'letters'),
+        'contracts': (contract_query.options(contains_eager(Contract.employee).joinedload(Employee.duty_station)),
+                      (Contract.start_date, Contract.id), True, 'hr_contract_rows.html', 'contracts'),
+    }
+    lists = {name: [] for _, _, _, _, name in tab_lists.values()}
+    page = None
+    if tab in tab_lists:
+        query, key, descending, rows_template, name = tab_lists[tab]
+        cursor, size = page_args()
+        page = paginate(query, key, cursor, size, descending=descending)
+        if wants_page_json():
+            return page_json(page, rows_template, **{name: page.items}, managers=active_employees, duty_stations=duty_stations)
+        lists[name] = page.items
+    positions = pos_query.all() if tab == 'positions' else []
+
+    # Chart data generation, grouped in SQL over the whole filtered list rather than the page
+    chart_data = {'title': '', 'type': 'bar', 'labels': [], 'datasets': [], 'data': [], 'backgroundColor': '#000000'}
+    if tab == 'employees':
+        hire_month = db.func.strftime('%m', Employee.hire_date)
+        emp_by_month = {ds.name: {f"{i+1}": 0 for i in range(12)} for ds in duty_stations}
+        for ds_name, month, count in by_duty_station(emp_query, Employee.duty_station_id, hire_month, db.func.count(Employee.id)):
+            if month:
+                emp_by_month[ds_name][str(int(month))] += count
+        chart_data = {
+            'title': 'Employee Count by Month per Duty Station',
+            'type': 'line',
+            'labels': [f"Month {i+1}" for i in range(12)],
+            'datasets': [
+                {'label': ds_name, 'data': list(months.values()), 'borderColor': f'rgba({i*50 % 255}, {i*100 % 255}, {i*150 % 255}, 1)', 'fill': False}
+                for i, (ds_name, months) in enumerate(emp_by_month.items())
+            ]
+        }
+    elif tab == 'overtime':
+        ot_by_ds = {ds.name: 0 for ds in duty_stations}
+        for ds_name, hours in by_duty_station(ot_query, Employee.duty_station_id, db.func.sum(Overtime.hours)):
+            ot_by_ds[ds_name] += hours or 0
+        chart_data = {
+            'title': 'Total Overtime Hours by Duty Station',
+            'type': 'bar',
+            'labels': list(ot_by_ds.keys()),
+            'data': list(ot_by_ds.values()),
+            'backgroundColor': 'rgba(255, 99, 132, 0.6)'
+        }
+    elif tab == 'attendance':
+        att_by_ds = {ds.name: {'Present': 0, 'Late': 0, 'Absent': 0} for ds in duty_stations}
+        for ds_name, status, count in by_duty_station(att_query, Employee.duty_station_id, attendance.c.status, db.func.count(attendance.c.id)):
+            if status in att_by_ds[ds_name]:
+                att_by_ds[ds_name][status] += count
+        chart_data = {
+            'title': 'Attendance Status by Duty Station',
+            'type': 'bar',
+            'labels': list(att_by_ds.keys()),
+            'datasets': [
+                {'label': 'Present', 'data': [data['Present'] for data in att_by_ds.values()], 'backgroundColor': '#36A2EB'},
+                {'label': 'Late', 'data': [data['Late'] for data in att_by_ds.values()], 'backgroundColor': '#FFCE56'},
+                {'label': 'Absent', 'data': [data['Absent'] for data in att_by_ds.values()], 'backgroundColor': '#FF6384'}
+            ]
+        }
+    elif tab == 'leave':
+        leave_by_ds = {ds.name: {'Pending': 0, 'Approved': 0, 'Rejected': 0} for ds in duty_stations}
+        for ds_name, status, count in by_duty_station(leave_query, Employee.duty_station_id, AnnualLeave.status, db.func.count(AnnualLeave.id)):
+            if status in leave_by_ds[ds_name]:
+                leave_by_ds[ds_name][status] += count
+        chart_data = {
+            'title': 'Leave Status by Duty Station',
+            'type': 'bar',
+            'labels': list(leave_by_ds.keys()),
+            'datasets': [
+                {'label': 'Pending', 'data': [data['Pending'] for data in leave_by_ds.values()], 'backgroundColor': '#FFCE56'},
+                {'label': 'Approved', 'data': [data['Approved'] for data in leave_by_ds.values()], 'backgroundColor': '#36A2EB'},
+                {'label': 'Rejected', 'data': [data['Rejected'] for data in leave_by_ds.values()], 'backgroundColor': '#FF6384'}
+            ]
+        }
+    elif tab == 'letters':
+        counts = by_duty_station(letter_query, Employee.duty_station_id, EmploymentLetter.letter_type, db.func.count(EmploymentLetter.id))
+        letter_types = set(letter_type for _, letter_type, _ in counts)
+        letter_by_ds = {ds.name: {lt: 0 for lt in letter_types} for ds in duty_stations}
+        for ds_name, letter_type, count in counts:
+            letter_by_ds[ds_name][letter_type] += count
+        chart_data = {
+            'title': 'Letters by Type per Duty Station',
+            'type': 'bar',
+            'labels': list(letter_by_ds.keys()),
+            'datasets': [
+                {'label': lt, 'data': [data[lt] for data in letter_by_ds.values()], 'backgroundColor': f'rgba({i*50 % 255}, {i*100 % 255}, {i*150 % 255}, 0.6)'}
+                for i, lt in enumerate(letter_types)
+            ]
+        }
+    elif tab == 'contracts':
+        contract_status = db.case((db.or_(Contract.end_date.is_(None), Contract.end_date > date.today()), 'Active'), else_='Expired')
+        contract_by_ds = {ds.name: {'Active': 0, 'Expired': 0} for ds in duty_stations}
+        for ds_name, status, count in by_duty_station(contract_query, Employee.duty_station_id, contract_status, db.func.count(Contract.id)):
+            contract_by_ds[ds_name][status] += count
+        chart_data = {
+            'title': 'Contract Status by Duty Station',
+            'type': 'bar',
+            'labels': list(contract_by_ds.keys()),
+            'datasets': [
+                {'label': 'Active', 'data': [data['Active'] for data in contract_by_ds.values()], 'backgroundColor': '#36A2EB'},
+                {'label': 'Expired', 'data': [data['Expired'] for data in contract_by_ds.values()], 'backgroundColor': '#FF6384'}
+            ]
+        }
+    elif tab == 'positions':
+        pos_by_ds = {ds.name: 0 for ds in duty_stations}
+        for pos in positions:
+            if pos.duty_station_id:
+                pos_by_ds[pos.duty_station.name] += 1
+        chart_data = {
+            'title': 'Positions by Duty Station',
+            'type': 'bar',
+            'labels': list(pos_by_ds.keys()),
+            'data': list(pos_by_ds.values()),
+            'backgroundColor': 'rgba(75, 192, 192, 0.2)'
+        }
+
+    return render_template('hr.html', form=form, duty_stations=duty_stations, positions=positions, page=page,
+                           managers=active_employees, chart_data=chart_data, departments=departments, **lists,
+                           tab=tab, search_name=search_name, duty_station_id=duty_station_id,
+                           start_date=start_date, end_date=end_date, gender=gender, department=department)
+
+@hr_bp.route('/dashboard', methods=['GET'])
+@login_required
+def hr_dashboard():
+    duty_stations = DutyStation.query.all()
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    duty_station_id = request.args.get('duty_station_id', 'all')
+    month = request.args.get('month', 'all')
+    year = request.args.get('year', 'all')
+
+    filters = {}
+    if start_date:
+        try:
+            filters['start'] = datetime.strptime(start_date, '%Y-%m-%d')
+        except ValueError:
+            start_date = ''
+    if end_date:
+        try:
+            filters['end'] = datetime.strptime(end_date, '%Y-%m-%d')
         except ValueError:
             end_date = ''
     if duty_station_id != 'all':
-        emp_query = emp_query.filter(Employee.duty_station_id == int(duty_station_id))
-        leave_query = leave_query.join(Employee, AnnualLeave.employee_id == Employee.id).filter(Employee.duty_station_id == int(duty_station_id))
-        letter_query = letter_query.join(Employee, EmploymentLetter.employee_id == Employee.id).filter(Employee.duty_station_id == int(duty_station_id))
-        contract_query = contract_query.join(Employee, Contract.employee_id == Employee.id).filter(Employee.duty_station_id == int(duty_station_id))
-        ot_query = ot_query.join(Employee, Overtime.employee_id == Employee.id).filter(Employee.duty_station_id == int(duty_station_id))
-        att_query = att_query.join(Employee, Attendance.employee_id == Employee.id).filter(Employee.duty_station_id == int(duty_station_id))
-        pos_query = pos_query.filter(Position.duty_station_id == int(duty_station_id))
+        filters['duty_station_id'] = int(duty_station_id)
     if month != 'all':
-        leave_query = leave_query.filter(db.extract('month', AnnualLeave.start_date) == int(month))
-        ot_query = ot_query.filter(db.extract('month', Overtime.date) == int(month))
-        att_query = att_query.filter(db.extract('month', Attendance.date) == int(month))
+        filters['month'] = int(month)
     if year != 'all':
-        emp_query = emp_query.filter(db.extract('year', Employee.hire_date) == int(year))
-        leave_query = leave_query.filter(db.extract('year', AnnualLeave.start_date) == int(year))
-        letter_query = letter_query.filter(db.extract('year', EmploymentLetter.created_at) == int(year))
-        contract_query = contract_query.filter(db.extract('year', Contract.start_date) == int(year))
-        ot_query = ot_query.filter(db.extract('year', Overtime.date) == int(year))
-        att_query = att_query.filter(db.extract('year', Attendance.date) == int(year))
-
-    employees = emp_query.all()
-    leave_records = leave_query.all()
-    letters = letter_query.all()
-    contracts = contract_query.all()
-    overtime_records = ot_query.all()
-    attendance_records = att_query.all()
-    positions = pos_query.all()
-
-    duty_station_summary = []
-    total_employees = len(emp_query.all())
-    total_leaves = len(leave_query.all())
-    total_letters = len(letter_query.all())
-    total_contracts = len(contract_query.all())
-    total_overtime = len(ot_query.all())
-    total_attendance = len(att_query.all())
-    total_positions = len(pos_query.all())
-
-    for ds in duty_stations:
-        ds_employees = len([emp for emp in employees if emp.duty_station_id == ds.id])
-        ds_leaves = len([leave for leave in leave_records if leave.employee.duty_station_id == ds.id])
-        ds_letters = len([letter for letter in letters if letter.employee.duty_station_id == ds.id])
-        ds_contracts = len([contract for contract in contracts if contract.employee.duty_station_id == ds.id])
-        ds_overtime = len([ot for ot in overtime_records if ot.employee.duty_station_id == ds.id])
-        ds_attendance = len([att for att in attendance_records if att.employee.duty_station_id == ds.id])
-        ds_positions = len([pos for pos in positions if pos.duty_station_id == ds.id])
-        duty_station_summary.append({
-            'name': ds.name,
-            'employees': ds_employees,
-            'leaves': ds_leaves,
-            'letters': ds_letters,
-            'contracts': ds_contracts,
-            'overtime': ds_overtime,
-            'attendance': ds_attendance,
-            'positions': ds_positions
-        })
-
-    gender_data = {ds.name: {'Male': 0, 'Female': 0, 'Other': 0} for ds in duty_stations if duty_station_id == 'all' or ds.id == int(duty_station_id)}
-    for emp in employees:
-        if emp.duty_station_id:
-            gender_data[emp.duty_station.name][emp.gender] += 1
+        filters['year'] = int(year)
+
+    stats = hr_dashboard_stats(duty_stations, **filters)
+    duty_station_summary = stats['duty_station_summary']
+    totals = stats['totals']
+
+    gender_data = stats['gender']
     gender_chart = {
         'labels': list(gender_data.keys()),
         'datasets': [
@@ -620,10 +574,7 @@ def hr_dashboard():
         ]
     }
 
-    leave_by_month = {f"Month {i+1}": 0 for i in range(12)}
-    for leave in leave_records:
-        if leave.start_date:
-            leave_by_month[f"Month {leave.start_date.month}"] += 1
+    leave_by_month = stats['leave_by_month']
     leave_chart = {
         'labels': list(leave_by_month.keys()),
         'datasets': [{
@@ -635,20 +586,7 @@ def hr_dashboard():
         }]
     }
 
-    turnover_data = {ds.name: {f"Month {i+1}": 0 for i in range(12)} for ds in duty_stations if duty_station_id == 'all' or ds.id == int(duty_station_id)}
-    terminated_employees = Employee.query.filter((Employee.management_status == 'Inactive') | (Employee.contract_end_date.isnot(None))).all()
-    for emp in terminated_employees:
-        if emp.duty_station_id:
-            termination_date = emp.contract_end_date or (EmploymentLetter.query.filter_by(employee_id=emp.id, letter_type='Termination').first().created_at.date() if EmploymentLetter.query.filter_by(employee_id=emp.id, letter_type='Termination').first() else date.today())
-            if start_date and termination_date < datetime.strptime(start_date, '%Y-%m-%d').date():
-                continue
-            if end_date and termination_date > datetime.strptime(end_date, '%Y-%m-%d').date():
-                continue
-            if month != 'all' and termination_date.month != int(month):
-                continue
-            if year != 'all' and termination_date.year != int(year):
-                continue
-            turnover_data[emp.duty_station.name][f"Month {termination_date.month}"] += 1
+    turnover_data = stats['turnover']
     turnover_chart = {
         'labels': [f"Month {i+1}" for i in range(12)],
         'datasets': [
@@ -657,19 +595,7 @@ def hr_dashboard():
         ]
     }
 
-    action_data = {ds.name: {'Promotions': 0, 'Demotions': 0, 'Warnings': 0} for ds in duty_stations if duty_station_id == 'all' or ds.id == int(duty_station_id)}
-    total_promotions = total_demotions = total_warnings = 0
-    for letter in letters:
-        if letter.employee.duty_station_id:
-            if letter.letter_type == 'Promotion':
-                action_data[letter.employee.duty_station.name]['Promotions'] += 1
-                total_promotions += 1
-            elif letter.letter_type == 'Demotion':
-                action_data[letter.employee.duty_station.name]['Demotions'] += 1
-                total_demotions += 1
-            elif letter.letter_type == 'Warning':
-                action_data[letter.employee.duty_station.name]['Warnings'] += 1
-                total_warnings += 1
+    action_data = stats['actions']
     action_chart = {
         'labels': list(action_data.keys()),
         'datasets': [
@@ -678,13 +604,11 @@ def hr_dashboard():
             {'label': 'Warnings', 'data': [data['Warnings'] for data in action_data.values()], 'backgroundColor': '#FFCE56'}
         ]
     }
-
-    total_absent_days = sum(1 for att in Attendance.query.all() if att.status == 'Absent')
-    total_working_days = len(Attendance.query.all())
-    absenteeism_rate = (total_absent_days / total_working_days * 100) if total_working_days > 0 else 0
-    today = date.today()
-    tenures = [(today - emp.hire_date).days / 365 for emp in employees if emp.hire_date]
-    average_tenure = sum(tenures) / len(tenures) if tenures else 0
+    total_promotions = stats['action_totals']['Promotions']
+    total_demotions = stats['action_totals']['Demotions']
+    total_warnings = stats['action_totals']['Warnings']
+    absenteeism_rate = stats['absenteeism_rate']
+    average_tenure = stats['average_tenure']
 
     return render_template('hr_dashboard.html', duty_stations=duty_stations,
                            gender_chart=gender_chart, leave_chart=leave_chart,
@@ -695,9 +619,9 @@ def hr_dashboard():
                            start_date=start_date, end_date=end_date,
                            duty_station_id=duty_station_id, month=month, year=year,
                            duty_station_summary=duty_station_summary,
-                           total_employees=total_employees, total_leaves=total_leaves, total_letters=total_letters,
-                           total_contracts=total_contracts, total_overtime=total_overtime,
-                           total_attendance=total_attendance, total_positions=total_positions)
+                           total_employees=totals['total_employees'], total_leaves=totals['total_leaves'], total_letters=totals['total_letters'],
+                           total_contracts=totals['total_contracts'], total_overtime=totals['total_overtime'],
+                           total_attendance=totals['total_attendance'], total_positions=totals['total_positions'])
 
 @hr_bp.route('/scan_badge', methods=['POST'])
 @login_required
@@ -726,66 +650,54 @@ def scan_badge():
 @login_required
 def export_report(report_type):
     if report_type == 'employees':
-        data = [{
-            'ID': emp.id, 'Name': emp.name, 'Job Title': emp.title, 'Department': emp.department,
-            'Location': emp.location, 'Phone': emp.phone_number,
-            'Duty Station': emp.duty_station.name if emp.duty_station else 'N/A',
-            'Manager': emp.manager.name if emp.manager else 'None',
-            'Salary': emp.monthly_salary, 'Benefits': emp.additional_benefits,
-            'Hire Date': emp.hire_date.strftime('%Y-%m-%d') if emp.hire_date else ''
-        } for emp in Employee.query.all()]
+        query = Employee.query.options(joinedload(Employee.duty_station), joinedload(Employee.manager)).order_by(Employee.id)
+        headers = ['ID', 'Name', 'Job Title', 'Department', 'Location', 'Phone', 'Duty Station', 'Manager', 'Salary', 'Benefits', 'Hire Date']
+        rows = query_rows(query, lambda emp: [
+            emp.id, emp.name, emp.title, emp.department, emp.location, emp.phone_number,
+            emp.duty_station.name if emp.duty_station else 'N/A',
+            emp.manager.name if emp.manager else 'None',
+            emp.monthly_salary, emp.additional_benefits,
+            emp.hire_date.strftime('%Y-%m-%d') if emp.hire_date else ''
+        ])
     elif report_type == 'overtime':
-        data = [{
-            'Employee': ot.employee.name,
-            'Duty Station': ot.employee.duty_station.name if ot.employee.duty_station else 'N/A',
-            'Date': ot.date, 'Hours': ot.hours, 'Rate': ot.rate, 'Approved': ot.approved
-        } for ot in Overtime.query.all()]
+        query = db.session.query(Employee.name, DutyStation.name, Overtime.date, Overtime.hours, Overtime.rate, Overtime.approved).join(
+            Employee, Overtime.employee_id == Employee.id
+        ).outerjoin(DutyStation, Employee.duty_station_id == DutyStation.id).order_by(Overtime.id)
+        headers = ['Employee', 'Duty Station', 'Date', 'Hours', 'Rate', 'Approved']
+        rows = query_rows(query, lambda ot: [ot[0], ot[1] or 'N/A', ot[2], ot[3], ot[4], ot[5]])
     elif report_type == 'attendance':
-        data = [{
-            'Employee': a.employee.name,
-            'Duty Station': a.employee.duty_station.name if a.employee.duty_station else 'N/A',
-            'Date': a.date, 'Check In': a.check_in, 'Check Out': a.check_out, 'Status': a.status
-        } for a in Attendance.query.all()]
+        try:
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+        except ValueError:
+            return "Invalid date format", 400
+        duty_station_id = request.args.get('duty_station_id', 'all')
+        headers = ['Employee', 'Duty Station', 'Date', 'Check In', 'Check Out', 'Status']
+        rows = ([a.employee, a.duty_station or 'N/A', a.date, a.check_in, a.check_out, a.status]
+                for a in attendance_rows(start, end, int(duty_station_id) if duty_station_id != 'all' else None))
     elif report_type == 'leave':
-        data = [{
-            'Employee': l.employee.name,
-            'Duty Station': l.employee.duty_station.name if l.employee.duty_station else 'N/A',
-            'Start Date': l.start_date, 'End Date': l.end_date, 'Days': l.total_days, 'Status': l.status
-        } for l in AnnualLeave.query.all()]
+        query = db.session.query(Employee.name, DutyStation.name, AnnualLeave.start_date, AnnualLeave.end_date, AnnualLeave.total_days, AnnualLeave.status).join(
+            Employee, AnnualLeave.employee_id == Employee.id
+        ).outerjoin(DutyStation, Employee.duty_station_id == DutyStation.id).order_by(AnnualLeave.id)
+        headers = ['Employee', 'Duty Station', 'Start Date', 'End Date', 'Days', 'Status']
+        rows = query_rows(query, lambda l: [l[0], l[1] or 'N/A', l[2], l[3], l[4], l[5]])
     else:
         logger.error(f"Invalid report type: {report_type}")
         return "Invalid report type", 400
 
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name=report_type.capitalize(), index=False)
-    output.seek(0)
-    logger.info(f"Exported {report_type} report as Excel")
-    return send_file(output, download_name=f"{report_type}_report.xlsx", as_attachment=True)
+    logger.info(f"Exporting {report_type} report as Excel")
+    return stream_excel([(report_type.capitalize(), headers, rows)], f"{report_type}_report.xlsx")
 
 @hr_bp.route('/export_pdf/<report_type>')
 @login_required
 def export_pdf(report_type):
     if report_type == 'employees':
-        employees = Employee.query.all()
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        c.drawString(100, height - 50, "Employee Report")
-        y = height - 100
-        c.setFont("Helvetica", 10)
-        for emp in employees:
-            text = f"ID: {emp.id}, Name: {emp.name}, Job Title: {emp.title}, Dept: {emp.department}, Salary: {emp.monthly_salary}, Hire Date: {emp.hire_date}"
-            c.drawString(50, y, text)
-            y -= 20
-            if y < 50:
-                c.showPage()
-                y = height - 50
-        c.save()
-        buffer.seek(0)
+        data = [['ID', 'Name', 'Job Title', 'Dept', 'Salary', 'Hire Date']]
+        data.extend(db.session.query(
+            Employee.id, Employee.name, Employee.title, Employee.department, Employee.monthly_salary, Employee.hire_date
+        ).order_by(Employee.id).all())
         logger.info("Exported employees report as PDF")
-        return send_file(buffer, download_name="employees_report.pdf", as_attachment=True)
+        return pdf_file("employees_report.pdf", title="Employee Report", tables=[{'rows': [list(row) for row in data]}])
     logger.error(f"PDF export not implemented for {report_type}")
     return "PDF export only available for employees", 400
 
@@ -793,61 +705,42 @@ def export_pdf(report_type):
 @login_required
 def export_dashboard_report():
     duty_stations = DutyStation.query.all()
-    duty_station_summary = []
-    total_employees = len(Employee.query.all())
-    total_leaves = len(AnnualLeave.query.all())
-    total_letters = len(EmploymentLetter.query.all())
-    total_contracts = len(Contract.query.all())
-    total_overtime = len(Overtime.query.all())
-    total_attendance = len(Attendance.query.all())
-    total_positions = len(Position.query.all())
-
-    for ds in duty_stations:
-        ds_employees = len([emp for emp in Employee.query.all() if emp.duty_station_id == ds.id])
-        ds_leaves = len([leave for leave in AnnualLeave.query.all() if leave.employee.duty_station_id == ds.id])
-        ds_letters = len([letter for letter in EmploymentLetter.query.all() if letter.employee.duty_station_id == ds.id])
-        ds_contracts = len([contract for contract in Contract.query.all() if contract.employee.duty_station_id == ds.id])
-        ds_overtime = len([ot for ot in Overtime.query.all() if ot.employee.duty_station_id == ds.id])
-        ds_attendance = len([att for att in Attendance.query.all() if att.employee.duty_station_id == ds.id])
-        ds_positions = len([pos for pos in Position.query.all() if pos.duty_station_id == ds.id])
-        duty_station_summary.append({
-            'Duty Station': ds.name, 'Employees': ds_employees, 'Leaves': ds_leaves, 'Letters': ds_letters,
-            'Contracts': ds_contracts, 'Overtime Records': ds_overtime, 'Attendance Records': ds_attendance,
-            'Positions': ds_positions
-        })
-
-    total_absent_days = sum(1 for att in Attendance.query.all() if att.status == 'Absent')
-    total_working_days = len(Attendance.query.all())
-    absenteeism_rate = (total_absent_days / total_working_days * 100) if total_working_days > 0 else 0
-    today = date.today()
-    tenures = [(today - emp.hire_date).days / 365 for emp in Employee.query.all() if emp.hire_date]
-    average_tenure = sum(tenures) / len(tenures) if tenures else 0
-    letters = EmploymentLetter.query.all()
-    total_promotions = sum(1 for letter in letters if letter.letter_type == 'Promotion')
-    total_demotions = sum(1 for letter in letters if letter.letter_type == 'Demotion')
-    total_warnings = sum(1 for letter in letters if letter.letter_type == 'Warning')
-
-    summary_data = {
-        'Metric': [
-            'Total Employees', 'Total Leaves', 'Total Letters', 'Total Contracts',
-            'Total Overtime Records', 'Total Attendance Records', 'Total Positions',
-            'Absenteeism Rate (%)', 'Average Tenure (Years)', 'Total Promotions',
-            'Total Demotions', 'Total Warnings'
-        ],
-        'Value': [
-            total_employees, total_leaves, total_letters, total_contracts,
-            total_overtime, total_attendance, total_positions,
-            round(absenteeism_rate, 2), round(average_tenure, 2),
-            total_promotions, total_demotions, total_warnings
-        ]
-    }
-
-    df_summary = pd.DataFrame(summary_data)
-    df_duty_stations = pd.DataFrame(duty_station_summary)
+    stats = hr_dashboard_stats(duty_stations)
+    totals = stats['totals']
+
+    summary_rows = [
+        ('Total Employees', totals['total_employees']),
+        ('Total Leaves', totals['total_leaves']),
+        ('Total Letters', totals['total_letters']),
+        ('Total Contracts', totals['total_contracts']),
+        ('Total Overtime Records', totals['total_overtime']),
+        ('Total Attendance Records', totals['total_attendance']),
+        ('Total Positions', totals['total_positions']),
+        ('Absenteeism Rate (%)', round(stats['absenteeism_rate'], 2)),
+        ('Average Tenure (Years)', round(stats['average_tenure'], 2)),
+        ('Total Promotions', stats['action_totals']['Promotions']),
+        ('Total Demotions', stats['action_totals']['Demotions']),
+        ('Total Warnings', stats['action_totals']['Warnings'])
+    ]
+    station_columns = [
+        ('Duty Station', 'name'), ('Employees', 'employees'), ('Leaves', 'leaves'), ('Letters', 'letters'),
+        ('Contracts', 'contracts'), ('Overtime Records', 'overtime'), ('Attendance Records', 'attendance'),
+        ('Positions', 'positions')
+    ]
+
+    # constant_memory flushes each row as it is written, so rows must go out strictly in order
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df_summary.to_excel(writer, sheet_name='Summary', index=False)
-        df_duty_stations.to_excel(writer, sheet_name='Duty Stations', index=False)
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True, 'border': 1})
+    summary_sheet = workbook.add_worksheet('Summary')
+    summary_sheet.write_row(0, 0, ['Metric', 'Value'], header_format)
+    for row, values in enumerate(summary_rows, start=1):
+        summary_sheet.write_row(row, 0, values)
+    station_sheet = workbook.add_worksheet('Duty Stations')
+    station_sheet.write_row(0, 0, [header for header, _ in station_columns], header_format)
+    for row, ds_summary in enumerate(stats['duty_station_summary'], start=1):
+        station_sheet.write_row(row, 0, [ds_summary[key] for _, key in station_columns])
+    workbook.close()
     output.seek(0)
     logger.info("Exported dashboard report as Excel")
-    return send_file(output, download_name="hr_dashboard_report.xlsx", as_attachment=True)
\ No newline at end of file
+    return send_file(output, download_name="hr_dashboard_report.xlsx", as_attachment=True)
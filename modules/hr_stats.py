@@ -0,0 +1,186 @@
+from database import db
+from modules.models import Employee, Overtime, Attendance, AnnualLeave, EmploymentLetter, Contract, Position
+from modules.attendance_archive import attendance_source
+from datetime import datetime, date
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+ACTION_LETTER_TYPES = {'Promotion': 'Promotions', 'Demotion': 'Demotions', 'Warning': 'Warnings'}
+
+# summary key -> (model, start-date column, end-date column, month column, year column)
+HR_RECORD_FILTERS = {
+    'employees': (Employee, Employee.hire_date, Employee.hire_date, None, Employee.hire_date),
+    'leaves': (AnnualLeave, AnnualLeave.start_date, AnnualLeave.end_date, AnnualLeave.start_date, AnnualLeave.start_date),
+    'letters': (EmploymentLetter, EmploymentLetter.created_at, EmploymentLetter.created_at, None, EmploymentLetter.created_at),
+    'contracts': (Contract, Contract.start_date, Contract.end_date, None, Contract.start_date),
+    'overtime': (Overtime, Overtime.date, Overtime.date, Overtime.date, Overtime.date),
+    'attendance': (Attendance, Attendance.date, Attendance.date, Attendance.date, Attendance.date),
+}
+
+def _bound(column, value):
+    # DateTime columns compare against datetimes, Date columns against dates
+    if isinstance(column.type, db.DateTime):
+        return datetime.combine(value, datetime.min.time())
+    return value
+
+def _month_start(year, month):
+    return date(year + 1, 1, 1) if month > 12 else date(year, month, 1)
+
+def _date_conditions(start_col, end_col, month_col, year_col, start=None, end=None, month=None, year=None):
+    # Month/year filters become date ranges so the date indexes can be used
+    conditions = []
+    if start is not None:
+        conditions.append(start_col >= start)
+    if end is not None:
+        conditions.append(end_col <= end)
+    if year is not None and month is not None and month_col is year_col:
+        conditions.append(year_col >= _bound(year_col, _month_start(year, month)))
+        conditions.append(year_col < _bound(year_col, _month_start(year, month + 1)))
+        return conditions
+    if year is not None:
+        conditions.append(year_col >= _bound(year_col, date(year, 1, 1)))
+        conditions.append(year_col < _bound(year_col, date(year + 1, 1, 1)))
+    if month is not None and month_col is not None:
+        first, last = db.session.query(db.func.min(month_col), db.func.max(month_col)).one()
+        if first is None:
+            conditions.append(db.false())
+        else:
+            years = range(int(str(first)[:4]), int(str(last)[:4]) + 1)
+            conditions.append(db.or_(*[
+                db.and_(month_col >= _bound(month_col, _month_start(y, month)), month_col < _bound(month_col, _month_start(y, month + 1)))
+                for y in years
+            ]))
+    return conditions
+
+def _filter(query, key, start=None, end=None, duty_station_id=None, month=None, year=None):
+    model, start_col, end_col, month_col, year_col = HR_RECORD_FILTERS[key]
+    if model is not Employee:
+        query = query.join(Employee, model.employee_id == Employee.id)
+    if duty_station_id is not None:
+        query = query.filter(Employee.duty_station_id == duty_station_id)
+    return query.filter(*_date_conditions(start_col, end_col, month_col, year_col, start=start, end=end, month=month, year=year))
+
+def _attendance_counts_by_station(start=None, end=None, duty_station_id=None, month=None, year=None):
+    source = attendance_source(start, year)
+    query = db.select(Employee.duty_station_id, db.func.count(source.c.id)).select_from(source).join(
+        Employee, source.c.employee_id == Employee.id
+    ).where(*_date_conditions(source.c.date, source.c.date, source.c.date, source.c.date, start=start, end=end, month=month, year=year))
+    if duty_station_id is not None:
+        query = query.where(Employee.duty_station_id == duty_station_id)
+    return dict(db.session.execute(query.group_by(Employee.duty_station_id)).all())
+
+def _counts_by_station(key, **filters):
+    if key == 'attendance':
+        return _attendance_counts_by_station(**filters)
+    model = HR_RECORD_FILTERS[key][0]
+    query = db.session.query(Employee.duty_station_id, db.func.count(model.id))
+    if model is Employee:
+        query = query.select_from(Employee)
+    else:
+        query = query.select_from(model)
+    return dict(_filter(query, key, **filters).group_by(Employee.duty_station_id).all())
+
+def _termination_counts(stations, start=None, end=None, duty_station_id=None, month=None, year=None):
+    # Termination date: contract end, else the employee's first Termination letter, else today
+    first_letter = db.session.query(
+        EmploymentLetter.employee_id,
+        db.func.min(EmploymentLetter.id).label('letter_id')
+    ).filter(EmploymentLetter.letter_type == 'Termination').group_by(EmploymentLetter.employee_id).subquery()
+    termination_date = db.func.coalesce(Employee.contract_end_date, db.func.date(EmploymentLetter.created_at), date.today())
+    termination_month = db.extract('month', termination_date)
+
+    query = db.session.query(Employee.duty_station_id, termination_month, db.func.count(Employee.id)).outerjoin(
+        first_letter, first_letter.c.employee_id == Employee.id
+    ).outerjoin(EmploymentLetter, EmploymentLetter.id == first_letter.c.letter_id).filter(
+        (Employee.management_status == 'Inactive') | (Employee.contract_end_date.isnot(None))
+    )
+    if start is not None:
+        query = query.filter(termination_date >= start.date())
+    if end is not None:
+        query = query.filter(termination_date <= end.date())
+    if duty_station_id is not None:
+        query = query.filter(Employee.duty_station_id == duty_station_id)
+    if month is not None:
+        query = query.filter(termination_month == month)
+    if year is not None:
+        query = query.filter(termination_date >= date(year, 1, 1), termination_date < date(year + 1, 1, 1))
+
+    turnover = {ds.name: {f"Month {i+1}": 0 for i in range(12)} for ds in stations}
+    names = {ds.id: ds.name for ds in stations}
+    for station_id, term_month, count in query.group_by(Employee.duty_station_id, termination_month).all():
+        if station_id in names and term_month:
+            turnover[names[station_id]][f"Month {int(term_month)}"] += count
+    return turnover
+
+def hr_dashboard_stats(duty_stations, start=None, end=None, duty_station_id=None, month=None, year=None):
+    """Counts behind the HR dashboard, computed with grouped COUNT queries.
+
+    Returns plain dicts keyed by duty station name; no ORM objects are loaded per employee or record.
+    """
+    filters = {'start': start, 'end': end, 'duty_station_id': duty_station_id, 'month': month, 'year': year}
+    stations = [ds for ds in duty_stations if duty_station_id is None or ds.id == duty_station_id]
+
+    by_station = {key: _counts_by_station(key, **filters) for key in HR_RECORD_FILTERS}
+    position_query = db.session.query(Position.duty_station_id, db.func.count(Position.id))
+    if duty_station_id is not None:
+        position_query = position_query.filter(Position.duty_station_id == duty_station_id)
+    by_station['positions'] = dict(position_query.group_by(Position.duty_station_id).all())
+
+    totals = {f"total_{key}": sum(counts.values()) for key, counts in by_station.items()}
+    duty_station_summary = [
+        dict({'name': ds.name}, **{key: counts.get(ds.id, 0) for key, counts in by_station.items()})
+        for ds in duty_stations
+    ]
+
+    gender = {ds.name: {'Male': 0, 'Female': 0, 'Other': 0} for ds in stations}
+    names = {ds.id: ds.name for ds in stations}
+    gender_rows = _filter(
+        db.session.query(Employee.duty_station_id, Employee.gender, db.func.count(Employee.id)), 'employees', **filters
+    ).group_by(Employee.duty_station_id, Employee.gender).all()
+    for station_id, gender_value, count in gender_rows:
+        if station_id in names and gender_value in gender[names[station_id]]:
+            gender[names[station_id]][gender_value] += count
+
+    leave_by_month = {f"Month {i+1}": 0 for i in range(12)}
+    leave_month = db.extract('month', AnnualLeave.start_date)
+    for leave_month_value, count in _filter(
+        db.session.query(leave_month, db.func.count(AnnualLeave.id)).select_from(AnnualLeave), 'leaves', **filters
+    ).group_by(leave_month).all():
+        if leave_month_value:
+            leave_by_month[f"Month {int(leave_month_value)}"] += count
+
+    actions = {ds.name: {'Promotions': 0, 'Demotions': 0, 'Warnings': 0} for ds in stations}
+    action_totals = {'Promotions': 0, 'Demotions': 0, 'Warnings': 0}
+    action_rows = _filter(
+        db.session.query(Employee.duty_station_id, EmploymentLetter.letter_type, db.func.count(EmploymentLetter.id)).select_from(EmploymentLetter),
+        'letters', **filters
+    ).filter(EmploymentLetter.letter_type.in_(list(ACTION_LETTER_TYPES))).group_by(Employee.duty_station_id, EmploymentLetter.letter_type).all()
+    for station_id, letter_type, count in action_rows:
+        if station_id in names:
+            actions[names[station_id]][ACTION_LETTER_TYPES[letter_type]] += count
+            action_totals[ACTION_LETTER_TYPES[letter_type]] += count
+
+    # Absenteeism covers all attendance records, as the dashboard always has
+    attendance_table = attendance_source()
+    attendance = db.session.execute(db.select(
+        db.func.count(attendance_table.c.id),
+        db.func.coalesce(db.func.sum(db.case((attendance_table.c.status == 'Absent', 1), else_=0)), 0)
+    )).one()
+    absenteeism_rate = (attendance[1] / attendance[0] * 100) if attendance[0] > 0 else 0
+
+    tenure_days = db.func.julianday(date.today()) - db.func.julianday(Employee.hire_date)
+    average_tenure = _filter(db.session.query(db.func.avg(tenure_days)), 'employees', **filters).scalar()
+
+    return {
+        'duty_station_summary': duty_station_summary,
+        'totals': totals,
+        'gender': gender,
+        'leave_by_month': leave_by_month,
+        'turnover': _termination_counts(stations, **filters),
+        'actions': actions,
+        'action_totals': action_totals,
+        'absenteeism_rate': absenteeism_rate,
+        'average_tenure': (average_tenure or 0) / 365
+    }
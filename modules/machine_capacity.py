@@ -0,0 +1,278 @@
+from database import db
+from modules.production_models import Machine, ProductionConfig, ProductionRecord, ProductionShift, ProductionHoliday, MachineCapacity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime, timedelta
+import calendar
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+PERIOD_TYPES = ('Daily', 'Weekly', 'Monthly', 'Quarterly', 'Semi-Annual')
+
+def production_period(period_type, day):
+    """Key of the period_type period holding day: '2024-03-05', '2024-W10', '2024-03', '2024-Q1' or '2024-H1'."""
+    if isinstance(day, datetime):
+        day = day.date()
+    if period_type == 'Daily':
+        return day.isoformat()
+    if period_type == 'Weekly':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period_type == 'Monthly':
+        return day.strftime('%Y-%m')
+    if period_type == 'Quarterly':
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    if period_type == 'Semi-Annual':
+        return f"{day.year}-H{(day.month - 1) // 6 + 1}"
+    raise ValueError(f"Unknown period type: {period_type}")
+
+def period_bounds(period_type, period):
+    """First and last day of a period key."""
+    if period_type == 'Daily':
+        day = date.fromisoformat(period)
+        return day, day
+    if period_type == 'Weekly':
+        year, week = period.split('-W')
+        first = date.fromisocalendar(int(year), int(week), 1)
+        return first, first + timedelta(days=6)
+    year = int(period[:4])
+    if period_type == 'Monthly':
+        first_month = last_month = int(period[5:7])
+    elif period_type == 'Quarterly':
+        last_month = int(period[-1]) * 3
+        first_month = last_month - 2
+    elif period_type == 'Semi-Annual':
+        last_month = int(period[-1]) * 6
+        first_month = last_month - 5
+    else:
+        raise ValueError(f"Unknown period type: {period_type}")
+    return date(year, first_month, 1), date(year, last_month, calendar.monthrange(year, last_month)[1])
+
+def periods_between(period_type, start_date, end_date):
+    periods = []
+    day = start_date
+    while day <= end_date:
+        period = production_period(period_type, day)
+        periods.append(period)
+        day = period_bounds(period_type, period)[1] + timedelta(days=1)
+    return periods
+
+def _stations(connection, station_ids):
+    """Per station: its first config, hours worked per weekday by its shifts, and its holidays."""
+    stations = {station_id: {'config': None, 'weekday_hours': {}, 'holidays': set()} for station_id in station_ids}
+    if not stations:
+        return stations
+    for config in connection.execute(db.select(ProductionConfig).where(
+            ProductionConfig.duty_station_id.in_(stations)).order_by(ProductionConfig.id)).mappings():
+        stations[config['duty_station_id']]['config'] = stations[config['duty_station_id']]['config'] or config
+    for station_id, hours, weekdays in connection.execute(db.select(
+            ProductionShift.duty_station_id, ProductionShift.hours, ProductionShift.weekdays).where(
+            ProductionShift.duty_station_id.in_(stations))):
+        weekday_hours = stations[station_id]['weekday_hours']
+        for weekday in set(int(d) for d in weekdays or '' if d.isdigit()):
+            weekday_hours[weekday] = weekday_hours.get(weekday, 0.0) + (hours or 0.0)
+    for station_id, day in connection.execute(db.select(ProductionHoliday.duty_station_id, ProductionHoliday.date).where(
+            ProductionHoliday.duty_station_id.in_(stations))):
+        stations[station_id]['holidays'].add(day)
+    return stations
+
+def _working_hours(station, first, last):
+    hours = 0.0
+    day = first
+    while day <= last:
+        if day not in station['holidays']:
+            hours += station['weekday_hours'].get(day.weekday(), 0.0)
+        day += timedelta(days=1)
+    return hours
+
+def _calendar(station):
+    """The station itself when it has shifts; otherwise its config's working hours on every day but Sunday."""
+    if station['weekday_hours'] or station['config'] is None:
+        return station
+    return dict(station, weekday_hours={weekday: station['config']['working_hours'] or 0.0 for weekday in range(6)})
+
+def scheduled_hours(station_ids, first, last):
+    """Hours each station is scheduled to work from first to last: its shifts, or else its config's
+    working hours on every day but Sunday. Holidays are excluded."""
+    return {station_id: _working_hours(_calendar(station), first, last)
+            for station_id, station in _stations(db.session.connection(), set(station_ids)).items()}
+
+def _manual_capacity(monthly, station, first, last):
+    """A monthly manual capacity spread over first..last: each month contributes its share of that month's working hours."""
+    capacity = 0.0
+    month_first = first.replace(day=1)
+    while month_first <= last:
+        month_last = date(month_first.year, month_first.month, calendar.monthrange(month_first.year, month_first.month)[1])
+        month_hours = _working_hours(station, month_first, month_last)
+        if month_hours:
+            capacity += monthly * _working_hours(station, max(first, month_first), min(last, month_last)) / month_hours
+        month_first = month_last + timedelta(days=1)
+    return capacity
+
+def machine_period_capacity(machine, station, period_type, period):
+    """(working_hours, capacity) of a machine for one period, or None when its station has no plan basis.
+
+    Installed capacity x efficiency is planned for every scheduled hour of the period, holidays excluded:
+    the station's shifts, or without shifts its config's working hours on each day but Sunday, so a Daily
+    period plans one day's output and a Monthly one a month's. A manual capacity (0 counts as unset) is a
+    monthly figure and overrides the rate; shorter or longer periods get it in proportion to their working
+    hours. Stations with neither shifts nor a config plan nothing.
+    """
+    if not station['weekday_hours'] and station['config'] is None:
+        return None
+    station = _calendar(station)
+    first, last = period_bounds(period_type, period)
+    hours = _working_hours(station, first, last)
+    if machine['manual_capacity']:
+        return hours, _manual_capacity(machine['manual_capacity'], station, first, last)
+    rate = (machine['installed_capacity'] or 0.0) * (machine['efficiency_factor'] or 0.0)
+    return hours, rate * hours
+
+def _statements():
+    upsert = sqlite_insert(MachineCapacity)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['machine_id', 'period_type', 'period'],
+        set_={'working_hours': upsert.excluded.working_hours, 'capacity': upsert.excluded.capacity, 'updated_at': upsert.excluded.updated_at}
+    )
+    delete = db.delete(MachineCapacity).where(
+        MachineCapacity.machine_id == db.bindparam('key_machine_id'),
+        MachineCapacity.period_type == db.bindparam('key_period_type'),
+        MachineCapacity.period == db.bindparam('key_period')
+    )
+    return upsert, delete
+
+UPSERT_STATEMENT, DELETE_STATEMENT = _statements()
+
+def _write(connection, keys):
+    """Compute and store the capacity of each (machine_id, period_type, period) key."""
+    keys = set(keys)
+    if not keys:
+        return 0
+    machine_ids = {machine_id for machine_id, _, _ in keys}
+    machines = {machine['id']: machine for machine in connection.execute(
+        db.select(Machine).where(Machine.id.in_(machine_ids))).mappings()}
+    stations = _stations(connection, {machine['duty_station_id'] for machine in machines.values()})
+    now = datetime.utcnow()
+    rows, stale = [], []
+    for machine_id, period_type, period in keys:
+        machine = machines.get(machine_id)
+        figures = machine_period_capacity(machine, stations[machine['duty_station_id']], period_type, period) if machine else None
+        if figures is None:
+            stale.append({'key_machine_id': machine_id, 'key_period_type': period_type, 'key_period': period})
+        else:
+            rows.append({'machine_id': machine_id, 'period_type': period_type, 'period': period,
+                         'working_hours': figures[0], 'capacity': figures[1], 'updated_at': now})
+    if rows:
+        connection.execute(UPSERT_STATEMENT, rows)
+    if stale:
+        connection.execute(DELETE_STATEMENT, stale)
+    return len(rows)
+
+def _record_keys(connection, machine_ids=None):
+    query = db.select(ProductionRecord.machine_id, ProductionRecord.period_type, ProductionRecord.period).where(
+        ProductionRecord.period.isnot(None)).distinct()
+    if machine_ids is not None:
+        query = query.where(ProductionRecord.machine_id.in_(machine_ids))
+    return set(connection.execute(query).all())
+
+def refresh_machines(connection, machine_ids):
+    """Recompute every stored period of the machines, plus the periods their records fall in."""
+    machine_ids = list(machine_ids)
+    if not machine_ids:
+        return 0
+    stored = set(connection.execute(db.select(MachineCapacity.machine_id, MachineCapacity.period_type, MachineCapacity.period).where(
+        MachineCapacity.machine_id.in_(machine_ids))).all())
+    return _write(connection, stored | _record_keys(connection, machine_ids))
+
+def capacity_complete(period_type, periods):
+    """Whether every machine with a plan basis already has a row for each period, in one COUNT query."""
+    planned = db.select(Machine.id).where(Machine.duty_station_id.in_(db.union(
+        db.select(ProductionConfig.duty_station_id), db.select(ProductionShift.duty_station_id))))
+    stored = db.select(db.func.count(MachineCapacity.id)).where(
+        MachineCapacity.period_type == period_type, MachineCapacity.period.in_(periods), MachineCapacity.machine_id.in_(planned))
+    expected = db.select(db.func.count()).select_from(planned.subquery())
+    counts = db.session.execute(db.select(stored.scalar_subquery(), expected.scalar_subquery())).one()
+    return counts[0] == counts[1] * len(periods)
+
+def ensure_capacity(period_type, periods, connection=None):
+    """Make sure every machine has a capacity row for each period, computing only the missing ones.
+
+    Without a connection a single COUNT first checks whether anything is missing; if so the rows are
+    written and committed in a short transaction of their own, so report requests never hold the write lock.
+    """
+    periods = set(periods)
+    if not periods:
+        return 0
+    if connection is None:
+        if capacity_complete(period_type, periods):
+            return 0
+        with db.engine.begin() as connection:
+            return ensure_capacity(period_type, periods, connection)
+    machine_ids = connection.execute(db.select(Machine.id)).scalars().all()
+    stored = set(connection.execute(db.select(MachineCapacity.machine_id, MachineCapacity.period).where(
+        MachineCapacity.period_type == period_type, MachineCapacity.period.in_(periods))).all())
+    return _write(connection, [(machine_id, period_type, period) for machine_id in machine_ids
+                               for period in periods if (machine_id, period) not in stored])
+
+def ensure_keys(connection, keys):
+    """Compute the (machine_id, period_type, period) keys that have no capacity row yet."""
+    keys = set(keys)
+    if not keys:
+        return 0
+    stored = set(connection.execute(db.select(MachineCapacity.machine_id, MachineCapacity.period_type, MachineCapacity.period).where(
+        MachineCapacity.machine_id.in_({key[0] for key in keys}))).all())
+    return _write(connection, keys - stored)
+
+def capacity_for(machine_id, period_type, day):
+    """Planned capacity of a machine for the period holding day; 0 when nothing is planned."""
+    period = production_period(period_type, day)
+    query = db.select(MachineCapacity.capacity).where(
+        MachineCapacity.machine_id == machine_id, MachineCapacity.period_type == period_type, MachineCapacity.period == period)
+    capacity = db.session.execute(query).scalar()
+    if capacity is None:
+        with db.engine.begin() as connection:
+            _write(connection, [(machine_id, period_type, period)])
+            capacity = connection.execute(query).scalar()
+    return capacity or 0
+
+def rebuild_machine_capacity():
+    """Stamp records missing their period and recompute the capacity of every period that has records."""
+    for record in ProductionRecord.query.filter(ProductionRecord.period.is_(None)).all():
+        record.period = production_period(record.period_type, record.start_date)
+    db.session.flush()
+    connection = db.session.connection()
+    connection.execute(db.delete(MachineCapacity))
+    rows = _write(connection, _record_keys(connection))
+    db.session.commit()
+    logger.info(f"Machine capacity rebuilt: {rows} rows")
+    return rows
+
+# Records carry their period key so reports can join them to machine_capacity
+@event.listens_for(Session, 'before_flush')
+def _stamp_record_periods(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, ProductionRecord) and obj.period_type in PERIOD_TYPES and obj.start_date:
+            obj.period = production_period(obj.period_type, obj.start_date)
+
+# Any change to a machine, or to a station's config, shifts or holidays, recomputes the affected machines
+@event.listens_for(Session, 'after_flush')
+def _refresh_capacity(session, flush_context):
+    machine_ids, station_ids, deleted, record_keys = set(), set(), set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Machine):
+            (deleted if obj in session.deleted else machine_ids).add(obj.id)
+        elif isinstance(obj, (ProductionConfig, ProductionShift, ProductionHoliday)):
+            station_ids.add(obj.duty_station_id)
+        elif isinstance(obj, ProductionRecord) and obj not in session.deleted and obj.period:
+            record_keys.add((obj.machine_id, obj.period_type, obj.period))
+    if not (machine_ids or station_ids or record_keys):
+        return
+    connection = session.connection()
+    if station_ids:
+        machine_ids.update(connection.execute(db.select(Machine.id).where(Machine.duty_station_id.in_(station_ids))).scalars())
+    machine_ids -= deleted
+    refresh_machines(connection, machine_ids)
+    ensure_keys(connection, [key for key in record_keys if key[0] not in machine_ids and key[0] not in deleted])
@@ -0,0 +1,217 @@
+from flask import current_app, request
+from database import db
+from modules.production_models import Machine, MachineReading, ProductionRecord, MachineCapacity
+from modules.machine_capacity import PERIOD_TYPES, production_period, period_bounds, ensure_keys
+from modules.production_rollups import pending_readings, advance_watermark, rollup_production
+from modules.production_reference import reference_data
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime
+import threading
+import atexit
+import hmac
+import json
+import csv
+import io
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_READING_BATCH_SIZE = 500
+DEFAULT_READING_FLUSH_SECONDS = 5
+DEFAULT_READING_PERIOD = 'Daily'
+DEFAULT_READING_UOM = 'Pcs'
+
+# Readings accepted but not yet written; a timer (or a full batch) flushes them in one transaction
+_buffer = {'rows': [], 'timer': None, 'app': None}
+_buffer_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_rollup_lock = threading.Lock()
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+def gateway_authorized():
+    """Gateways send the MACHINE_READING_TOKEN in X-Gateway-Token.
+
+    The endpoint is CSRF exempt, so a browser session is never enough; with no token configured nothing is accepted.
+    """
+    token = _config('MACHINE_READING_TOKEN', None)
+    sent = request.headers.get('X-Gateway-Token')
+    return bool(token and sent and hmac.compare_digest(token, sent))
+
+def _timestamp(value):
+    timestamp = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    # Aware timestamps are stored as server local time, which is what production periods are cut on
+    return timestamp.astimezone().replace(tzinfo=None) if timestamp.tzinfo else timestamp
+
+def _rows(body, mimetype):
+    """(line number, row) pairs; JSON lines are decoded one by one so a bad line only rejects itself."""
+    if mimetype in ('text/csv', 'application/csv'):
+        return enumerate(csv.DictReader(io.StringIO(body)), start=2)
+    return ((line, text) for line, text in enumerate(body.splitlines(), start=1) if text.strip())
+
+def parse_readings(body, mimetype):
+    """Readings from a CSV body (machine_id,timestamp,quantity header) or JSON lines, plus the rejected lines."""
+    readings, lines, errors = [], [], []
+    try:
+        for line, row in _rows(body, mimetype):
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                readings.append({
+                    'machine_id': int(row['machine_id']),
+                    'timestamp': _timestamp(row['timestamp']),
+                    'quantity': float(row['quantity'])
+                })
+                lines.append(line)
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append({'line': line, 'error': f"{type(e).__name__}: {e}"})
+    except csv.Error as e:
+        errors.append({'line': None, 'error': f"Unreadable CSV: {e}"})
+        return [], errors
+
+    # The cache can trail machines added by another worker, so ids it misses are checked in the table
+    machine_ids = {reading['machine_id'] for reading in readings}
+    known = machine_ids & reference_data()['machines'].keys()
+    if known != machine_ids:
+        known |= set(db.session.execute(db.select(Machine.id).where(Machine.id.in_(machine_ids - known))).scalars())
+    errors.extend({'line': line, 'error': f"Unknown machine {reading['machine_id']}"}
+                  for line, reading in zip(lines, readings) if reading['machine_id'] not in known)
+    return [reading for reading in readings if reading['machine_id'] in known], errors
+
+def buffer_readings(readings):
+    """Queue readings for the next bulk write and return how many are waiting.
+
+    A full batch is written at once; anything less waits at most MACHINE_READING_FLUSH_SECONDS.
+    Buffered readings live in this process only until then.
+    """
+    received_at = datetime.utcnow()
+    batch_size = _config('MACHINE_READING_BATCH_SIZE', DEFAULT_READING_BATCH_SIZE)
+    with _buffer_lock:
+        _buffer['rows'].extend(dict(reading, received_at=received_at) for reading in readings)
+        _buffer['app'] = current_app._get_current_object()
+        waiting = len(_buffer['rows'])
+        if waiting < batch_size and _buffer['timer'] is None:
+            timer = threading.Timer(_config('MACHINE_READING_FLUSH_SECONDS', DEFAULT_READING_FLUSH_SECONDS), _flush_in_app)
+            timer.daemon = True
+            _buffer['timer'] = timer
+            timer.start()
+    if waiting >= batch_size:
+        flush_readings()
+    return waiting
+
+def _take_buffer():
+    with _buffer_lock:
+        rows, _buffer['rows'] = _buffer['rows'], []
+        if _buffer['timer'] is not None:
+            _buffer['timer'].cancel()
+            _buffer['timer'] = None
+    return rows
+
+def flush_readings():
+    """Append the buffered readings in one transaction, then roll them up. Returns how many were written."""
+    with _flush_lock:
+        rows = _take_buffer()
+        if not rows:
+            return 0
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(db.insert(MachineReading), rows)
+        except Exception as e:
+            # Put them back in front of anything that arrived meanwhile; the next flush retries
+            with _buffer_lock:
+                _buffer['rows'][:0] = rows
+            logger.error(f"Writing {len(rows)} machine readings failed: {str(e)}")
+            raise
+        logger.debug(f"Wrote {len(rows)} machine readings")
+    rollup_machine_readings()
+    rollup_production()
+    return len(rows)
+
+def _flush_in_app():
+    app = _buffer['app']
+    if app is None:
+        return
+    with app.app_context():
+        try:
+            flush_readings()
+        except Exception as e:
+            logger.error(f"Scheduled machine reading flush failed: {str(e)}")
+
+atexit.register(_flush_in_app)
+
+def _statements():
+    quantity = db.bindparam('delta_quantity', type_=db.Float)
+    upsert = sqlite_insert(ProductionRecord).values(
+        machine_id=db.bindparam('key_machine_id'),
+        period_type=db.bindparam('key_period_type'),
+        period=db.bindparam('key_period'),
+        start_date=db.bindparam('start_date', type_=db.Date),
+        end_date=db.bindparam('end_date', type_=db.Date),
+        actual_quantity=quantity,
+        uom=db.bindparam('uom'),
+        utilized_capacity=0.0,
+        source='counter'
+    ).on_conflict_do_update(
+        index_elements=['machine_id', 'period_type', 'period'],
+        index_where=db.text("source = 'counter'"),
+        set_={'actual_quantity': ProductionRecord.actual_quantity + quantity}
+    )
+
+    capacity = db.select(db.func.nullif(MachineCapacity.capacity, 0)).where(
+        MachineCapacity.machine_id == db.bindparam('key_machine_id'),
+        MachineCapacity.period_type == db.bindparam('key_period_type'),
+        MachineCapacity.period == db.bindparam('key_period')
+    ).scalar_subquery()
+    utilization = db.update(ProductionRecord).where(
+        ProductionRecord.machine_id == db.bindparam('key_machine_id'),
+        ProductionRecord.period_type == db.bindparam('key_period_type'),
+        ProductionRecord.period == db.bindparam('key_period'),
+        ProductionRecord.source == 'counter'
+    ).values(utilized_capacity=db.func.coalesce(ProductionRecord.actual_quantity * 100.0 / capacity, 0.0))
+    return upsert, utilization
+
+COUNTER_UPSERT, UTILIZATION_UPDATE = _statements()
+
+def rollup_machine_readings(period_type=None, uom=None):
+    """Add the readings written since the last run to their machines' counter records. Returns the readings rolled up.
+
+    The watermark moves in the same transaction as the records, so every reading is counted exactly once.
+    """
+    period_type = period_type or _config('MACHINE_READING_PERIOD', DEFAULT_READING_PERIOD)
+    uom = uom or _config('MACHINE_READING_UOM', DEFAULT_READING_UOM)
+    if period_type not in PERIOD_TYPES:
+        raise ValueError(f"Unknown period type: {period_type}")
+    name = f"production_records:{period_type}"
+    with _rollup_lock, db.engine.begin() as connection:
+        last_id, top = pending_readings(connection, name)
+        if top <= last_id:
+            return 0
+
+        # One row per machine and day from SQL; days are folded into periods here
+        day = db.func.date(MachineReading.timestamp)
+        totals, count = {}, 0
+        for machine_id, reading_day, quantity, readings in connection.execute(db.select(
+                MachineReading.machine_id, day, db.func.sum(MachineReading.quantity), db.func.count(MachineReading.id)
+        ).where(MachineReading.id > last_id, MachineReading.id <= top).group_by(MachineReading.machine_id, day)):
+            key = (machine_id, period_type, production_period(period_type, date.fromisoformat(reading_day)))
+            totals[key] = totals.get(key, 0.0) + quantity
+            count += readings
+
+        params = []
+        for (machine_id, _, period), quantity in totals.items():
+            start_date, end_date = period_bounds(period_type, period)
+            params.append({'key_machine_id': machine_id, 'key_period_type': period_type, 'key_period': period,
+                           'start_date': start_date, 'end_date': end_date, 'delta_quantity': quantity, 'uom': uom})
+        if params:
+            connection.execute(COUNTER_UPSERT, params)
+            ensure_keys(connection, totals)
+            connection.execute(UTILIZATION_UPDATE, params)
+
+        advance_watermark(connection, name, last_id, top)
+    logger.info(f"Rolled up {count} machine readings into {len(totals)} {period_type} records")
+    return count
@@ -147,19 +147,49 @@ class Order(db.Model):
     customer = db.relationship('Customer', back_populates='orders', lazy=True)
     product = db.relationship('Product', back_populates='orders', lazy=True)
     sales = db.relationship('Sale', back_populates='order', lazy=True)
+    __table_args__ = (
+        db.Index('ix_orders_placed_date_id', 'order_placed_date', 'id'),
+    )
 
 class Sale(db.Model):
     __tablename__ = 'sales'
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True)
-    sale_date = db.Column(db.Date, nullable=False)
+    sale_date = db.Column(db.Date, nullable=False, index=True)
     quantity = db.Column(db.Float, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
     sale_type = db.Column(db.String(20), nullable=False)
     amount = db.Column(db.Float, nullable=False)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=True)
     product = db.relationship('Product', back_populates='sales', lazy=True)
     order = db.relationship('Order', back_populates='sales', lazy=True)
+    duty_station = db.relationship('DutyStation', lazy=True)
+    __table_args__ = (
+        db.Index('ix_sales_product_date', 'product_id', 'sale_date'),
+    )
+
+# Monthly Sale totals, kept in step with every Sale insert (see modules/sales_rollup.py)
+class SalesRollup(db.Model):
+    __tablename__ = 'sales_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(7), nullable=False)  # e.g., '2025-07'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    sale_type = db.Column(db.String(20), nullable=False)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=True)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    total_price = db.Column(db.Float, nullable=False, default=0.0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    product = db.relationship('Product', lazy=True)
+    duty_station = db.relationship('DutyStation', lazy=True)
+    __table_args__ = (
+        db.UniqueConstraint('period', 'product_id', 'sale_type', 'duty_station_id', name='uq_sales_rollup_key'),
+        # SQLite treats NULLs as distinct in the constraint above, so sales without a station need their own key
+        db.Index('uq_sales_rollup_no_station', 'period', 'product_id', 'sale_type', unique=True,
+                 sqlite_where=db.text('duty_station_id IS NULL')),
+        db.Index('ix_sales_rollup_product_period', 'product_id', 'period'),
+    )
 
 class PurchaseOrder(db.Model):
     __tablename__ = 'purchase_orders'
@@ -423,6 +453,9 @@ class Overtime(db.Model):
         back_populates='overtime_approvals',
         lazy=True
     )
+    __table_args__ = (
+        db.Index('ix_overtime_date_id', 'date', 'id'),
+    )
 
 class Attendance(db.Model):
     __tablename__ = 'attendance'
@@ -435,6 +468,11 @@ class Attendance(db.Model):
     status = db.Column(db.String(20), default='Present')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     employee = db.relationship('Employee', back_populates='attendance_records', lazy=True)
+    __table_args__ = (
+        db.Index('ix_attendance_date_employee', 'date', 'employee_id'),
+        db.Index('ix_attendance_employee_date', 'employee_id', 'date'),
+        db.Index('ix_attendance_date_id', 'date', 'id'),
+    )
 
 class AnnualLeave(db.Model):
     __tablename__ = 'annual_leave'
@@ -461,6 +499,9 @@ class AnnualLeave(db.Model):
         back_populates='leave_approvals',
         lazy=True
     )
+    __table_args__ = (
+        db.Index('ix_annual_leave_start_id', 'start_date', 'id'),
+    )
 
 class EmploymentLetter(db.Model):
     __tablename__ = 'employment_letters'
@@ -471,6 +512,9 @@ class EmploymentLetter(db.Model):
     file_path = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     employee = db.relationship('Employee', back_populates='letters', lazy=True)
+    __table_args__ = (
+        db.Index('ix_employment_letters_created_id', 'created_at', 'id'),
+    )
 
 class Contract(db.Model):
     __tablename__ = 'contracts'
@@ -483,6 +527,9 @@ class Contract(db.Model):
     file_path = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     employee = db.relationship('Employee', back_populates='contracts', lazy=True)
+    __table_args__ = (
+        db.Index('ix_contracts_start_id', 'start_date', 'id'),
+    )
 
 class Position(db.Model):
     __tablename__ = 'positions'
@@ -512,6 +559,9 @@ class Bill(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     paid_at = db.Column(db.DateTime, nullable=True)
     duty_station = db.relationship('DutyStation', back_populates='bills', lazy=True)
+    __table_args__ = (
+        db.Index('ix_bills_station_due_date', 'duty_station_id', 'due_date'),
+    )
 
 class FoodFuelRecord(db.Model):
     __tablename__ = 'food_fuel_records'
@@ -560,6 +610,9 @@ class PettyCash(db.Model):
     employee = db.relationship('Employee', back_populates='petty_cash', lazy=True)
     approver = db.relationship('User', back_populates='petty_cash_approvals', lazy=True)
     duty_station = db.relationship('DutyStation', back_populates='petty_cash', lazy=True)
+    __table_args__ = (
+        db.Index('ix_petty_cash_station_request_date', 'duty_station_id', 'request_date'),
+    )
 
 class ProjectFunding(db.Model):
     __tablename__ = 'project_funding'
@@ -575,6 +628,9 @@ class ProjectFunding(db.Model):
     duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
     project = db.relationship('Project', back_populates='funding', lazy=True)
     duty_station = db.relationship('DutyStation', back_populates='project_funding', lazy=True)
+    __table_args__ = (
+        db.Index('ix_project_funding_station_date', 'duty_station_id', 'funding_date'),
+    )
 
 class PropertyItem(db.Model):
     __tablename__ = 'property_items'
@@ -591,6 +647,9 @@ class PropertyItem(db.Model):
     duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
     employee = db.relationship('Employee', back_populates='property_items', lazy=True)
     duty_station = db.relationship('DutyStation', back_populates='property_items', lazy=True)
+    __table_args__ = (
+        db.Index('ix_property_items_station_assigned_date', 'duty_station_id', 'assigned_date'),
+    )
 
 class AdminLetter(db.Model):
     __tablename__ = 'admin_letters'
@@ -602,4 +661,22 @@ class AdminLetter(db.Model):
     file_path = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
-    duty_station = db.relationship('DutyStation', back_populates='admin_letters', lazy=True)
\ No newline at end of file
+    duty_station = db.relationship('DutyStation', back_populates='admin_letters', lazy=True)
+    __table_args__ = (
+        db.Index('ix_admin_letters_station_created', 'duty_station_id', 'created_at'),
+    )
+
+class ReportJob(db.Model):
+    __tablename__ = 'report_jobs'
+    id = db.Column(db.String(32), primary_key=True)  # random token; also the download token
+    kind = db.Column(db.String(50), nullable=False)  # e.g., 'stock_management.export_pdf'
+    params = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='Queued')  # Queued, Running, Completed, Failed
+    file_path = db.Column(db.String(300), nullable=True)
+    download_name = db.Column(db.String(200), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    requested_by = db.relationship('User', lazy=True)
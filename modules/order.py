@@ -1,15 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from flask_wtf.csrf import generate_csrf
 from database import db
 from modules.models import Order, Product, Customer
+from modules.excel_export import stream_excel, query_rows
+from modules.pdf_service import pdf_file
+from modules.pagination import paginate, page_args, page_json, wants_page_json
+from sqlalchemy.orm import contains_eager
 from datetime import datetime
 import logging
-import pandas as pd
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
 
 order_bp = Blueprint('order', __name__)
 
@@ -31,7 +30,7 @@ def order_list():
     sort = request.args.get('sort', 'latest')  # Default to latest first
 
     # Base query
-    query = Order.query.join(Customer).join(Product)
+    query = Order.query.join(Customer, Order.customer_id == Customer.id).join(Product, Order.product_id == Product.id)
 
     # Filter by product category
     if product_category:
@@ -56,18 +55,17 @@ def order_list():
     if order_number:
         query = query.filter(Order.order_number.ilike(f'%{order_number}%'))
 
-    # Sort by date
-    if sort == 'latest':
-        query = query.order_by(Order.order_placed_date.desc())
-    elif sort == 'oldest':
-        query = query.order_by(Order.order_placed_date.asc())
-
-    # Execute the query
-    orders = query.all()
+    # Sort by date, one keyset page at a time; customer and product come from the joins above
+    query = query.options(contains_eager(Order.customer), contains_eager(Order.product))
+    cursor, size = page_args()
+    page = paginate(query, (Order.order_placed_date, Order.id), cursor, size, descending=(sort != 'oldest'))
+    if wants_page_json():
+        return page_json(page, 'order_rows.html', orders=page.items)
 
     # Pass search parameters back to the template for persistence
     return render_template('order.html',
-                           orders=orders,
+                           orders=page.items,
+                           page=page,
                            product_category=product_category,
                            start_date=start_date,
                            end_date=end_date,
@@ -221,56 +219,21 @@ def order_details(order_id):
 @order_bp.route('/export/excel')
 @login_required
 def export_to_excel():
-    orders = Order.query.all()
-    data = [{
-        'Order Number': order.order_number,
-        'Customer': order.customer.name,
-        'Product': order.product.name,
-        'Quantity': order.quantity,
-        'Total': order.total,
-        'Status': order.order_status
-    } for order in orders]
-
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Orders')
-    output.seek(0)
-
-    return Response(
-        output,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment;filename=orders.xlsx"}
-    )
+    query = db.session.query(Order.order_number, Customer.name, Product.name, Order.quantity, Order.total, Order.order_status).outerjoin(
+        Customer, Order.customer_id == Customer.id
+    ).outerjoin(Product, Order.product_id == Product.id).order_by(Order.id)
+    headers = ['Order Number', 'Customer', 'Product', 'Quantity', 'Total', 'Status']
+    return stream_excel([('Orders', headers, query_rows(query, list))], 'orders.xlsx')
 
 @order_bp.route('/export/pdf')
 @login_required
 def export_to_pdf():
-    orders = Order.query.all()
+    query = db.session.query(Order.order_number, Customer.name, Product.name, Order.quantity, Order.total, Order.order_status).outerjoin(
+        Customer, Order.customer_id == Customer.id
+    ).outerjoin(Product, Order.product_id == Product.id).order_by(Order.id)
     data = [['Order Number', 'Customer', 'Product', 'Quantity', 'Total', 'Status']]
     data.extend([
-        [order.order_number, order.customer.name, order.product.name, str(order.quantity), f"{order.total} ETB", order.order_status]
-        for order in orders
+        [order_number, customer, product, str(quantity), f"{total} ETB", status]
+        for order_number, customer, product, quantity, total, status in query
     ])
-
-    output = BytesIO()
-    doc = SimpleDocTemplate(output, pagesize=letter)
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    doc.build([table])
-    output.seek(0)
-
-    return Response(
-        output,
-        mimetype="application/pdf",
-        headers={"Content-Disposition": "attachment;filename=orders.pdf"}
-    )
\ No newline at end of file
+    return pdf_file('orders.pdf', tables=[{'rows': data, 'header_font_size': 14}])
\ No newline at end of file
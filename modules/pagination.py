@@ -0,0 +1,191 @@
+from flask import current_app, request, jsonify, render_template, url_for
+from database import db
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.util import find_tables
+from collections import OrderedDict
+from datetime import date, datetime
+import threading
+import base64
+import json
+import time
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+DEFAULT_COUNT_TTL = 300
+COUNT_CACHE_SIZE = 256
+
+# (sql, params) -> (count, expires_at, tables); dropped early when a commit writes one of its tables
+_counts = OrderedDict()
+_counts_lock = threading.Lock()
+_view_tables = {}
+
+class Page:
+    """One keyset page: the rows, the cursor for the next page and the (cached) total."""
+
+    def __init__(self, items, next_cursor, total, size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+        self.size = size
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps([_plain(v) for v in values]).encode()).decode().rstrip('=')
+
+def _typed(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+def decode_cursor(cursor, columns):
+    """Cursor values converted back to the sort columns' types; None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(columns):
+            return None
+        return [_typed(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        return None
+
+def _after(order_by, values, descending):
+    """Rows strictly after values in order_by order; order_by is a sort column and a unique tiebreaker, or just the latter."""
+    if len(order_by) == 1:
+        column, value = order_by[0], values[0]
+        return column < value if descending else column > value
+    (column, tie), (value, tie_value) = order_by, values
+    tie_after = tie < tie_value if descending else tie > tie_value
+    # SQLite sorts NULLs first ascending and last descending
+    if value is None:
+        nulls_after = db.and_(column.is_(None), tie_after)
+        return nulls_after if descending else db.or_(nulls_after, column.isnot(None))
+    row, cursor_row = db.tuple_(column, tie), db.tuple_(value, tie_value)
+    after = row < cursor_row if descending else row > cursor_row
+    if descending and getattr(column.expression, 'nullable', True):
+        return db.or_(after, column.is_(None))
+    return after
+
+def _page_size():
+    try:
+        return current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    except RuntimeError:
+        return DEFAULT_PAGE_SIZE
+
+def _count_ttl():
+    try:
+        return current_app.config.get('PAGE_COUNT_TTL', DEFAULT_COUNT_TTL)
+    except RuntimeError:
+        return DEFAULT_COUNT_TTL
+
+def cached_count(query):
+    """COUNT(*) of query, reused until a commit writes one of its tables or PAGE_COUNT_TTL seconds pass."""
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    key = (str(compiled), tuple(sorted((name, repr(value)) for name, value in compiled.params.items())))
+    now = time.monotonic()
+    with _counts_lock:
+        entry = _counts.get(key)
+        if entry is not None and entry[1] > now:
+            _counts.move_to_end(key)
+            return entry[0]
+    total = query.order_by(None).count()
+    tables = frozenset(table.name for table in find_tables(statement, include_joins=True) if hasattr(table, 'name'))
+    tables = tables.union(*[_view_tables[name] for name in tables if name in _view_tables])
+    with _counts_lock:
+        _counts[key] = (total, now + _count_ttl(), tables)
+        while len(_counts) > COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return total
+
+def paginate(query, order_by, cursor=None, size=None, descending=False):
+    """Seek to the page after cursor in (order_by...) order without OFFSET, so every page costs the same.
+
+    order_by is (sort column, id) or (id,); the pair should be covered by one index.
+    Works for entity queries and column queries alike, reading the cursor values off the last row.
+    """
+    size = max(1, min(size or _page_size(), MAX_PAGE_SIZE))
+    total = cached_count(query)
+    values = decode_cursor(cursor, order_by)
+    if values is not None:
+        query = query.filter(_after(order_by, values, descending))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in order_by])
+    rows = query.limit(size + 1).all()
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in order_by])
+    return Page(rows, next_cursor, total, size)
+
+def page_args():
+    return request.args.get('cursor'), request.args.get('size', type=int)
+
+def wants_page_json(list_name=None):
+    return request.args.get('format') == 'json' and request.args.get('list') == list_name
+
+def load_more_url(list_name=None):
+    """The current page's URL asking for the JSON rows of list_name (for pages with several lists)."""
+    args = {key: value for key, value in request.args.items() if key not in ('cursor', 'size', 'format', 'list')}
+    if list_name:
+        args['list'] = list_name
+    return url_for(request.endpoint, **(request.view_args or {}), **args, format='json')
+
+def page_data(page, rows_template, **context):
+    """The next rows rendered with the page's own row template, plus paging state."""
+    return {
+        'html': render_template(rows_template, **context),
+        'count': len(page.items),
+        'next_cursor': page.next_cursor,
+        'has_more': page.has_more,
+        'total': page.total
+    }
+
+def page_json(page, rows_template, **context):
+    """'Load more' answer for page_data."""
+    return jsonify(page_data(page, rows_template, **context))
+
+def watch_view(view, *tables):
+    """Counts read through view are dropped when any of tables is written."""
+    _view_tables[view] = frozenset(tables)
+
+def invalidate_counts(*tables):
+    """Drop the cached counts reading any of tables; for writes made in raw SQL text, which the hooks below cannot see."""
+    written = set(tables)
+    with _counts_lock:
+        for key in [key for key, entry in _counts.items() if entry[2] & written]:
+            del _counts[key]
+
+# Every INSERT/UPDATE/DELETE statement is seen here, from ORM flushes, bulk inserts and Core connections alike;
+# its table's counts are dropped once that connection commits
+@event.listens_for(Engine, 'after_execute')
+def _track_count_writes(connection, clauseelement, multiparams, params, execution_options, result):
+    if getattr(clauseelement, 'is_dml', False) and getattr(clauseelement, 'table', None) is not None:
+        connection.info.setdefault('paged_tables_written', set()).add(clauseelement.table.name)
+
+@event.listens_for(Engine, 'commit')
+def _invalidate_counts(connection):
+    written = connection.info.pop('paged_tables_written', None)
+    if written:
+        invalidate_counts(*written)
+
+@event.listens_for(Engine, 'rollback')
+def _forget_count_writes(connection):
+    connection.info.pop('paged_tables_written', None)
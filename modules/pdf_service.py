@@ -0,0 +1,129 @@
+from flask import current_app, send_file
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+import multiprocessing
+import threading
+import logging
+import os
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Rows per Table flowable; ReportLab splits one huge table far more slowly than many small ones
+TABLE_CHUNK_ROWS = 500
+CELL_PADDING = 12  # default left + right padding
+BODY_FONT_SIZE = 10
+PAGE_SIZES = {'letter': letter, 'landscape': landscape(letter)}
+
+_pool = {'executor': None}
+_pool_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def table_style(header_font_size=None):
+    """Shared grey-header / beige-body grid style, built once per header size."""
+    commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]
+    if header_font_size:
+        commands.insert(4, ('FONTSIZE', (0, 0), (-1, 0), header_font_size))
+    return TableStyle(commands)
+
+def _cell_text(value):
+    return '' if value is None else str(value)
+
+def column_widths(rows, header_font_size=None):
+    """Widest cell per column, measured once so every chunk of a table lines up."""
+    header, body = rows[0], rows[1:]
+    widths = [stringWidth(_cell_text(value), 'Helvetica-Bold', header_font_size or BODY_FONT_SIZE) for value in header]
+    for row in body:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], stringWidth(_cell_text(value), 'Helvetica', BODY_FONT_SIZE))
+    return [width + CELL_PADDING for width in widths]
+
+def chunked_tables(rows, header_font_size=None, chunk_rows=TABLE_CHUNK_ROWS):
+    """Split header + rows into Tables of chunk_rows rows, each repeating the header on every page."""
+    header, body = rows[0], rows[1:]
+    style = table_style(header_font_size)
+    widths = column_widths(rows, header_font_size)
+    if not body:
+        return [Table([header], colWidths=widths, style=style)]
+    return [
+        Table([header] + body[start:start + chunk_rows], colWidths=widths, repeatRows=1, style=style)
+        for start in range(0, len(body), chunk_rows)
+    ]
+
+def _render_lines(spec):
+    # Plain text document: heading and one line per row, as hr.generate_pdf has always drawn it
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    c.drawString(100, height - 50, spec.get('title') or '')
+    text = c.beginText(100, height - 100)
+    text.setFont("Helvetica", 12)
+    for line in spec['lines']:
+        text.textLine(line)
+    c.drawText(text)
+    c.save()
+    return buffer.getvalue()
+
+def _render(spec):
+    if spec.get('lines') is not None:
+        return _render_lines(spec)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=PAGE_SIZES[spec.get('pagesize', 'letter')])
+    elements = []
+    styles = getSampleStyleSheet()
+    if spec.get('title'):
+        elements.append(Paragraph(spec['title'], styles['Title']))
+        elements.append(Spacer(1, 12))
+    for table in spec.get('tables', []):
+        if table.get('heading'):
+            elements.append(Paragraph(table['heading'], styles['Heading2']))
+        elements.extend(chunked_tables(table['rows'], table.get('header_font_size')))
+    doc.build(elements)
+    return buffer.getvalue()
+
+def _workers():
+    try:
+        return current_app.config.get('PDF_WORKERS', os.cpu_count() or 1)
+    except RuntimeError:
+        return os.cpu_count() or 1
+
+def _executor():
+    workers = _workers()
+    if workers <= 0 or multiprocessing.parent_process() is not None:
+        # Disabled, or already inside a pool worker (e.g. a report job): render in this process
+        return None
+    with _pool_lock:
+        if _pool['executor'] is None:
+            _pool['executor'] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool['executor']
+
+def render_pdf(title=None, tables=(), lines=None, pagesize='letter'):
+    """Render a document in the PDF process pool and return its bytes.
+
+    tables is a list of {'rows': [header, *rows], 'heading': ..., 'header_font_size': ...};
+    lines renders a plain text document instead. Everything passed must be picklable.
+    """
+    spec = {'title': title, 'tables': list(tables), 'lines': lines, 'pagesize': pagesize}
+    executor = _executor()
+    if executor is None:
+        return _render(spec)
+    return executor.submit(_render, spec).result()
+
+def pdf_file(download_name, **document):
+    output = BytesIO(render_pdf(**document))
+    return send_file(output, download_name=download_name, as_attachment=True, mimetype='application/pdf')
@@ -1,13 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, abort
 from flask_login import login_required, current_user
 from database import db
-from modules.models import Product, ProductConfig, ProductPlan, Sale, User, Customer, SalesRecord
+from modules.models import Product, ProductConfig, ProductPlan, Sale, User, Customer, SalesRecord, SalesRollup
+from modules.sales_rollup import product_totals
+from modules.pdf_service import pdf_file
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
+from itertools import accumulate
 import pandas as pd
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
 import logging
 import sqlite3
 from flask_wtf.csrf import CSRFProtect, validate_csrf
@@ -19,10 +20,38 @@ logger = logging.getLogger(__name__)
 
 planning_bp = Blueprint('planning', __name__)
 
+EMPTY_TOTALS = {'quantity': 0.0, 'total_price': 0.0, 'amount': 0.0}
+
 def get_week_start(date):
     return date - timedelta(days=date.weekday())
 
-def aggregate_plans(plans, period, is_service=False):
+def load_plans():
+    return ProductPlan.query.options(
+        joinedload(ProductPlan.product).joinedload(Product.config),
+        joinedload(ProductPlan.product).joinedload(Product.customer)
+    ).all()
+
+def resolve_plan_actuals(plans, chunk_size=500):
+    # One range-join aggregate per chunk of plans instead of a Sale query per plan
+    actuals = {plan.id: (0.0, 0.0) for plan in plans}
+    plan_ids = list(actuals)
+    for i in range(0, len(plan_ids), chunk_size):
+        rows = db.session.query(
+            ProductPlan.id,
+            db.func.coalesce(db.func.sum(Sale.quantity), 0.0),
+            db.func.coalesce(db.func.sum(Sale.total_price), 0.0)
+        ).join(Sale, db.and_(
+            Sale.product_id == ProductPlan.product_id,
+            Sale.sale_date >= ProductPlan.start_date,
+            Sale.sale_date <= ProductPlan.end_date
+        )).filter(ProductPlan.id.in_(plan_ids[i:i + chunk_size])).group_by(ProductPlan.id).all()
+        for plan_id, quantity, value in rows:
+            actuals[plan_id] = (float(quantity), float(value))
+    return actuals
+
+def aggregate_plans(plans, period, is_service=False, actuals=None):
+    if actuals is None:
+        actuals = resolve_plan_actuals(plans)
     periods = {'weekly': 'W', 'monthly': 'M', 'quarterly': 'Q', 'bi-annual': '6M', 'annual': 'Y'}
     grouped = {}
     totals = {'planned_quantity': 0, 'actual_quantity': 0, 'planned_value': 0, 'actual_value': 0}
@@ -45,9 +74,7 @@ def aggregate_plans(plans, period, is_service=False):
         if period_key not in grouped:
             grouped[period_key] = {'plans': [], 'totals': {'planned_quantity': 0, 'actual_quantity': 0, 'planned_value': 0, 'actual_value': 0}}
         
-        sales = Sale.query.filter(Sale.product_id == plan.product_id, Sale.sale_date.between(plan.start_date, plan.end_date)).all()
-        actual_quantity = sum(sale.quantity for sale in sales)
-        actual_value = sum(sale.total_price for sale in sales)
+        actual_quantity, actual_value = actuals.get(plan.id, (0.0, 0.0))
         
         customer_name = plan.product.customer.name if plan.product.customer else 'N/A'
         
@@ -91,8 +118,51 @@ def aggregate_plans(plans, period, is_service=False):
     totals['value_percentage'] = float((totals['actual_value'] / totals['planned_value'] * 100) if totals['planned_value'] > 0 else 0)
     return {'grouped': grouped, 'totals': totals}
 
-def get_chart_data(plans, period):
-    result = aggregate_plans(plans, period)
+def build_sales_summary(plans, sales_totals):
+    # Every plan counts its product's all-time sales, as the summary always has
+    summary = {}
+    for cat in ['direct', 'service']:
+        if cat == 'direct':
+            cat_plans = [p for p in plans if not p.product.config or p.product.config.supports_direct_sales]
+        else:
+            cat_plans = [p for p in plans if p.product.config and p.product.config.supports_service_sales]
+        planned_quantity = float(sum(p.planned_quantity for p in cat_plans))
+        planned_value = float(sum(p.planned_value for p in cat_plans))
+        actual_quantity = float(sum(sales_totals.get(p.product_id, EMPTY_TOTALS)['quantity'] for p in cat_plans))
+        actual_value = float(sum(sales_totals.get(p.product_id, EMPTY_TOTALS)['total_price'] for p in cat_plans))
+        summary[cat] = {
+            'planned_quantity': planned_quantity,
+            'actual_quantity': actual_quantity,
+            'planned_value': planned_value,
+            'actual_value': actual_value,
+            'quantity_percentage': float((actual_quantity / planned_quantity * 100) if planned_quantity > 0 else 0),
+            'value_percentage': float((actual_value / planned_value * 100) if planned_value > 0 else 0)
+        }
+    return summary
+
+def build_comparison_data(products):
+    today = datetime.today().date()
+    this_month = today.strftime('%Y-%m')
+    last_month = (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    # Same month a year earlier
+    last_year = f"{today.year - 1:04d}-{today.month:02d}"
+    rows = db.session.query(SalesRollup.product_id, SalesRollup.period, db.func.sum(SalesRollup.total_price)).filter(
+        SalesRollup.period.in_([this_month, last_month, last_year])
+    ).group_by(SalesRollup.product_id, SalesRollup.period).all()
+    by_product = {}
+    for product_id, period, value in rows:
+        by_product.setdefault(product_id, {})[period] = float(value or 0)
+    return {
+        p.name: {
+            'this_month': by_product.get(p.id, {}).get(this_month, 0),
+            'last_month': by_product.get(p.id, {}).get(last_month, 0),
+            'last_year': by_product.get(p.id, {}).get(last_year, 0)
+        }
+        for p in products
+    }
+
+def get_chart_data(plans, period, actuals=None):
+    result = aggregate_plans(plans, period, actuals=actuals)
     grouped = result['grouped']
     labels = sorted(grouped.keys())
     sales = {}
@@ -118,16 +188,18 @@ def planning():
         flash('You do not have permission to access planning!', 'danger')
         return redirect(url_for('dashboard.dashboard'))
 
-    plans = ProductPlan.query.join(Product).outerjoin(ProductConfig, Product.id == ProductConfig.product_id).all()
+    plans = load_plans()
+    actuals = resolve_plan_actuals(plans)
+    sales_totals = product_totals()
     products = Product.query.all()
     date_range = [datetime.today().date()]
 
-    weekly_data = aggregate_plans(plans, 'weekly')
-    monthly_data = aggregate_plans(plans, 'monthly')
-    quarterly_data = aggregate_plans(plans, 'quarterly')
-    bi_annual_data = aggregate_plans(plans, 'bi-annual')
-    annual_data = aggregate_plans(plans, 'annual')
-    service_data = aggregate_plans(plans, 'annual', is_service=True)
+    weekly_data = aggregate_plans(plans, 'weekly', actuals=actuals)
+    monthly_data = aggregate_plans(plans, 'monthly', actuals=actuals)
+    quarterly_data = aggregate_plans(plans, 'quarterly', actuals=actuals)
+    bi_annual_data = aggregate_plans(plans, 'bi-annual', actuals=actuals)
+    annual_data = aggregate_plans(plans, 'annual', actuals=actuals)
+    service_data = aggregate_plans(plans, 'annual', is_service=True, actuals=actuals)
 
     sales_data = {
         'weekly': weekly_data['totals'],
@@ -136,28 +208,8 @@ def planning():
         'bi_annual': bi_annual_data['totals'],
         'annual': annual_data['totals'],
         'service': service_data['totals'],
-        'summary': {
-            'direct': {
-                'planned_quantity': float(sum(p.planned_quantity for p in plans if not p.product.config or p.product.config.supports_direct_sales)),
-                'actual_quantity': float(sum(sum(s.quantity for s in Sale.query.filter_by(product_id=p.product_id).all()) for p in plans if not p.product.config or p.product.config.supports_direct_sales)),
-                'planned_value': float(sum(p.planned_value for p in plans if not p.product.config or p.product.config.supports_direct_sales)),
-                'actual_value': float(sum(sum(s.total_price for s in Sale.query.filter_by(product_id=p.product_id).all()) for p in plans if not p.product.config or p.product.config.supports_direct_sales)),
-                'quantity_percentage': 0,
-                'value_percentage': 0
-            },
-            'service': {
-                'planned_quantity': float(sum(p.planned_quantity for p in plans if p.product.config and p.product.config.supports_service_sales)),
-                'actual_quantity': float(sum(sum(s.quantity for s in Sale.query.filter_by(product_id=p.product_id).all()) for p in plans if p.product.config and p.product.config.supports_service_sales)),
-                'planned_value': float(sum(p.planned_value for p in plans if p.product.config and p.product.config.supports_service_sales)),
-                'actual_value': float(sum(sum(s.total_price for s in Sale.query.filter_by(product_id=p.product_id).all()) for p in plans if p.product.config and p.product.config.supports_service_sales)),
-                'quantity_percentage': 0,
-                'value_percentage': 0
-            }
-        }
+        'summary': build_sales_summary(plans, sales_totals)
     }
-    for cat in ['direct', 'service']:
-        sales_data['summary'][cat]['quantity_percentage'] = float((sales_data['summary'][cat]['actual_quantity'] / sales_data['summary'][cat]['planned_quantity'] * 100) if sales_data['summary'][cat]['planned_quantity'] > 0 else 0)
-        sales_data['summary'][cat]['value_percentage'] = float((sales_data['summary'][cat]['actual_value'] / sales_data['summary'][cat]['planned_value'] * 100) if sales_data['summary'][cat]['planned_value'] > 0 else 0)
 
     sales_data['weekly']['plans'] = weekly_data['grouped'].get(next(iter(weekly_data['grouped']), None), {}).get('plans', [])
     sales_data['monthly']['plans'] = monthly_data['grouped'].get(next(iter(monthly_data['grouped']), None), {}).get('plans', [])
@@ -167,21 +219,21 @@ def planning():
     sales_data['service']['plans'] = service_data['grouped'].get(next(iter(service_data['grouped']), None), {}).get('plans', [])
 
     chart_data = {
-        'weekly': get_chart_data(plans, 'weekly'),
-        'monthly': get_chart_data(plans, 'monthly'),
-        'quarterly': get_chart_data(plans, 'quarterly'),
-        'bi_annual': get_chart_data(plans, 'bi-annual'),
-        'annual': get_chart_data(plans, 'annual'),
-        'service': get_chart_data([p for p in plans if p.product.config and p.product.config.supports_service_sales], 'annual')
+        'weekly': get_chart_data(plans, 'weekly', actuals),
+        'monthly': get_chart_data(plans, 'monthly', actuals),
+        'quarterly': get_chart_data(plans, 'quarterly', actuals),
+        'bi_annual': get_chart_data(plans, 'bi-annual', actuals),
+        'annual': get_chart_data(plans, 'annual', actuals),
+        'service': get_chart_data([p for p in plans if p.product.config and p.product.config.supports_service_sales], 'annual', actuals)
     }
 
-    pareto_data = sorted([(p.product.name, sum(s.total_price for s in Sale.query.filter_by(product_id=p.product_id).all())) for p in plans], key=lambda x: x[1], reverse=True)
+    pareto_data = sorted([(p.product.name, sales_totals.get(p.product_id, EMPTY_TOTALS)['total_price']) for p in plans], key=lambda x: x[1], reverse=True)
     pareto_labels = [x[0] for x in pareto_data]
     pareto_values = [float(x[1]) for x in pareto_data]
     total = sum(pareto_values)
-    pareto_cumulative = [float(sum(pareto_values[:i+1]) / total * 100) for i in range(len(pareto_values))] if total > 0 else [0] * len(pareto_values)
+    pareto_cumulative = [float(running / total * 100) for running in accumulate(pareto_values)] if total > 0 else [0] * len(pareto_values)
 
-    comparison_data = {p.name: {'this_month': 0, 'last_month': 0, 'last_year': 0} for p in products}
+    comparison_data = build_comparison_data(products)
 
     return render_template('planning.html', products=products, date_range=date_range, sales_data=sales_data, chart_data=chart_data, pareto_labels=pareto_labels, pareto_values=pareto_values, pareto_cumulative=pareto_cumulative, comparison_data=comparison_data, quantity_uom='Units', value_uom='ETB')
 
@@ -324,10 +376,12 @@ def delete_plan(plan_id):
 @planning_bp.route('/planning/export_excel/<period>')
 @login_required
 def export_excel(period):
-    plans = ProductPlan.query.join(Product).outerjoin(ProductConfig, Product.id == ProductConfig.product_id).all()
-    data = aggregate_plans(plans, period) if period != 'service' else aggregate_plans(plans, 'annual', is_service=True)
-    sales_data = planning().get('sales_data')['summary'] if period == 'summary' else data['totals']
-    grouped_data = data['grouped']
+    plans = load_plans()
+    if period == 'summary':
+        sales_data = build_sales_summary(plans, product_totals())
+    else:
+        data = aggregate_plans(plans, period) if period != 'service' else aggregate_plans(plans, 'annual', is_service=True)
+        grouped_data = data['grouped']
 
     if period == 'summary':
         data = [
@@ -356,10 +410,12 @@ def export_excel(period):
 @planning_bp.route('/planning/export_pdf/<period>')
 @login_required
 def export_pdf(period):
-    plans = ProductPlan.query.join(Product).outerjoin(ProductConfig, Product.id == ProductConfig.product_id).all()
-    data = aggregate_plans(plans, period) if period != 'service' else aggregate_plans(plans, 'annual', is_service=True)
-    sales_data = planning().get('sales_data')['summary'] if period == 'summary' else data['totals']
-    grouped_data = data['grouped']
+    plans = load_plans()
+    if period == 'summary':
+        sales_data = build_sales_summary(plans, product_totals())
+    else:
+        data = aggregate_plans(plans, period) if period != 'service' else aggregate_plans(plans, 'annual', is_service=True)
+        grouped_data = data['grouped']
 
     if period == 'summary':
         data = [
@@ -378,19 +434,4 @@ def export_pdf(period):
                 ])
             data.append(['Total', '', '', '', f"{period_data['totals']['planned_quantity']:.2f}", f"{period_data['totals']['actual_quantity']:.2f}", f"{period_data['totals']['quantity_percentage']:.2f}%", f"{period_data['totals']['planned_value']:.2f}", f"{period_data['totals']['actual_value']:.2f}", f"{period_data['totals']['value_percentage']:.2f}%", '100%'])
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    doc.build([table])
-    buffer.seek(0)
-    return send_file(buffer, download_name=f'{period}_plans.pdf', as_attachment=True)
\ No newline at end of file
+    return pdf_file(f'{period}_plans.pdf', tables=[{'rows': data, 'header_font_size': 12}])
\ No newline at end of file
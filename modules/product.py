@@ -1,15 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SelectField, FileField, SubmitField, IntegerField
 from wtforms.validators import DataRequired
 from database import db
 from modules.models import Product, ProductPlan, PlanChangeLog, Customer, Order, DutyStation, ProductConfig, ProductPrice
+from modules.excel_export import stream_excel, query_rows
+from modules.pagination import paginate, page_args, page_json, wants_page_json
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 import os
 import logging
-import pandas as pd
-from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 from reportlab.lib import colors
@@ -56,6 +57,28 @@ def calculate_customer_rating(customer_id):
         rating = 0.0
     return round(rating, 2)
 
+def refresh_customer_ratings():
+    # Same scale as calculate_customer_rating, for every customer in one UPDATE
+    max_order_count = db.session.query(db.func.count(Order.id)).group_by(Order.customer_id).order_by(db.func.count(Order.id).desc()).first()
+    max_order_count = max_order_count[0] if max_order_count else 0
+    if max_order_count > 0:
+        order_count = db.session.query(db.func.count(Order.id)).filter(Order.customer_id == Customer.id).correlate(Customer).scalar_subquery()
+        rating = db.func.round(order_count * 5.0 / max_order_count, 2)
+    else:
+        rating = 0.0
+    db.session.query(Customer).update({Customer.rating: rating}, synchronize_session=False)
+    db.session.commit()
+
+def rate_customers(customers):
+    # Same scale as calculate_customer_rating, for one page of customers with a single grouped count
+    max_order_count = db.session.query(db.func.count(Order.id)).group_by(Order.customer_id).order_by(db.func.count(Order.id).desc()).first()
+    max_order_count = max_order_count[0] if max_order_count else 0
+    order_counts = dict(db.session.query(Order.customer_id, db.func.count(Order.id)).filter(
+        Order.customer_id.in_([customer.id for customer in customers])
+    ).group_by(Order.customer_id).all()) if customers else {}
+    for customer in customers:
+        customer.rating = round(order_counts.get(customer.id, 0) / max_order_count * 5, 2) if max_order_count > 0 else 0.0
+
 class EditProductForm(FlaskForm):
     name = StringField('Product Name', validators=[DataRequired()])
     description = StringField('Description')
@@ -99,9 +122,11 @@ def products():
     if category != 'all':
         query = query.filter(Product.product_type.ilike(category))
     
-    products = query.all()
-    customers = Customer.query.all()
-    return render_template('products.html', products=products, search_query=search_query, category=category, customers=customers)
+    cursor, size = page_args()
+    page = paginate(query.options(joinedload(Product.customer)), (Product.id,), cursor, size)
+    if wants_page_json():
+        return page_json(page, 'product_rows.html', products=page.items)
+    return render_template('products.html', products=page.items, page=page, search_query=search_query, category=category)
 
 @product_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -517,11 +542,13 @@ def customers():
     if not (current_user.is_admin() or current_user.has_permission('customers')):
         flash('You do not have permission to view customers!', 'danger')
         return redirect(url_for('dashboard.dashboard'))
-    customers = Customer.query.all()
-    for customer in customers:
-        customer.rating = calculate_customer_rating(customer.id)
+    cursor, size = page_args()
+    page = paginate(Customer.query, (Customer.id,), cursor, size)
+    rate_customers(page.items)
     db.session.commit()
-    return render_template('customers.html', customers=customers)
+    if wants_page_json():
+        return page_json(page, 'customer_rows.html', customers=page.items)
+    return render_template('customers.html', customers=page.items, page=page)
 
 @product_bp.route('/customer/add', methods=['GET', 'POST'])
 @login_required
@@ -612,24 +639,12 @@ def export_customers(format):
         flash('You do not have permission to export customers!', 'danger')
         return redirect(url_for('dashboard.dashboard'))
     
-    customers = Customer.query.all()
-    for customer in customers:
-        customer.rating = calculate_customer_rating(customer.id)
-    db.session.commit()
+    refresh_customer_ratings()
 
     if format == 'excel':
-        data = [{
-            'ID': c.id,
-            'Name': c.name,
-            'Email': c.email,
-            'Phone Number': c.phone_number or 'N/A',
-            'Location Address': c.location_address or 'N/A',
-            'Product Types': c.product_types or 'N/A',
-            'Rating': c.rating
-        } for c in customers]
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Customers')
-        output.seek(0)
-        return send_file(output, download_name='customers.xlsx', as_attachment=True)
\ No newline at end of file
+        query = Customer.query.order_by(Customer.id)
+        headers = ['ID', 'Name', 'Email', 'Phone Number', 'Location Address', 'Product Types', 'Rating']
+        rows = query_rows(query, lambda c: [
+            c.id, c.name, c.email, c.phone_number or 'N/A', c.location_address or 'N/A', c.product_types or 'N/A', c.rating
+        ])
+        return stream_excel([('Customers', headers, rows)], 'customers.xlsx')
\ No newline at end of file
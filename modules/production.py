@@ -1,11 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, Response
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, jsonify
 from flask_login import login_required
 from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SelectField, IntegerField, DateField, SubmitField
 from wtforms.validators import DataRequired
 from .production_models import Machine, ProductionConfig, ProductionRecord, db
-from .production_bridge import get_production_data, get_duty_station_summary, calculate_plan
-from .models import DutyStation  # Import DutyStation from modules.models
+from .production_reference import station_choices, machine_choices, machine_list, station_config
+from .production_bridge import get_duty_station_summary, production_records, performance_rows
+from .production_oee import production_analytics
+from .machine_capacity import capacity_for
+from .machine_readings import gateway_authorized, parse_readings, buffer_readings
+from .production_rollups import GRANULARITIES, production_series, yearly_utilization
+from .pdf_service import pdf_file
 from reportlab.platypus import SimpleDocTemplate, Table
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
@@ -33,7 +38,7 @@ class MachineSetupForm(FlaskForm):
     efficiency_factor = FloatField('Efficiency Factor (0-1)', default=0.8)
     working_hours = FloatField('Working Hours/Day', default=8.0)
     working_days = IntegerField('Working Days/Period', default=25)
-    manual_capacity = FloatField('Manual Capacity (Optional)')
+    manual_capacity = FloatField('Manual Capacity per Month (Optional)')
     submit = SubmitField('Save Machine')
 
 # Production Form
@@ -64,14 +69,10 @@ def production():
     print("DEBUG: setup_form initialized:", setup_form)
     print("DEBUG: form initialized:", form)
 
-    # Populate form choices
+    # Populate form choices from the cached reference data
     try:
-        duty_stations = DutyStation.query.all()
-        print("DEBUG: Duty stations retrieved:", [(d.id, d.name) for d in duty_stations])
-        setup_form.duty_station.choices = [(d.id, d.name) for d in duty_stations]
-        machines = Machine.query.all()
-        print("DEBUG: Machines retrieved:", machines)
-        form.machine.choices = [(m.id, f"{m.name} ({m.process_type})") for m in machines]
+        setup_form.duty_station.choices = station_choices()
+        form.machine.choices = machine_choices()
     except Exception as e:
         print(f"DEBUG: Error populating form choices: {e}")
         flash(f"Error populating form choices: {e}", 'danger')
@@ -91,15 +92,14 @@ def production():
                 efficiency_factor=setup_form.efficiency_factor.data,
                 manual_capacity=setup_form.manual_capacity.data
             )
-            config = ProductionConfig.query.filter_by(duty_station_id=setup_form.duty_station.data).first()
-            if not config:
-                config = ProductionConfig(
+            db.session.add(machine)
+            # A station keeps its first config; later machines share it
+            if station_config(setup_form.duty_station.data) is None:
+                db.session.add(ProductionConfig(
                     duty_station_id=setup_form.duty_station.data,
                     working_hours=setup_form.working_hours.data,
                     working_days=setup_form.working_days.data
-                )
-            db.session.add(machine)
-            db.session.add(config)
+                ))
             db.session.commit()
             flash('Machine setup completed!', 'success')
             return redirect(url_for('production.production', tab='setup'))
@@ -111,14 +111,9 @@ def production():
         print("DEBUG: Production form submitted with data:", form.data)
         print("DEBUG: Production form errors:", form.errors)
         if form.validate_on_submit():
-            machine = Machine.query.get(form.machine.data)
-            config = ProductionConfig.query.filter_by(duty_station_id=machine.duty_station_id).first()
-            if not config:
-                flash('Production configuration not found for this machine’s duty station.', 'danger')
-                return redirect(url_for('production.production', tab='production'))
-            capacity = machine.manual_capacity or (machine.installed_capacity * machine.efficiency_factor * config.working_hours * config.working_days)
+            capacity = capacity_for(form.machine.data, form.period_type.data, form.start_date.data)
             if capacity == 0:
-                flash('Capacity is zero. Please check machine configuration.', 'danger')
+                flash('No capacity is planned for this machine in that period. Please check its configuration and shifts.', 'danger')
                 return redirect(url_for('production.production', tab='production'))
             record = ProductionRecord(
                 machine_id=form.machine.data,
@@ -136,36 +131,9 @@ def production():
         else:
             flash('Form validation failed. Please check your inputs.', 'danger')
 
-    # Prepare data for the templates
-    machines = Machine.query.all()
-    records = ProductionRecord.query.all()
-    
-    # Resolve machine names for production records
-    records_with_machine_names = []
-    for record in records:
-        machine = Machine.query.get(record.machine_id)
-        machine_name = machine.name if machine else 'Unknown'
-        records_with_machine_names.append({
-            'machine_name': machine_name,
-            'period_type': record.period_type,
-            'start_date': record.start_date,
-            'end_date': record.end_date,
-            'actual_quantity': record.actual_quantity,
-            'uom': record.uom,
-            'utilized_capacity': record.utilized_capacity
-        })
-
-    # Resolve duty station names for machines (for the setup tab)
-    machines_with_duty_stations = []
-    for machine in machines:
-        ds = DutyStation.query.get(machine.duty_station_id)
-        duty_station_name = ds.name if ds else 'Unknown'
-        machines_with_duty_stations.append({
-            'name': machine.name,
-            'duty_station_name': duty_station_name,
-            'process_type': machine.process_type,
-            'installed_capacity': machine.installed_capacity
-        })
+    # Prepare data for the templates: machines with their station names come from the reference cache
+    machines = machine_list()
+    records = production_records()
 
     # Prepare data for the Reporting tab
     period = request.args.get('period', 'Monthly')
@@ -173,67 +141,18 @@ def production():
     end_date = request.args.get('end_date')
 
     # Filter records by date range if provided
-    records_query = ProductionRecord.query.filter_by(period_type=period)
     if start_date and end_date:
         try:
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            records_query = records_query.filter(
-                ProductionRecord.start_date >= start_date,
-                ProductionRecord.end_date <= end_date
-            )
         except ValueError:
             flash('Invalid date format. Please use YYYY-MM-DD.', 'danger')
+            start_date = end_date = None
 
-    filtered_records = records_query.all()
-
-    # Prepare data for bar chart (Planned vs Actual by Process Type)
-    process_types = set(m.process_type for m in machines)
-    planned_values = []
-    actual_values = []
-    perf_values = []
-    for process_type in process_types:
-        process_machines = [m for m in machines if m.process_type == process_type]
-        total_plan = 0
-        total_actual = 0
-        for machine in process_machines:
-            config = ProductionConfig.query.filter_by(duty_station_id=machine.duty_station_id).first()
-            if not config:
-                continue
-            capacity = machine.manual_capacity or (machine.installed_capacity * machine.efficiency_factor * config.working_hours * config.working_days)
-            total_plan += capacity
-            machine_records = [r for r in filtered_records if r.machine_id == machine.id]
-            total_actual += sum(r.actual_quantity for r in machine_records)
-        planned_values.append(total_plan)
-        actual_values.append(total_actual)
-        perf = (total_actual / total_plan * 100) if total_plan else 0
-        perf_values.append(perf)
-
-    # Calculate average performance
-    average_performance = sum(perf_values) / len(perf_values) if perf_values else 0
-
-    # Prepare data for production performance table
-    data = [['Factory', 'Cost Center', 'UoM', 'Plan', 'Actual', '% Perf']]
-    for record in filtered_records:
-        machine = Machine.query.get(record.machine_id)
-        ds = DutyStation.query.get(machine.duty_station_id) if machine else None
-        plan = calculate_plan(machine, period, record.start_date, record.end_date)
-        perf = (record.actual_quantity / plan) * 100 if plan else 0
-        data.append([ds.name if ds else 'Unknown', machine.process_type if machine else 'Unknown', record.uom, plan, record.actual_quantity, f"{perf:.1f}"])
-
-    # Prepare data for donut chart (Percent Contribution by Factory)
-    factory_contributions = {}
-    total_actual = sum(r.actual_quantity for r in filtered_records)
-    for record in filtered_records:
-        machine = Machine.query.get(record.machine_id)
-        ds = DutyStation.query.get(machine.duty_station_id) if machine else None
-        factory = ds.name if ds else 'Unknown'
-        if factory not in factory_contributions:
-            factory_contributions[factory] = 0
-        factory_contributions[factory] += record.actual_quantity
-
-    factory_labels = list(factory_contributions.keys())
-    factory_contributions = [factory_contributions[factory] / total_actual * 100 if total_actual else 0 for factory in factory_labels]
+    # Production performance table, planned vs actual by process type and factory contribution
+    data = performance_rows(production_records(period, start_date, end_date))
+    analytics = production_analytics(period, start_date, end_date)
+    utilization_years = yearly_utilization()
 
     # Prepare summary by duty station
     summary = get_duty_station_summary(period)
@@ -242,20 +161,15 @@ def production():
     template_vars = {
         'form': form,
         'setup_form': setup_form,
-        'machines': machines_with_duty_stations,
-        'records': records_with_machine_names,
+        'machines': machines,
+        'records': records,
         'data': data,
         'summary': summary,
         'period': period,
         'start_date': start_date,
         'end_date': end_date,
-        'process_types': list(process_types),
-        'planned_values': planned_values,
-        'actual_values': actual_values,
-        'perf_values': perf_values,
-        'average_performance': average_performance,
-        'factory_labels': factory_labels,
-        'factory_contributions': factory_contributions,
+        **analytics,
+        'utilization_years': utilization_years,
         'active_tab': active_tab,
         'title': 'Production'
     }
@@ -266,51 +180,14 @@ def production():
 @login_required
 def export_report(format):
     period = request.args.get('period', 'Monthly')
-    records = get_production_data(period_type=period)
-    data = [['Factory', 'Cost Center', 'UoM', 'Plan', 'Actual', '% Perf']]
-    for record in records:
-        machine = Machine.query.get(record.machine_id)
-        ds = DutyStation.query.get(machine.duty_station_id) if machine else None
-        plan = calculate_plan(machine, period, record.start_date, record.end_date)
-        perf = (record.actual_quantity / plan) * 100 if plan else 0
-        data.append([ds.name if ds else 'Unknown', machine.process_type if machine else 'Unknown', record.uom, plan, record.actual_quantity, f"{perf:.1f}"])
-
-    # Prepare data for charts (same as in the main route)
-    machines = Machine.query.all()
-    filtered_records = ProductionRecord.query.filter_by(period_type=period).all()
-    process_types = set(m.process_type for m in machines)
-    planned_values = []
-    actual_values = []
-    perf_values = []
-    for process_type in process_types:
-        process_machines = [m for m in machines if m.process_type == process_type]
-        total_plan = 0
-        total_actual = 0
-        for machine in process_machines:
-            config = ProductionConfig.query.filter_by(duty_station_id=machine.duty_station_id).first()
-            if not config:
-                continue
-            capacity = machine.manual_capacity or (machine.installed_capacity * machine.efficiency_factor * config.working_hours * config.working_days)
-            total_plan += capacity
-            machine_records = [r for r in filtered_records if r.machine_id == machine.id]
-            total_actual += sum(r.actual_quantity for r in machine_records)
-        planned_values.append(total_plan)
-        actual_values.append(total_actual)
-        perf = (total_actual / total_plan * 100) if total_plan else 0
-        perf_values.append(perf)
-
-    factory_contributions = {}
-    total_actual = sum(r.actual_quantity for r in filtered_records)
-    for record in filtered_records:
-        machine = Machine.query.get(record.machine_id)
-        ds = DutyStation.query.get(machine.duty_station_id) if machine else None
-        factory = ds.name if ds else 'Unknown'
-        if factory not in factory_contributions:
-            factory_contributions[factory] = 0
-        factory_contributions[factory] += record.actual_quantity
-
-    factory_labels = list(factory_contributions.keys())
-    factory_contributions = [factory_contributions[factory] / total_actual * 100 if total_actual else 0 for factory in factory_labels]
+    data = performance_rows(production_records(period))
+    analytics = production_analytics(period)
+    process_types = analytics['process_types']
+    planned_values = analytics['planned_values']
+    actual_values = analytics['actual_values']
+    perf_values = analytics['perf_values']
+    factory_labels = analytics['factory_labels']
+    factory_contributions = analytics['factory_contributions']
 
     if format == 'pdf':
         # Render the page with charts to take screenshots
@@ -324,13 +201,7 @@ def export_report(format):
             period=period,
             start_date=None,
             end_date=None,
-            process_types=list(process_types),
-            planned_values=planned_values,
-            actual_values=actual_values,
-            perf_values=perf_values,
-            average_performance=sum(perf_values) / len(perf_values) if perf_values else 0,
-            factory_labels=factory_labels,
-            factory_contributions=factory_contributions,
+            **analytics,
             active_tab='reporting',
             title='Production'
         )
@@ -407,14 +278,61 @@ def export_report(format):
             'Factory': factory_labels,
             'Contribution (%)': factory_contributions
         })
+        oee_data = pd.DataFrame([
+            {'Measure': 'Availability (%)', 'Value': analytics['oee']['availability']},
+            {'Measure': 'Performance (%)', 'Value': analytics['oee']['performance']},
+            {'Measure': 'Quality proxy (%)', 'Value': analytics['oee']['quality']},
+            {'Measure': 'OEE (%)', 'Value': analytics['oee']['oee']},
+            *[{'Measure': f"Utilization {name} (%)", 'Value': value} for name, value in analytics['utilization_percentiles'].items()]
+        ])
+        bottleneck_data = pd.DataFrame(analytics['bottlenecks'], columns=['process_type', 'machines', 'utilization', 'availability', 'performance', 'quality', 'oee'])
+        bottleneck_data.columns = ['Process Type', 'Machines', 'Utilization (%)', 'Availability (%)', 'Performance (%)', 'Quality proxy (%)', 'OEE (%)']
 
         output = BytesIO()
         with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
             df.to_excel(writer, sheet_name='Production Report', index=False)
             chart_data.to_excel(writer, sheet_name='Bar Chart Data', index=False)
             factory_data.to_excel(writer, sheet_name='Donut Chart Data', index=False)
+            oee_data.to_excel(writer, sheet_name='OEE', index=False)
+            bottleneck_data.to_excel(writer, sheet_name='Bottlenecks', index=False)
         output.seek(0)
         return Response(output.getvalue(), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers={'Content-Disposition': 'attachment;filename=production_report.xlsx'})
 
     flash('Invalid export format.', 'danger')
-    return redirect(url_for('production.production', tab='reporting'))
\ No newline at end of file
+    return redirect(url_for('production.production', tab='reporting'))
+
+# Performance table on its own: a plain PDF with ?export, otherwise the Reporting tab of the production page
+@production_bp.route('/production/reporting', methods=['GET'])
+@login_required
+def reporting():
+    period = request.args.get('period', 'Monthly')
+    if 'export' not in request.args:
+        return redirect(url_for('production.production', tab='reporting', period=period))
+    return pdf_file('production_report.pdf', tables=[{'rows': performance_rows(production_records(period))}])
+
+# Machine counter readings from shop-floor gateways: JSON lines or CSV, answered before they are written
+@production_bp.route('/readings', methods=['POST'])
+def ingest_readings():
+    if not gateway_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    readings, errors = parse_readings(request.get_data(as_text=True), request.mimetype)
+    result = {'accepted': len(readings), 'rejected': len(errors), 'errors': errors[:100]}
+    if not readings:
+        return jsonify(result), 400
+    result['buffered'] = buffer_readings(readings)
+    return jsonify(result), 202
+
+# Metered output over time at one rollup granularity, e.g. hourly output of a machine for a day
+@production_bp.route('/rollups', methods=['GET'])
+@login_required
+def production_rollups():
+    granularity = request.args.get('granularity', 'day')
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start_date and end_date are required as YYYY-MM-DD'}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    series = production_series(granularity, start_date, end_date, request.args.get('machine_id', type=int))
+    return jsonify({'granularity': granularity, 'buckets': [bucket for bucket, _ in series], 'output': [output for _, output in series]})
@@ -1,37 +1,88 @@
-from .production_models import ProductionRecord, Machine, ProductionConfig, db
+from .production_models import ProductionRecord, ProductionRollup, Machine, MachineCapacity, db
+from .machine_capacity import PERIOD_TYPES, periods_between, period_bounds
+from .production_rollups import rollup_filter, metered_months
 from .models import DutyStation
 
-def get_production_data(period_type='Monthly'):
-    # Return production records filtered by period_type
-    return ProductionRecord.query.filter_by(period_type=period_type).all()
+def capacity_of_record():
+    return db.and_(
+        MachineCapacity.machine_id == ProductionRecord.machine_id,
+        MachineCapacity.period_type == ProductionRecord.period_type,
+        MachineCapacity.period == ProductionRecord.period
+    )
 
-def get_duty_station_summary(period):
-    # Calculate summary of production by duty station
-    summary = {}
-    records = ProductionRecord.query.filter_by(period_type=period).all()
+def _filter_records(query, period=None, start_date=None, end_date=None):
+    if period:
+        query = query.filter(ProductionRecord.period_type == period)
+    if start_date and end_date:
+        query = query.filter(ProductionRecord.start_date >= start_date, ProductionRecord.end_date <= end_date)
+    return query
+
+def production_records(period=None, start_date=None, end_date=None):
+    """Production records with their machine, station and planned capacity (from machine_capacity), in one joined query."""
+    plan = db.func.coalesce(MachineCapacity.capacity, 0)
+    query = db.session.query(
+        ProductionRecord.id,
+        ProductionRecord.period_type,
+        ProductionRecord.start_date,
+        ProductionRecord.end_date,
+        ProductionRecord.actual_quantity,
+        ProductionRecord.uom,
+        ProductionRecord.utilized_capacity,
+        db.func.coalesce(Machine.name, 'Unknown').label('machine_name'),
+        db.func.coalesce(Machine.process_type, 'Unknown').label('process_type'),
+        db.func.coalesce(DutyStation.name, 'Unknown').label('duty_station_name'),
+        plan.label('plan')
+    ).outerjoin(Machine, ProductionRecord.machine_id == Machine.id) \
+     .outerjoin(DutyStation, Machine.duty_station_id == DutyStation.id) \
+     .outerjoin(MachineCapacity, capacity_of_record())
+    return _filter_records(query, period, start_date, end_date).order_by(ProductionRecord.id).all()
+
+def performance_rows(records):
+    """The production performance table: header plus one row per record."""
+    data = [['Factory', 'Cost Center', 'UoM', 'Plan', 'Actual', '% Perf']]
     for record in records:
-        machine = Machine.query.get(record.machine_id)
-        if not machine:
-            continue
-        ds = DutyStation.query.get(machine.duty_station_id)
-        if not ds:
-            continue
-        if ds.name not in summary:
-            summary[ds.name] = {'plan': 0, 'actual': 0}
-        config = ProductionConfig.query.filter_by(duty_station_id=machine.duty_station_id).first()
-        if not config:
-            continue
-        capacity = machine.manual_capacity or (machine.installed_capacity * machine.efficiency_factor * config.working_hours * config.working_days)
-        summary[ds.name]['plan'] += capacity
-        summary[ds.name]['actual'] += record.actual_quantity
-    return summary
-
-def calculate_plan(machine, period, start_date, end_date):
-    if not machine:
-        return 0
-    config = ProductionConfig.query.filter_by(duty_station_id=machine.duty_station_id).first()
-    if not config:
-        return 0
-    # Simple calculation: use installed capacity adjusted by efficiency and working hours/days
-    capacity = machine.manual_capacity or (machine.installed_capacity * machine.efficiency_factor * config.working_hours * config.working_days)
-    return capacity
\ No newline at end of file
+        perf = (record.actual_quantity / record.plan) * 100 if record.plan else 0
+        data.append([record.duty_station_name, record.process_type, record.uom, record.plan, record.actual_quantity, f"{perf:.1f}"])
+    return data
+
+def report_periods(period_type, start_date=None, end_date=None):
+    """Periods a report covers: those in the date range, or else every period with records or metered output."""
+    if period_type not in PERIOD_TYPES:
+        return []
+    if start_date and end_date:
+        return periods_between(period_type, start_date, end_date)
+    periods = {period for (period,) in db.session.query(ProductionRecord.period).filter(
+        ProductionRecord.period_type == period_type, ProductionRecord.period.isnot(None)
+    ).distinct()}
+    for month in metered_months():
+        periods.update(periods_between(period_type, *period_bounds('Monthly', month)))
+    return sorted(periods)
+
+def machine_output(period=None, start_date=None, end_date=None):
+    """Output per machine: entered records of the period type, plus metered output from the coarsest rollups covering the range.
+
+    Counter records are left out of the first part; their readings are already in the rollups.
+    """
+    entered = _filter_records(
+        db.session.query(ProductionRecord.machine_id.label('machine_id'), ProductionRecord.actual_quantity.label('quantity'))
+        .filter(db.func.coalesce(ProductionRecord.source, 'manual') != 'counter'),
+        period, start_date, end_date
+    )
+    metered = db.session.query(ProductionRollup.machine_id, ProductionRollup.quantity).filter(rollup_filter(start_date, end_date))
+    output = entered.union_all(metered).subquery()
+    return db.session.query(output.c.machine_id, db.func.sum(output.c.quantity).label('actual')).group_by(output.c.machine_id).subquery()
+
+def get_duty_station_summary(period):
+    # Calculate summary of production by duty station: each record adds its period's plan and its output
+    planned = MachineCapacity.id.isnot(None)
+    rows = db.session.query(
+        DutyStation.name,
+        db.func.coalesce(db.func.sum(MachineCapacity.capacity), 0),
+        db.func.coalesce(db.func.sum(db.case((planned, ProductionRecord.actual_quantity), else_=0)), 0)
+    ).select_from(ProductionRecord) \
+     .join(Machine, ProductionRecord.machine_id == Machine.id) \
+     .join(DutyStation, Machine.duty_station_id == DutyStation.id) \
+     .outerjoin(MachineCapacity, capacity_of_record()) \
+     .filter(ProductionRecord.period_type == period) \
+     .group_by(DutyStation.name).all()
+    return {name: {'plan': plan, 'actual': actual} for name, plan, actual in rows}
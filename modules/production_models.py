@@ -1,29 +1,121 @@
 from database import db  # Import db from the root database.py
+from datetime import datetime
 
 class Machine(db.Model):
     __tablename__ = 'machines'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    duty_station_id = db.Column(db.Integer, nullable=False)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
     process_type = db.Column(db.String(50), nullable=False)
     installed_capacity = db.Column(db.Float, nullable=False)
     efficiency_factor = db.Column(db.Float, default=0.8)
     manual_capacity = db.Column(db.Float, nullable=True)
+    duty_station = db.relationship('DutyStation', backref='machines')
+    __table_args__ = (
+        db.Index('ix_machines_duty_station', 'duty_station_id'),
+    )
 
 class ProductionConfig(db.Model):
     __tablename__ = 'production_configs'
     id = db.Column(db.Integer, primary_key=True)
-    duty_station_id = db.Column(db.Integer, nullable=False)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
     working_hours = db.Column(db.Float, default=8.0)
     working_days = db.Column(db.Integer, default=25)
+    duty_station = db.relationship('DutyStation', backref='production_configs')
+    __table_args__ = (
+        db.Index('ix_production_configs_duty_station', 'duty_station_id'),
+    )
 
 class ProductionRecord(db.Model):
     __tablename__ = 'production_records'
     id = db.Column(db.Integer, primary_key=True)
-    machine_id = db.Column(db.Integer, nullable=False)
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False)
     period_type = db.Column(db.String(50), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     actual_quantity = db.Column(db.Float, nullable=False)
     uom = db.Column(db.String(10), nullable=False)
-    utilized_capacity = db.Column(db.Float, nullable=False)
\ No newline at end of file
+    utilized_capacity = db.Column(db.Float, nullable=False)
+    period = db.Column(db.String(10), nullable=True)  # period_type's period holding start_date, e.g. '2024-03' or '2024-W09'
+    source = db.Column(db.String(20), default='manual')  # 'manual' entry or 'counter' rollup of machine readings
+    machine = db.relationship('Machine', backref='records')
+    __table_args__ = (
+        db.Index('ix_production_records_period_start', 'period_type', 'start_date'),
+        db.Index('ix_production_records_machine', 'machine_id', 'period_type', 'period'),
+        # One counter rollup per machine and period; manual entries may repeat
+        db.Index('uq_production_records_counter', 'machine_id', 'period_type', 'period', unique=True,
+                 sqlite_where=db.text("source = 'counter'")),
+    )
+
+# Append-only machine counter readings pushed by shop-floor gateways, rolled up into production_records
+class MachineReading(db.Model):
+    __tablename__ = 'machine_readings'
+    id = db.Column(db.Integer, primary_key=True)
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_machine_readings_machine_timestamp', 'machine_id', 'timestamp'),
+    )
+
+# How far each rollup of machine_readings has got (last reading id included)
+class ReadingWatermark(db.Model):
+    __tablename__ = 'machine_reading_watermarks'
+    name = db.Column(db.String(50), primary_key=True)
+    last_reading_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Shift pattern of a station: hours worked on each listed weekday (0 = Monday)
+class ProductionShift(db.Model):
+    __tablename__ = 'production_shifts'
+    id = db.Column(db.Integer, primary_key=True)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    hours = db.Column(db.Float, nullable=False)
+    weekdays = db.Column(db.String(7), nullable=False, default='012345')
+    __table_args__ = (
+        db.Index('ix_production_shifts_duty_station', 'duty_station_id'),
+    )
+
+# Days a station does not work (holidays, shutdowns)
+class ProductionHoliday(db.Model):
+    __tablename__ = 'production_holidays'
+    id = db.Column(db.Integer, primary_key=True)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    description = db.Column(db.String(100))
+    __table_args__ = (
+        db.UniqueConstraint('duty_station_id', 'date', name='uq_production_holiday'),
+    )
+
+# Planned capacity of a machine for one period, maintained by modules.machine_capacity
+class MachineCapacity(db.Model):
+    __tablename__ = 'machine_capacity'
+    id = db.Column(db.Integer, primary_key=True)
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False)
+    period_type = db.Column(db.String(50), nullable=False)
+    period = db.Column(db.String(10), nullable=False)
+    working_hours = db.Column(db.Float, nullable=True)  # calendar hours in the period; NULL for manual or per-period capacity
+    capacity = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    machine = db.relationship('Machine', backref=db.backref('capacities', cascade='all, delete-orphan'))
+    __table_args__ = (
+        db.UniqueConstraint('machine_id', 'period_type', 'period', name='uq_machine_capacity_key'),
+        db.Index('ix_machine_capacity_period', 'period_type', 'period'),
+    )
+
+# Metered output per machine at hour, day, month and year granularity, maintained by modules.production_rollups.
+# Buckets are '2024-03-05T14', '2024-03-05', '2024-03' and '2024'; day and month buckets match machine_capacity periods.
+class ProductionRollup(db.Model):
+    __tablename__ = 'production_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket = db.Column(db.String(13), nullable=False)
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    reading_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket', 'machine_id', name='uq_production_rollup_key'),
+    )
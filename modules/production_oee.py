@@ -0,0 +1,177 @@
+from flask import current_app
+from database import db
+from modules.production_models import Machine, MachineCapacity, ProductionRollup
+from modules.production_bridge import report_periods, machine_output
+from modules.machine_capacity import ensure_capacity, scheduled_hours
+from modules.production_rollups import bucket, metered_window, DEFAULT_HOUR_RETENTION_DAYS
+from modules.models import DutyStation
+from datetime import date, timedelta
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (10, 50, 90)
+
+def _number(value):
+    # NaN marks "not measured"; templates and JSON get None instead
+    return float(value) if np.isfinite(value) else None
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+def oee_window(start_date=None, end_date=None, today=None):
+    """The part of the report range that hour rollups still cover; None when none of it is."""
+    today = today or date.today()
+    try:
+        retention = current_app.config.get('PRODUCTION_HOUR_RETENTION_DAYS', DEFAULT_HOUR_RETENTION_DAYS)
+    except RuntimeError:
+        retention = DEFAULT_HOUR_RETENTION_DAYS
+    first = max(start_date or date.min, today - timedelta(days=retention))
+    last = min(end_date or today, today)
+    return (first, last) if first <= last else None
+
+def machine_arrays(period=None, start_date=None, end_date=None, window=None):
+    """One row per machine, as arrays: planned capacity over the report's periods, output in the range,
+    and the hour-bucket figures OEE needs (metered output, run hours, hours at or above the planned rate)."""
+    periods = report_periods(period, start_date, end_date)
+    ensure_capacity(period, periods)
+    planned = db.session.query(
+        MachineCapacity.machine_id, db.func.sum(MachineCapacity.capacity).label('capacity')
+    ).filter(MachineCapacity.period_type == period, MachineCapacity.period.in_(periods)) \
+     .group_by(MachineCapacity.machine_id).subquery()
+    actuals = machine_output(period, start_date, end_date)
+
+    rate = Machine.installed_capacity * db.func.coalesce(Machine.efficiency_factor, 0.8)
+    hours = db.session.query(
+        ProductionRollup.machine_id,
+        db.func.sum(ProductionRollup.quantity).label('metered'),
+        db.func.count(ProductionRollup.id).label('run_hours'),
+        db.func.sum(db.case((ProductionRollup.quantity >= rate, 1), else_=0)).label('good_hours')
+    ).join(Machine, ProductionRollup.machine_id == Machine.id).filter(
+        ProductionRollup.granularity == 'hour',
+        ProductionRollup.quantity > 0,
+        ProductionRollup.bucket.between(bucket('hour', window[0]), bucket('hour', window[1]) + '~') if window else db.false()
+    ).group_by(ProductionRollup.machine_id).subquery()
+
+    rows = db.session.query(
+        Machine.id,
+        Machine.process_type,
+        Machine.duty_station_id,
+        db.func.coalesce(DutyStation.name, 'Unknown'),
+        Machine.installed_capacity,
+        planned.c.capacity.isnot(None),
+        db.func.coalesce(planned.c.capacity, 0.0),
+        actuals.c.actual.isnot(None),
+        db.func.coalesce(actuals.c.actual, 0.0),
+        db.func.coalesce(hours.c.metered, 0.0),
+        db.func.coalesce(hours.c.run_hours, 0),
+        db.func.coalesce(hours.c.good_hours, 0)
+    ).outerjoin(DutyStation, Machine.duty_station_id == DutyStation.id) \
+     .outerjoin(planned, planned.c.machine_id == Machine.id) \
+     .outerjoin(actuals, actuals.c.machine_id == Machine.id) \
+     .outerjoin(hours, hours.c.machine_id == Machine.id) \
+     .order_by(Machine.id).all()
+
+    columns = list(zip(*rows)) if rows else [()] * 12
+    station_ids = np.array(columns[2], dtype=int)
+    station_hours = scheduled_hours(set(columns[2]), *window) if window and rows else {}
+    return {
+        'process_type': np.array(columns[1], dtype=object),
+        'station': np.array(columns[3], dtype=object),
+        'rate': np.array(columns[4], dtype=float),
+        'has_plan': np.array(columns[5], dtype=bool),
+        'capacity': np.array(columns[6], dtype=float),
+        'has_output': np.array(columns[7], dtype=bool),
+        'actual': np.array(columns[8], dtype=float),
+        'metered': np.array(columns[9], dtype=float),
+        'run_hours': np.array(columns[10], dtype=float),
+        'good_hours': np.array(columns[11], dtype=float),
+        'scheduled_hours': np.array([station_hours.get(station_id, 0.0) for station_id in station_ids], dtype=float)
+    }
+
+def _oee(run_hours, scheduled, metered, ideal, good_hours):
+    """Availability, performance, quality proxy and OEE as fractions; arrays or totals alike."""
+    availability = _ratio(run_hours, scheduled)
+    performance = _ratio(metered, ideal)
+    quality = _ratio(good_hours, run_hours)
+    return availability, performance, quality, availability * performance * quality
+
+def compute_analytics(machines):
+    """Every production KPI from the per-machine arrays in one vectorized pass.
+
+    Availability is run hours over scheduled hours, performance is metered output over the installed
+    rate for the hours run, and, with no reject counts recorded, quality is proxied by the share of run
+    hours that reached the planned rate (installed x efficiency). Machines without metered hours have
+    no OEE and are left out of its totals.
+    """
+    process_types, process_index = np.unique(machines['process_type'].astype(str), return_inverse=True)
+    stations, station_index = np.unique(machines['station'].astype(str), return_inverse=True)
+    count = len(process_types)
+
+    # Planned vs actual by process type: actual output only counts where a plan exists
+    planned = np.bincount(process_index, weights=machines['capacity'], minlength=count)
+    actual = np.bincount(process_index, weights=np.where(machines['has_plan'], machines['actual'], 0.0), minlength=count)
+    perf = np.nan_to_num(_ratio(actual, planned) * 100)
+
+    # Factory contribution over machines with output
+    output = np.bincount(station_index, weights=np.where(machines['has_output'], machines['actual'], 0.0), minlength=len(stations))
+    has_output = np.bincount(station_index, weights=machines['has_output'], minlength=len(stations)) > 0
+    total_output = output[has_output].sum()
+    contributions = output[has_output] / total_output * 100 if total_output else np.zeros(has_output.sum())
+
+    # Utilization spread across machines
+    utilization = _ratio(machines['actual'], machines['capacity']) * 100
+    measured = utilization[np.isfinite(utilization)]
+    percentiles = np.percentile(measured, PERCENTILES) if measured.size else np.full(len(PERCENTILES), np.nan)
+
+    # OEE per machine, summed per process type and plant-wide as ratios of totals
+    metered = machines['run_hours'] > 0
+    parts = {
+        'run_hours': np.where(metered, machines['run_hours'], 0.0),
+        'scheduled': np.where(metered, machines['scheduled_hours'], 0.0),
+        'metered': np.where(metered, machines['metered'], 0.0),
+        'ideal': np.where(metered, machines['rate'] * machines['run_hours'], 0.0),
+        'good_hours': np.where(metered, machines['good_hours'], 0.0)
+    }
+    by_process = {key: np.bincount(process_index, weights=values, minlength=count) for key, values in parts.items()}
+    process_oee = _oee(**by_process)
+    plant_oee = _oee(**{key: np.array(values.sum()) for key, values in parts.items()})
+
+    # Bottlenecks: the most heavily loaded process types first
+    process_utilization = _ratio(actual, planned) * 100
+    ranking = np.argsort(-np.nan_to_num(process_utilization, nan=-np.inf), kind='stable')
+    machine_counts = np.bincount(process_index, minlength=count)
+
+    return {
+        'process_types': process_types.tolist(),
+        'planned_values': planned.tolist(),
+        'actual_values': actual.tolist(),
+        'perf_values': perf.tolist(),
+        'average_performance': float(perf.mean()) if count else 0,
+        'factory_labels': stations[has_output].tolist(),
+        'factory_contributions': contributions.tolist(),
+        'utilization_percentiles': {f"p{p}": _number(value) for p, value in zip(PERCENTILES, percentiles)},
+        'oee': dict(zip(('availability', 'performance', 'quality', 'oee'), (_number(value * 100) for value in plant_oee))),
+        'bottlenecks': [{
+            'process_type': str(process_types[i]),
+            'machines': int(machine_counts[i]),
+            'utilization': _number(process_utilization[i]),
+            'availability': _number(process_oee[0][i] * 100),
+            'performance': _number(process_oee[1][i] * 100),
+            'quality': _number(process_oee[2][i] * 100),
+            'oee': _number(process_oee[3][i] * 100)
+        } for i in ranking]
+    }
+
+def production_analytics(period=None, start_date=None, end_date=None):
+    """Planned vs actual, factory contribution, utilization percentiles, OEE and bottlenecks for a report,
+    with the windows its metered figures were read over."""
+    window = oee_window(start_date, end_date)
+    analytics = compute_analytics(machine_arrays(period, start_date, end_date, window))
+    analytics['oee_window'] = window
+    # Metered output only counts inside this window when old partial months have been pruned
+    analytics['metered_window'] = metered_window(start_date, end_date) if start_date and end_date else None
+    return analytics
@@ -0,0 +1,93 @@
+from flask import current_app
+from database import db
+from modules.production_models import Machine, ProductionConfig
+from modules.models import DutyStation
+from modules.report_cache import on_commit_of
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFERENCE_TTL = 300
+REFERENCE_TABLES = {Machine.__tablename__, DutyStation.__tablename__, ProductionConfig.__tablename__}
+
+# Machines, stations and configs as plain read-only dicts; dropped after a commit writes one of their
+# tables, and after PRODUCTION_REFERENCE_TTL seconds so writes made by other processes show up too
+_reference = {'data': None, 'expires_at': 0.0, 'version': 0}
+_reference_lock = threading.Lock()
+
+def _ttl():
+    try:
+        return current_app.config.get('PRODUCTION_REFERENCE_TTL', DEFAULT_REFERENCE_TTL)
+    except RuntimeError:
+        return DEFAULT_REFERENCE_TTL
+
+def _load():
+    stations = dict(db.session.query(DutyStation.id, DutyStation.name).order_by(DutyStation.id).all())
+    machines = {
+        machine.id: {
+            'id': machine.id,
+            'name': machine.name,
+            'duty_station_id': machine.duty_station_id,
+            'duty_station_name': stations.get(machine.duty_station_id, 'Unknown'),
+            'process_type': machine.process_type,
+            'installed_capacity': machine.installed_capacity,
+            'efficiency_factor': machine.efficiency_factor,
+            'manual_capacity': machine.manual_capacity
+        }
+        for machine in db.session.query(
+            Machine.id, Machine.name, Machine.duty_station_id, Machine.process_type,
+            Machine.installed_capacity, Machine.efficiency_factor, Machine.manual_capacity
+        ).order_by(Machine.id)
+    }
+    # A station's first config is the one capacity planning uses
+    configs = {}
+    for config in db.session.query(
+            ProductionConfig.id, ProductionConfig.duty_station_id, ProductionConfig.working_hours, ProductionConfig.working_days
+    ).order_by(ProductionConfig.id):
+        configs.setdefault(config.duty_station_id, {
+            'id': config.id, 'working_hours': config.working_hours, 'working_days': config.working_days
+        })
+    return {'stations': stations, 'machines': machines, 'configs': configs}
+
+def reference_data():
+    now = time.monotonic()
+    with _reference_lock:
+        if _reference['data'] is not None and _reference['expires_at'] > now:
+            return _reference['data']
+        version = _reference['version']
+    data = _load()
+    with _reference_lock:
+        # A commit that landed while loading may not be in data; serve it once but do not keep it
+        if version == _reference['version']:
+            _reference['data'] = data
+            _reference['expires_at'] = now + _ttl()
+    return data
+
+def station_choices():
+    return list(reference_data()['stations'].items())
+
+def machine_choices():
+    return [(machine['id'], f"{machine['name']} ({machine['process_type']})") for machine in reference_data()['machines'].values()]
+
+def machine_list():
+    return list(reference_data()['machines'].values())
+
+def get_machine(machine_id):
+    return reference_data()['machines'].get(machine_id)
+
+def station_name(station_id):
+    return reference_data()['stations'].get(station_id, 'Unknown')
+
+def station_config(station_id):
+    return reference_data()['configs'].get(station_id)
+
+def invalidate_reference_data():
+    with _reference_lock:
+        _reference['version'] += 1
+        _reference['data'] = None
+    logger.debug(f"Production reference data invalidated, version {_reference['version']}")
+
+on_commit_of(REFERENCE_TABLES, invalidate_reference_data)
@@ -0,0 +1,220 @@
+from flask import current_app
+from database import db
+from modules.production_models import MachineReading, MachineCapacity, ProductionRollup, ReadingWatermark
+from modules.machine_capacity import ensure_capacity
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime, timedelta
+import threading
+import calendar
+import time
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('hour', 'day', 'month', 'year')
+# A bucket key is the hour key cut short: '2024-03-05T14' -> '2024-03-05' -> '2024-03' -> '2024'
+BUCKET_LENGTHS = {'hour': 13, 'day': 10, 'month': 7, 'year': 4}
+DEFAULT_HOUR_RETENTION_DAYS = 30
+DEFAULT_DAY_RETENTION_DAYS = 730
+DEFAULT_READING_RETENTION_DAYS = 90
+PRUNE_INTERVAL = 3600
+WATERMARK = 'production_rollups'
+
+_rollup_lock = threading.Lock()
+_pruned = {'at': 0.0}
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+def bucket(granularity, day):
+    return day.isoformat()[:BUCKET_LENGTHS[granularity]]
+
+def pending_readings(connection, name):
+    """(last rolled-up reading id, newest reading id) for the named rollup, creating its watermark at 0."""
+    last_id = connection.execute(db.select(ReadingWatermark.last_reading_id).where(ReadingWatermark.name == name)).scalar()
+    if last_id is None:
+        connection.execute(db.insert(ReadingWatermark).values(name=name, last_reading_id=0, updated_at=datetime.utcnow()))
+        last_id = 0
+    return last_id, connection.execute(db.select(db.func.max(MachineReading.id))).scalar() or 0
+
+def advance_watermark(connection, name, last_id, top):
+    """Move the watermark in the rollup's own transaction; a concurrent run in another process makes this one roll back."""
+    moved = connection.execute(db.update(ReadingWatermark).where(
+        ReadingWatermark.name == name, ReadingWatermark.last_reading_id == last_id
+    ).values(last_reading_id=top, updated_at=datetime.utcnow())).rowcount
+    if moved != 1:
+        raise RuntimeError(f"Machine readings were rolled up concurrently ({name}); retry")
+
+def _statements():
+    quantity = db.bindparam('delta_quantity', type_=db.Float)
+    readings = db.bindparam('delta_readings', type_=db.Integer)
+    updated_at = db.bindparam('updated_at', type_=db.DateTime)
+    return sqlite_insert(ProductionRollup).values(
+        granularity=db.bindparam('key_granularity'),
+        bucket=db.bindparam('key_bucket'),
+        machine_id=db.bindparam('key_machine_id'),
+        quantity=quantity,
+        reading_count=readings,
+        updated_at=updated_at
+    ).on_conflict_do_update(
+        index_elements=['granularity', 'bucket', 'machine_id'],
+        set_={
+            'quantity': ProductionRollup.quantity + quantity,
+            'reading_count': ProductionRollup.reading_count + readings,
+            'updated_at': updated_at
+        }
+    )
+
+ROLLUP_UPSERT = _statements()
+
+def rollup_production():
+    """Add the readings written since the last run to every level of the rollup hierarchy. Returns the readings rolled up.
+
+    New readings are grouped by machine and hour in SQL; each hour's delta is then added to its hour, day,
+    month and year buckets, so no level is ever recomputed from raw rows.
+    """
+    with _rollup_lock, db.engine.begin() as connection:
+        last_id, top = pending_readings(connection, WATERMARK)
+        if top <= last_id:
+            return 0
+        hour = db.func.strftime('%Y-%m-%dT%H', MachineReading.timestamp)
+        deltas, count = {}, 0
+        for machine_id, hour_bucket, quantity, readings in connection.execute(db.select(
+                MachineReading.machine_id, hour, db.func.sum(MachineReading.quantity), db.func.count(MachineReading.id)
+        ).where(MachineReading.id > last_id, MachineReading.id <= top).group_by(MachineReading.machine_id, hour)):
+            for granularity, length in BUCKET_LENGTHS.items():
+                delta = deltas.setdefault((granularity, hour_bucket[:length], machine_id), [0.0, 0])
+                delta[0] += quantity
+                delta[1] += readings
+            count += readings
+        now = datetime.utcnow()
+        connection.execute(ROLLUP_UPSERT, [
+            {'key_granularity': granularity, 'key_bucket': key, 'key_machine_id': machine_id,
+             'delta_quantity': quantity, 'delta_readings': readings, 'updated_at': now}
+            for (granularity, key, machine_id), (quantity, readings) in deltas.items()
+        ])
+        advance_watermark(connection, WATERMARK, last_id, top)
+    logger.info(f"Rolled up {count} machine readings into {len(deltas)} production rollup buckets")
+    if time.monotonic() - _pruned['at'] > PRUNE_INTERVAL:
+        prune_production_rollups()
+    return count
+
+def prune_production_rollups(today=None):
+    """Drop hour and day buckets, and raw readings every rollup has consumed, once they pass their retention."""
+    today = today or date.today()
+    removed = {}
+    with db.engine.begin() as connection:
+        for granularity, key, default in (('hour', 'PRODUCTION_HOUR_RETENTION_DAYS', DEFAULT_HOUR_RETENTION_DAYS),
+                                          ('day', 'PRODUCTION_DAY_RETENTION_DAYS', DEFAULT_DAY_RETENTION_DAYS)):
+            cutoff = bucket(granularity, today - timedelta(days=_config(key, default)))
+            removed[granularity] = connection.execute(db.delete(ProductionRollup).where(
+                ProductionRollup.granularity == granularity, ProductionRollup.bucket < cutoff)).rowcount
+        consumed = connection.execute(db.select(db.func.min(ReadingWatermark.last_reading_id))).scalar() or 0
+        cutoff = datetime.combine(today - timedelta(days=_config('MACHINE_READING_RETENTION_DAYS', DEFAULT_READING_RETENTION_DAYS)), datetime.min.time())
+        removed['readings'] = connection.execute(db.delete(MachineReading).where(
+            MachineReading.id <= consumed, MachineReading.timestamp < cutoff)).rowcount
+    _pruned['at'] = time.monotonic()
+    logger.info(f"Pruned production rollups: {removed}")
+    return removed
+
+def _month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+def _cover_months(start_date, end_date):
+    """Whole months inside [start_date, end_date], with the leftover days at either end."""
+    if start_date > end_date:
+        return []
+    first = start_date if start_date.day == 1 else _month_end(start_date.year, start_date.month) + timedelta(days=1)
+    last = end_date if end_date == _month_end(end_date.year, end_date.month) else end_date.replace(day=1) - timedelta(days=1)
+    if first > last:
+        return [('day', bucket('day', start_date), bucket('day', end_date))]
+    segments = [('month', bucket('month', first), bucket('month', last))]
+    if start_date < first:
+        segments.append(('day', bucket('day', start_date), bucket('day', first - timedelta(days=1))))
+    if last < end_date:
+        segments.append(('day', bucket('day', last + timedelta(days=1)), bucket('day', end_date)))
+    return segments
+
+def rollup_cover(start_date, end_date):
+    """The coarsest buckets covering [start_date, end_date] exactly: whole years, then whole months, then days.
+
+    Any range needs at most five (granularity, first bucket, last bucket) spans, whatever its length:
+    one span of years, and at each end a span of months plus a span of days. A range inside one
+    calendar year has no year span and at most three: days, months, days.
+    """
+    first_year = start_date.year if (start_date.month, start_date.day) == (1, 1) else start_date.year + 1
+    last_year = end_date.year if (end_date.month, end_date.day) == (12, 31) else end_date.year - 1
+    if first_year > last_year:
+        return _cover_months(start_date, end_date)
+    return [('year', str(first_year), str(last_year))] \
+        + _cover_months(start_date, date(first_year, 1, 1) - timedelta(days=1)) \
+        + _cover_months(date(last_year + 1, 1, 1), end_date)
+
+def metered_window(start_date, end_date, today=None):
+    """The part of [start_date, end_date] the rollups still answer exactly; None when none of it is.
+
+    Partial months are read from day buckets, which are pruned after PRODUCTION_DAY_RETENTION_DAYS,
+    so the pruned days of a partial month at either end are clipped off.
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=_config('PRODUCTION_DAY_RETENTION_DAYS', DEFAULT_DAY_RETENTION_DAYS))
+    first, last = start_date, end_date
+    if first < cutoff and first.day != 1:
+        first = min(_month_end(first.year, first.month) + timedelta(days=1), cutoff)
+    # The days of a partial last month are read from its first day, or from first when it is in that month
+    if last != _month_end(last.year, last.month):
+        month_start = last.replace(day=1)
+        if max(first, month_start) < cutoff:
+            if first < month_start:
+                last = month_start - timedelta(days=1)
+            else:
+                first = cutoff
+    return (first, last) if first <= last else None
+
+def rollup_filter(start_date=None, end_date=None, today=None):
+    """Rollup rows covering the date range's metered window exactly once; every year bucket when there is no range."""
+    if not (start_date and end_date):
+        return ProductionRollup.granularity == 'year'
+    window = metered_window(start_date, end_date, today)
+    return db.or_(*[
+        db.and_(ProductionRollup.granularity == granularity, ProductionRollup.bucket.between(first, last))
+        for granularity, first, last in (rollup_cover(*window) if window else [])
+    ], db.false())
+
+def metered_months():
+    return [month for (month,) in db.session.query(ProductionRollup.bucket).filter(
+        ProductionRollup.granularity == 'month').distinct().order_by(ProductionRollup.bucket)]
+
+def production_series(granularity, start_date, end_date, machine_id=None):
+    """Metered output per bucket of one granularity (hour buckets only reach back PRODUCTION_HOUR_RETENTION_DAYS)."""
+    query = db.session.query(ProductionRollup.bucket, db.func.sum(ProductionRollup.quantity)).filter(
+        ProductionRollup.granularity == granularity,
+        ProductionRollup.bucket.between(bucket(granularity, start_date), bucket(granularity, end_date) + '~')
+    )
+    if machine_id:
+        query = query.filter(ProductionRollup.machine_id == machine_id)
+    return query.group_by(ProductionRollup.bucket).order_by(ProductionRollup.bucket).all()
+
+def yearly_utilization(years=5, today=None):
+    """Metered output against planned capacity for each of the last years: a few rows per year, however much data there is."""
+    today = today or date.today()
+    first_year = today.year - years + 1
+    months = [f"{year}-{month:02d}" for year in range(first_year, today.year + 1) for month in range(1, 13)]
+    ensure_capacity('Monthly', months)
+    output = dict(db.session.query(ProductionRollup.bucket, db.func.sum(ProductionRollup.quantity)).filter(
+        ProductionRollup.granularity == 'year', ProductionRollup.bucket.between(str(first_year), str(today.year))
+    ).group_by(ProductionRollup.bucket).all())
+    year = db.func.substr(MachineCapacity.period, 1, 4)
+    capacity = dict(db.session.query(year, db.func.sum(MachineCapacity.capacity)).filter(
+        MachineCapacity.period_type == 'Monthly', MachineCapacity.period.between(months[0], months[-1])
+    ).group_by(year).all())
+    return [{
+        'year': str(year),
+        'output': output.get(str(year), 0.0),
+        'capacity': capacity.get(str(year), 0.0),
+        'utilization': output.get(str(year), 0.0) / capacity[str(year)] * 100 if capacity.get(str(year)) else 0
+    } for year in range(first_year, today.year + 1)]
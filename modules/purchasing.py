@@ -4,51 +4,34 @@ from database import db
 from modules.purchasing_models import PurchaseRequest, ProcurementOrder, Supplier, YearlyPurchasePlan
 from modules.models import Product, DutyStation
 from modules.notifications import send_notification
+from modules.excel_export import stream_excel, query_rows
+from modules.report_jobs import report_job, enqueue_job
+from modules.chart_renderer import chart_src
+from modules.pdf_service import render_pdf
+from modules.pagination import paginate, page_args, page_json, wants_page_json
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import logging
 import pandas as pd
 from io import BytesIO
-import matplotlib.pyplot as plt
-import seaborn as sns
-import base64
 import os
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
 
 purchasing_bp = Blueprint('purchasing', __name__)
 
 COST_CATEGORIES = ["Construction", "Customs Service Payment", "Machine Accessories", "Project Raw Material", 
                    "Project Service Payment", "Raw Material", "Salts and Chemicals", "Service Payment", 
                    "Spare Parts", "Vehicle Service Payment", "Wood"]
+PAYABLE_STATUSES = ['Unpaid', 'Partially Paid', 'Credit']
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def export_to_pdf(data, columns, filename):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph("Purchasing Report", styles['Title']))
-    
+def build_pdf(data, columns):
     table_data = [columns] + [[str(row.get(col, '')) for col in columns] for row in data]
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    return send_file(buffer, download_name=filename, as_attachment=True)
+    return BytesIO(render_pdf(title="Purchasing Report", tables=[{'rows': table_data, 'header_font_size': 14}]))
+
+def export_to_pdf(data, columns, filename):
+    return send_file(build_pdf(data, columns), download_name=filename, as_attachment=True)
 
 @purchasing_bp.route('/')
 @login_required
@@ -57,17 +40,31 @@ def purchasing():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('dashboard.dashboard'))
     
-    new_requests_count = PurchaseRequest.query.filter_by(status="Pending").count()
-    requests = PurchaseRequest.query.order_by(PurchaseRequest.created_at.desc()).all()
-    procurement_orders = ProcurementOrder.query.order_by(ProcurementOrder.registered_date.desc()).all()
+    # Each list is keyset-paged newest first; "load more" asks for one list by name
+    lists = {
+        'requests': (PurchaseRequest.query.options(joinedload(PurchaseRequest.requested_by)),
+                     (PurchaseRequest.created_at, PurchaseRequest.id), 'purchase_request_rows.html', 'requests'),
+        'orders': (with_purchase_refs(ProcurementOrder.query),
+                   (ProcurementOrder.registered_date, ProcurementOrder.id), 'procurement_order_rows.html', 'procurement_orders'),
+        'payables': (with_purchase_refs(ProcurementOrder.query.filter(ProcurementOrder.payment_status.in_(PAYABLE_STATUSES))),
+                     (ProcurementOrder.registered_date, ProcurementOrder.id), 'payable_rows.html', 'payables'),
+    }
     products = Product.query.all()
+    for list_name, (query, key, rows_template, name) in lists.items():
+        if wants_page_json(list_name):
+            cursor, size = page_args()
+            page = paginate(query, key, cursor, size, descending=True)
+            return page_json(page, rows_template, **{name: page.items}, products=products)
+    pages = {list_name: paginate(query, key, descending=True) for list_name, (query, key, _, _) in lists.items()}
+
+    new_requests_count = PurchaseRequest.query.filter_by(status="Pending").count()
     duty_stations = DutyStation.query.all()
     suppliers = Supplier.query.all()
-    payables = ProcurementOrder.query.filter(ProcurementOrder.payment_status.in_(['Unpaid', 'Partially Paid', 'Credit'])).all()
     yearly_plans = YearlyPurchasePlan.query.all()
-    return render_template('purchasing.html', new_requests_count=new_requests_count, requests=requests,
-                           procurement_orders=procurement_orders, products=products, duty_stations=duty_stations,
-                           suppliers=suppliers, cost_categories=COST_CATEGORIES, payables=payables, yearly_plans=yearly_plans)
+    return render_template('purchasing.html', new_requests_count=new_requests_count, requests=pages['requests'].items,
+                           procurement_orders=pages['orders'].items, products=products, duty_stations=duty_stations,
+                           suppliers=suppliers, cost_categories=COST_CATEGORIES, payables=pages['payables'].items,
+                           yearly_plans=yearly_plans, pages=pages)
 
 @purchasing_bp.route('/request', methods=['GET', 'POST'])
 @login_required
@@ -196,38 +193,49 @@ def register_purchase():
     flash('New purchase registered!', 'success')
     return redirect(url_for('purchasing.purchasing'))
 
+PURCHASE_COLUMNS = ['Order Number', 'Description', 'Cost Category', 'Supplier', 'Duty Station', 'Quantity', 'Unit',
+                    'Total Price', 'Payment Status', 'Payment Amount', 'Payment Date', 'Registered Date']
+PAYABLE_COLUMNS = ['Order Number', 'Description', 'Supplier', 'Duty Station', 'Total Price', 'Payment Status', 'Payment Amount', 'Remaining']
+
+def purchase_row(o):
+    return [o.order_number, o.description, o.cost_category, o.supplier.name if o.supplier else 'N/A',
+            o.duty_station.name if o.duty_station else 'N/A', o.quantity, o.unit_of_measure, o.total_price,
+            o.payment_status, o.payment_amount, o.payment_date, o.registered_date]
+
+def payable_row(o):
+    return [o.order_number, o.description, o.supplier.name if o.supplier else 'N/A',
+            o.duty_station.name if o.duty_station else 'N/A', o.total_price, o.payment_status,
+            o.payment_amount, o.total_price - o.payment_amount]
+
+def with_purchase_refs(query):
+    return query.options(joinedload(ProcurementOrder.supplier), joinedload(ProcurementOrder.duty_station))
+
+def build_purchase_export(query, sheet_name, columns, row, filename, export_format):
+    if export_format == 'excel':
+        return [(sheet_name, columns, query_rows(query, row))], f'{filename}.xlsx'
+    data = [dict(zip(columns, row(o))) for o in query.all()]
+    return build_pdf(data, columns), f'{filename}.pdf'
+
+def send_purchase_export(kind, builder):
+    export_format = request.args.get('format', 'excel')
+    if export_format not in ('excel', 'pdf'):
+        return redirect(url_for('purchasing.purchasing'))
+    if request.args.get('async'):
+        return enqueue_job(kind, request.args.to_dict())
+    result, download_name = builder(request.args)
+    if export_format == 'excel':
+        return stream_excel(result, download_name)
+    return send_file(result, download_name=download_name, as_attachment=True)
+
+@report_job('purchasing.export_purchases')
+def build_purchases_export(params):
+    query = with_purchase_refs(ProcurementOrder.query.order_by(ProcurementOrder.registered_date.desc()))
+    return build_purchase_export(query, 'Purchases', PURCHASE_COLUMNS, purchase_row, 'purchases', params.get('format', 'excel'))
+
 @purchasing_bp.route('/export_purchases', methods=['GET'])
 @login_required
 def export_purchases():
-    export_format = request.args.get('format', 'excel')
-    orders = ProcurementOrder.query.order_by(ProcurementOrder.registered_date.desc()).all()
-    data = [{
-        'Order Number': o.order_number,
-        'Description': o.description,
-        'Cost Category': o.cost_category,
-        'Supplier': o.supplier.name if o.supplier else 'N/A',
-        'Duty Station': o.duty_station.name if o.duty_station else 'N/A',
-        'Quantity': o.quantity,
-        'Unit': o.unit_of_measure,
-        'Total Price': o.total_price,
-        'Payment Status': o.payment_status,
-        'Payment Amount': o.payment_amount,
-        'Payment Date': o.payment_date,
-        'Registered Date': o.registered_date
-    } for o in orders]
-    
-    if export_format == 'excel':
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Purchases', index=False)
-        output.seek(0)
-        return send_file(output, download_name='purchases.xlsx', as_attachment=True)
-    elif export_format == 'pdf':
-        columns = ['Order Number', 'Description', 'Cost Category', 'Supplier', 'Duty Station', 'Quantity', 'Unit', 
-                   'Total Price', 'Payment Status', 'Payment Amount', 'Payment Date', 'Registered Date']
-        return export_to_pdf(data, columns, 'purchases.pdf')
-    return redirect(url_for('purchasing.purchasing'))
+    return send_purchase_export('purchasing.export_purchases', build_purchases_export)
 
 @purchasing_bp.route('/search_suppliers', methods=['GET'])
 @login_required
@@ -343,41 +351,20 @@ def update_payment(order_id):
     flash('Payment updated!', 'success')
     return redirect(url_for('purchasing.purchasing'))
 
+@report_job('purchasing.export_payables')
+def build_payables_export(params):
+    query = with_purchase_refs(ProcurementOrder.query.filter(ProcurementOrder.payment_status.in_(PAYABLE_STATUSES)))
+    return build_purchase_export(query, 'Payables', PAYABLE_COLUMNS, payable_row, 'payables', params.get('format', 'excel'))
+
 @purchasing_bp.route('/export_payables', methods=['GET'])
 @login_required
 def export_payables():
-    export_format = request.args.get('format', 'excel')
-    payables = ProcurementOrder.query.filter(ProcurementOrder.payment_status.in_(['Unpaid', 'Partially Paid', 'Credit'])).all()
-    data = [{
-        'Order Number': o.order_number,
-        'Description': o.description,
-        'Supplier': o.supplier.name if o.supplier else 'N/A',
-        'Duty Station': o.duty_station.name if o.duty_station else 'N/A',
-        'Total Price': o.total_price,
-        'Payment Status': o.payment_status,
-        'Payment Amount': o.payment_amount,
-        'Remaining': o.total_price - o.payment_amount
-    } for o in payables]
-    
-    if export_format == 'excel':
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Payables', index=False)
-        output.seek(0)
-        return send_file(output, download_name='payables.xlsx', as_attachment=True)
-    elif export_format == 'pdf':
-        columns = ['Order Number', 'Description', 'Supplier', 'Duty Station', 'Total Price', 'Payment Status', 'Payment Amount', 'Remaining']
-        return export_to_pdf(data, columns, 'payables.pdf')
-    return redirect(url_for('purchasing.purchasing'))
+    return send_purchase_export('purchasing.export_payables', build_payables_export)
 
-@purchasing_bp.route('/export_report', methods=['GET'])
-@login_required
-def export_report():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    duty_station_id = request.args.get('duty_station_id')
-    export_format = request.args.get('format', 'excel')
+def filtered_orders(params):
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    duty_station_id = params.get('duty_station_id')
 
     query = ProcurementOrder.query
     if start_date:
@@ -386,54 +373,23 @@ def export_report():
         query = query.filter(ProcurementOrder.registered_date <= datetime.strptime(end_date, '%Y-%m-%d'))
     if duty_station_id:
         query = query.filter_by(duty_station_id=int(duty_station_id))
+    return query
 
-    orders = query.all()
-    data = [{
-        'Order Number': o.order_number,
-        'Description': o.description,
-        'Cost Category': o.cost_category,
-        'Supplier': o.supplier.name if o.supplier else 'N/A',
-        'Duty Station': o.duty_station.name if o.duty_station else 'N/A',
-        'Quantity': o.quantity,
-        'Unit': o.unit_of_measure,
-        'Total Price': o.total_price,
-        'Payment Status': o.payment_status,
-        'Payment Amount': o.payment_amount,
-        'Payment Date': o.payment_date,
-        'Registered Date': o.registered_date
-    } for o in orders]
-
-    if export_format == 'excel':
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Purchasing Report', index=False)
-        output.seek(0)
-        return send_file(output, download_name='purchasing_report.xlsx', as_attachment=True)
-    elif export_format == 'pdf':
-        columns = ['Order Number', 'Description', 'Cost Category', 'Supplier', 'Duty Station', 'Quantity', 'Unit', 
-                   'Total Price', 'Payment Status', 'Payment Amount', 'Payment Date', 'Registered Date']
-        return export_to_pdf(data, columns, 'purchasing_report.pdf')
-    return redirect(url_for('purchasing.purchasing'))
+@report_job('purchasing.export_report')
+def build_report_export(params):
+    query = with_purchase_refs(filtered_orders(params))
+    return build_purchase_export(query, 'Purchasing Report', PURCHASE_COLUMNS, purchase_row, 'purchasing_report', params.get('format', 'excel'))
 
-@purchasing_bp.route('/report_data', methods=['GET'])
+@purchasing_bp.route('/export_report', methods=['GET'])
 @login_required
-def report_data():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    duty_station_id = request.args.get('duty_station_id')
-
-    query = ProcurementOrder.query
-    if start_date:
-        query = query.filter(ProcurementOrder.registered_date >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(ProcurementOrder.registered_date <= datetime.strptime(end_date, '%Y-%m-%d'))
-    if duty_station_id:
-        query = query.filter_by(duty_station_id=int(duty_station_id))
+def export_report():
+    return send_purchase_export('purchasing.export_report', build_report_export)
 
-    orders = query.all()
+@report_job('purchasing.report_data')
+def build_report_data(params):
+    orders = filtered_orders(params).options(joinedload(ProcurementOrder.duty_station)).all()
     if not orders:
-        return jsonify({'error': 'No data available for the selected filters'})
+        return {'error': 'No data available for the selected filters'}, 'purchasing_report_data.json'
 
     df = pd.DataFrame([{
         'Duty Station': o.duty_station.name if o.duty_station else 'N/A',
@@ -445,53 +401,27 @@ def report_data():
 
     total_expense = df.groupby('Duty Station')['Total Price'].sum().reset_index()
     total_expense['%'] = (total_expense['Total Price'] / total_expense['Total Price'].sum() * 100).round(2)
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x='Duty Station', y='Total Price', data=total_expense)
-    plt.title('Total Expense Per Duty Station')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    bar_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    plt.close()
-
-    plt.figure(figsize=(8, 8))
-    plt.pie(total_expense['%'], labels=total_expense['Duty Station'], autopct='%1.1f%%', startangle=90)
-    plt.title('% Share of Total Expense')
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    pie_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    plt.close()
+    bar_chart = chart_src(total_expense, {
+        'kind': 'bar', 'x': 'Duty Station', 'y': 'Total Price', 'title': 'Total Expense Per Duty Station', 'rotate_xticks': 45
+    })
+    pie_chart = chart_src(total_expense, {
+        'kind': 'pie', 'x': 'Duty Station', 'y': '%', 'figsize': (8, 8), 'title': '% Share of Total Expense'
+    })
 
     top_items = df.groupby(['Duty Station', 'Description'])['Total Price'].sum().reset_index()
-    top_items = top_items.groupby('Duty Station').apply(lambda x: x.nlargest(5, 'Total Price')).reset_index(drop=True)
-    plt.figure(figsize=(12, 8))
-    sns.barplot(x='Total Price', y='Description', hue='Duty Station', data=top_items)
-    plt.title('Top 5 Expensive Items Per Duty Station')
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    top_items_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    plt.close()
+    top_items = top_items.sort_values(['Duty Station', 'Total Price'], ascending=[True, False]).groupby('Duty Station').head(5).reset_index(drop=True)
+    top_items_chart = chart_src(top_items, {
+        'kind': 'bar', 'x': 'Total Price', 'y': 'Description', 'hue': 'Duty Station', 'figsize': (12, 8),
+        'title': 'Top 5 Expensive Items Per Duty Station'
+    })
 
     df['Month'] = df['Registered Date'].apply(lambda x: x.strftime('%Y-%m'))
     trend = df.groupby('Month')['Total Price'].sum().reset_index()
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(x='Month', y='Total Price', data=trend, marker='o')
-    plt.title('Spending Trend Over Time')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    trend_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    plt.close()
-
-    return jsonify({
+    trend_chart = chart_src(trend, {
+        'kind': 'line', 'x': 'Month', 'y': 'Total Price', 'marker': 'o', 'title': 'Spending Trend Over Time', 'rotate_xticks': 45
+    })
+
+    return {
         'total_expense': total_expense.to_dict(orient='records'),
         'bar_chart': bar_chart,
         'pie_chart': pie_chart,
@@ -499,7 +429,15 @@ def report_data():
         'top_items_chart': top_items_chart,
         'trend': trend.to_dict(orient='records'),
         'trend_chart': trend_chart
-    })
+    }, 'purchasing_report_data.json'
+
+@purchasing_bp.route('/report_data', methods=['GET'])
+@login_required
+def report_data():
+    if request.args.get('async'):
+        return enqueue_job('purchasing.report_data', request.args.to_dict())
+    result, _ = build_report_data(request.args)
+    return jsonify(result)
 
 @purchasing_bp.route('/upload_plan', methods=['POST'])
 @login_required
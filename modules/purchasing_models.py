@@ -26,6 +26,9 @@ class PurchaseRequest(db.Model):
     requested_by = db.relationship('User', backref='purchase_requests')
     duty_station = db.relationship('DutyStation', backref='purchase_requests')
     procurement_orders = db.relationship('ProcurementOrder', backref='request', lazy=True)
+    __table_args__ = (
+        db.Index('ix_purchase_requests_created_id', 'created_at', 'id'),
+    )
 
 class ProcurementOrder(db.Model):
     __tablename__ = 'procurement_orders'
@@ -50,7 +53,10 @@ class ProcurementOrder(db.Model):
     product = db.relationship('Product', backref='procurement_orders')
     duty_station = db.relationship('DutyStation', backref='procurement_orders')
     supplier = db.relationship('Supplier', backref='procurement_orders')
-    
+    __table_args__ = (
+        db.Index('ix_procurement_orders_registered_id', 'registered_date', 'id'),
+    )
+
 class YearlyPurchasePlan(db.Model):
     __tablename__ = 'yearly_purchase_plans'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,78 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+import threading
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_CACHE_SIZE = 64
+
+# Bumped after every commit that wrote one of the watched models; part of every cache key
+_data_version = {'value': 0}
+_watched_tables = set()
+_commit_callbacks = []
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def watch_models(*models):
+    for model in models:
+        _watched_tables.add(model.__tablename__)
+
+def data_version():
+    return _data_version['value']
+
+def _cache_size():
+    try:
+        return current_app.config.get('REPORT_CACHE_SIZE', DEFAULT_REPORT_CACHE_SIZE)
+    except RuntimeError:
+        return DEFAULT_REPORT_CACHE_SIZE
+
+def get_cached(key):
+    with _cache_lock:
+        full_key = key + (data_version(),)
+        if full_key in _cache:
+            _cache.move_to_end(full_key)
+            return _cache[full_key]
+    return None
+
+def set_cached(key, value, version):
+    # version is read before computing; if a commit landed meanwhile the result may be stale, so drop it
+    with _cache_lock:
+        if version != data_version():
+            return
+        _cache[key + (version,)] = value
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+
+def invalidate_reports():
+    with _cache_lock:
+        _data_version['value'] += 1
+        _cache.clear()
+    logger.debug(f"Report cache invalidated, data version {_data_version['value']}")
+
+def on_commit_of(tables, callback):
+    """Call callback() after every commit that wrote one of tables (names; the set may grow later). Rollbacks call nothing."""
+    _commit_callbacks.append((tables, callback))
+
+on_commit_of(_watched_tables, invalidate_reports)
+
+# One set of Session hooks serves every cache: written table names are collected per flush and matched at commit
+@event.listens_for(Session, 'after_flush')
+def _track_writes(session, flush_context):
+    session.info.setdefault('tables_written', set()).update(
+        getattr(obj, '__tablename__', None) for obj in list(session.new) + list(session.dirty) + list(session.deleted))
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    written = session.info.pop('tables_written', None)
+    if written:
+        for tables, callback in _commit_callbacks:
+            if written & set(tables):
+                callback()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_writes(session):
+    session.info.pop('tables_written', None)
@@ -0,0 +1,164 @@
+from flask import Blueprint, Flask, current_app, jsonify, send_file, url_for
+from flask_login import login_required, current_user
+from database import db
+from modules.models import ReportJob
+from modules.excel_export import write_excel
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+import multiprocessing
+import threading
+import secrets
+import json
+import os
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+report_jobs_bp = Blueprint('report_jobs', __name__)
+
+DEFAULT_REPORT_JOB_WORKERS = 2
+DEFAULT_REPORT_JOB_RETENTION_HOURS = 24
+
+# kind -> builder(params) returning (result, download_name). result is a list of
+# (sheet_name, headers, rows) for Excel, a dict for JSON, or bytes/BytesIO for anything else.
+JOB_BUILDERS = {}
+
+_executor = {'pool': None}
+_executor_lock = threading.Lock()
+_worker_app = {'app': None}
+
+def report_job(kind):
+    def register(builder):
+        JOB_BUILDERS[kind] = builder
+        return builder
+    return register
+
+def _job_folder(config):
+    folder = config.get('REPORT_JOB_FOLDER') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'report_jobs')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def _worker_config():
+    # Only plain values cross the process boundary
+    return {key: value for key, value in current_app.config.items()
+            if isinstance(value, (str, int, float, bool, type(None), dict, list, tuple))}
+
+def _init_worker(config):
+    # Importing main registers the models and SQLite pragmas; importing the blueprints registers the job builders
+    import main
+    main.import_blueprints()
+    app = Flask(__name__)
+    app.config.update(config)
+    db.init_app(app)
+    _worker_app['app'] = app
+
+def _get_executor():
+    with _executor_lock:
+        if _executor['pool'] is None:
+            _executor['pool'] = ProcessPoolExecutor(
+                max_workers=current_app.config.get('REPORT_JOB_WORKERS', DEFAULT_REPORT_JOB_WORKERS),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(_worker_config(),)
+            )
+        return _executor['pool']
+
+def _write_artifact(path, result):
+    if isinstance(result, list):
+        write_excel(path, result)
+    elif isinstance(result, dict):
+        with open(path, 'w') as f:
+            json.dump(result, f, default=str)
+    else:
+        with open(path, 'wb') as f:
+            f.write(result.getvalue() if isinstance(result, BytesIO) else result)
+
+def run_job(job_id):
+    """Build one queued job's artifact inside a pool worker."""
+    app = _worker_app['app']
+    with app.app_context():
+        job = db.session.get(ReportJob, job_id)
+        if job is None:
+            return
+        job.status = 'Running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        try:
+            result, download_name = JOB_BUILDERS[job.kind](job.params or {})
+            path = os.path.join(_job_folder(app.config), f"{job.id}{os.path.splitext(download_name)[1]}")
+            _write_artifact(path, result)
+            job.file_path = path
+            job.download_name = download_name
+            job.status = 'Completed'
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Report job {job_id} ({job.kind}) failed: {str(e)}")
+            job.status = 'Failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        db.session.remove()
+
+def purge_expired_jobs():
+    hours = current_app.config.get('REPORT_JOB_RETENTION_HOURS', DEFAULT_REPORT_JOB_RETENTION_HOURS)
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    expired = ReportJob.query.filter(ReportJob.created_at < cutoff, ReportJob.status.in_(['Completed', 'Failed'])).all()
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+    if expired:
+        db.session.commit()
+        logger.info(f"Purged {len(expired)} expired report jobs")
+    return len(expired)
+
+def _job_status(job):
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': url_for('report_jobs.job_status', job_id=job.id),
+        'download_url': url_for('report_jobs.download', job_id=job.id) if job.status == 'Completed' else None
+    }
+
+def enqueue_job(kind, params):
+    """Queue a registered builder and answer with the job id; the artifact is fetched from /jobs/<id>/download."""
+    if kind not in JOB_BUILDERS:
+        raise KeyError(f"Unknown report job kind: {kind}")
+    purge_expired_jobs()
+    params = {key: value for key, value in params.items() if key != 'async'}
+    job = ReportJob(id=secrets.token_urlsafe(16), kind=kind, params=params, requested_by_id=current_user.id)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor().submit(run_job, job.id)
+    logger.info(f"Queued report job {job.id} ({kind})")
+    return jsonify(_job_status(job)), 202
+
+def _visible_job(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if job is None or not (current_user.is_admin() or job.requested_by_id == current_user.id):
+        return None
+    return job
+
+@report_jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_status(job))
+
+@report_jobs_bp.route('/<job_id>/download', methods=['GET'])
+@login_required
+def download(job_id):
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != 'Completed' or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': f'Job is {job.status.lower()}', 'status': job.status}), 409
+    return send_file(job.file_path, download_name=job.download_name, as_attachment=True)
@@ -7,6 +7,8 @@ from wtforms.validators import DataRequired
 import os
 from werkzeug.utils import secure_filename
 import uuid
+from modules.pagination import paginate, page_args, page_json, wants_page_json
+from sqlalchemy.orm import joinedload
 
 resources_bp = Blueprint('resources', __name__)
 UPLOAD_FOLDER = 'static/resources'
@@ -34,11 +36,14 @@ class ResourceUploadForm(FlaskForm):
 @login_required
 def resources():
     category = request.args.get('category')
+    query = Resource.query.options(joinedload(Resource.uploader))
     if category:
-        resources = Resource.query.filter_by(category=category).all()
-    else:
-        resources = Resource.query.all()
-    return render_template('resources.html', resources=resources, category=category)
+        query = query.filter_by(category=category)
+    cursor, size = page_args()
+    page = paginate(query, (Resource.id,), cursor, size)
+    if wants_page_json():
+        return page_json(page, 'resource_rows.html', resources=page.items)
+    return render_template('resources.html', resources=page.items, page=page, category=category)
 
 @resources_bp.route('/upload_resource', methods=['GET', 'POST'])
 @login_required
@@ -0,0 +1,173 @@
+from database import db
+from modules.models import Product, Sale, ProductPlan
+from modules.report_cache import watch_models, data_version, get_cached, set_cached
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+PERIODS = ['weekly', 'monthly', 'quarterly', 'bi_annual', 'annual']
+
+# Fixed-length buckets are anchored on the report start date, as the report has always done
+FIXED_PERIOD_DAYS = {'weekly': 7, 'quarterly': 91, 'bi_annual': 182}
+
+watch_models(Sale, ProductPlan)
+
+def period_bounds(period, start_date, end_date):
+    bounds = []
+    current = start_date
+    while current <= end_date:
+        if period in FIXED_PERIOD_DAYS:
+            bucket_end = current + timedelta(days=FIXED_PERIOD_DAYS[period] - 1)
+        elif period == 'monthly':
+            next_month = date(current.year + 1, 1, 1) if current.month == 12 else date(current.year, current.month + 1, 1)
+            bucket_end = next_month - timedelta(days=1)
+        elif period == 'annual':
+            bucket_end = date(current.year, 12, 31)
+        else:
+            raise ValueError(f"Unknown report period: {period}")
+        bucket_end = min(bucket_end, end_date)
+        bounds.append((current, bucket_end))
+        current = bucket_end + timedelta(days=1)
+    return bounds
+
+def _totals_key(period, bucket_start):
+    if period == 'monthly':
+        return bucket_start.strftime('%Y-%m')
+    if period == 'annual':
+        return bucket_start.strftime('%Y')
+    return f"{bucket_start}"
+
+def load_report_frames(start_date, end_date):
+    sales_rows = db.session.query(
+        Sale.product_id, Sale.sale_type, Sale.sale_date, Sale.quantity, Sale.total_price
+    ).filter(Sale.sale_date >= start_date, Sale.sale_date <= end_date).order_by(Sale.sale_date, Sale.id).all()
+    sales = pd.DataFrame.from_records(sales_rows, columns=['product_id', 'sale_type', 'sale_date', 'quantity', 'total_price'])
+    sales['sale_date'] = pd.to_datetime(sales['sale_date'])
+    sales[['quantity', 'total_price']] = sales[['quantity', 'total_price']].astype(float)
+
+    plan_rows = db.session.query(
+        ProductPlan.product_id, ProductPlan.start_date, ProductPlan.end_date, ProductPlan.planned_quantity, ProductPlan.planned_value
+    ).filter(ProductPlan.start_date <= end_date, ProductPlan.end_date >= start_date).order_by(ProductPlan.id).all()
+    plans = pd.DataFrame.from_records(plan_rows, columns=['product_id', 'plan_start', 'plan_end', 'planned_quantity', 'planned_value'])
+    plans['plan_start'] = pd.to_datetime(plans['plan_start'])
+    plans['plan_end'] = pd.to_datetime(plans['plan_end'])
+    plans['plan_order'] = np.arange(len(plans))
+
+    product_ids = [int(pid) for pid in sales['product_id'].unique()]
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(product_ids)).all()) if product_ids else {}
+    return sales, plans, names
+
+def _rollup_period(period, bounds, sales, plans, names):
+    starts = np.array([np.datetime64(b[0]) for b in bounds], dtype='datetime64[ns]')
+    ends = np.array([np.datetime64(b[1]) for b in bounds], dtype='datetime64[ns]')
+    bucket_value = np.zeros(len(bounds))
+    bucket_quantity = np.zeros(len(bounds))
+    rows = []
+
+    if not sales.empty:
+        frame = sales.assign(bucket=np.searchsorted(starts, sales['sale_date'].values, side='right') - 1)
+        # sort=False keeps products in first-sold order inside each bucket, like the report table always listed them
+        grouped = frame.groupby(['bucket', 'product_id', 'sale_type'], sort=False)[['quantity', 'total_price']].sum().reset_index()
+        grouped = grouped.sort_values('bucket', kind='stable').reset_index(drop=True)
+        grouped['row'] = grouped.index
+        grouped['bucket_start'] = starts[grouped['bucket'].values]
+        grouped['bucket_end'] = ends[grouped['bucket'].values]
+
+        # First matching plan (by id) overlapping the bucket for the same product
+        grouped['planned_quantity'] = 0.0
+        grouped['planned_value'] = 0.0
+        if not plans.empty:
+            matches = grouped[['row', 'product_id', 'bucket_start', 'bucket_end']].merge(plans, on='product_id')
+            matches = matches[(matches['plan_start'] <= matches['bucket_end']) & (matches['plan_end'] >= matches['bucket_start'])]
+            matches = matches.sort_values('plan_order').drop_duplicates('row').set_index('row')
+            grouped.loc[matches.index, 'planned_quantity'] = matches['planned_quantity'].astype(float)
+            grouped.loc[matches.index, 'planned_value'] = matches['planned_value'].astype(float)
+
+        bucket_quantity = np.bincount(grouped['bucket'], weights=grouped['quantity'], minlength=len(bounds))
+        bucket_value = np.bincount(grouped['bucket'], weights=grouped['total_price'], minlength=len(bounds))
+        total_value = bucket_value[grouped['bucket'].values]
+
+        quantity = grouped['quantity'].values
+        value = grouped['total_price'].values
+        planned_quantity = grouped['planned_quantity'].values
+        planned_value = grouped['planned_value'].values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quantity_percentage = np.where(planned_quantity > 0, quantity / planned_quantity * 100, 0.0)
+            value_percentage = np.where(planned_value > 0, value / planned_value * 100, 0.0)
+            product_share = np.where(total_value > 0, value / total_value * 100, 0.0)
+
+        product_names = [names.get(int(pid)) for pid in grouped['product_id'].values]
+        columns = zip(grouped['bucket'].values, product_names, grouped['sale_type'].values, quantity.tolist(), value.tolist(),
+                      planned_quantity.tolist(), planned_value.tolist(), quantity_percentage.tolist(), value_percentage.tolist(), product_share.tolist())
+        for bucket, product_name, sale_type, qty, val, plan_qty, plan_val, qty_pct, val_pct, share in columns:
+            bucket_start, bucket_end = bounds[bucket]
+            rows.append({
+                'product_name': product_name,
+                'sale_type': sale_type,
+                'start_date': bucket_start,
+                'end_date': bucket_end,
+                'actual_quantity': qty,
+                'actual_value': val,
+                'planned_quantity': plan_qty,
+                'planned_value': plan_val,
+                'quantity_percentage': qty_pct,
+                'value_percentage': val_pct,
+                'product_share': share
+            })
+
+    totals = {}
+    for i, (bucket_start, _) in enumerate(bounds):
+        totals[_totals_key(period, bucket_start)] = {'quantity': float(bucket_quantity[i]), 'value': float(bucket_value[i])}
+    return {'data': rows, 'totals': totals}
+
+def _chart_period(entries):
+    chart = {'labels': [], 'actual_sales': {}, 'planned_sales': {}}
+    for entry in entries:
+        label = f"{entry['start_date']}"
+        key = f"{entry['product_name']}_{entry['sale_type']}"
+        # Entries arrive grouped by bucket, so comparing with the last label is enough
+        if not chart['labels'] or chart['labels'][-1] != label:
+            chart['labels'].append(label)
+        if key not in chart['actual_sales']:
+            chart['actual_sales'][key] = []
+            chart['planned_sales'][key] = []
+        chart['actual_sales'][key].append(entry['actual_value'])
+        chart['planned_sales'][key].append(entry['planned_value'])
+    return chart
+
+def build_sales_report(start_date, end_date, periods=None):
+    """Bucket sales and plans for every requested period from a single load of both tables."""
+    periods = periods or PERIODS
+    sales, plans, names = load_report_frames(start_date, end_date)
+    sales_data = {}
+    chart_data = {}
+    for period in periods:
+        sales_data[period] = _rollup_period(period, period_bounds(period, start_date, end_date), sales, plans, names)
+        chart_data[period] = _chart_period(sales_data[period]['data'])
+    logger.debug(f"Sales report built for {start_date}..{end_date}: {len(sales)} sales, {len(plans)} plans")
+    return sales_data, chart_data
+
+def get_sales_report(start_date, end_date, periods=None):
+    """Cached build_sales_report: the HTML report and both exports share one result per period."""
+    periods = periods or PERIODS
+    version = data_version()
+    sales_data = {}
+    chart_data = {}
+    missing = []
+    for period in periods:
+        cached = get_cached(('sales_report', start_date, end_date, period))
+        if cached is None:
+            missing.append(period)
+        else:
+            sales_data[period], chart_data[period] = cached
+    if missing:
+        built_sales, built_charts = build_sales_report(start_date, end_date, periods=missing)
+        for period in missing:
+            sales_data[period] = built_sales[period]
+            chart_data[period] = built_charts[period]
+            set_cached(('sales_report', start_date, end_date, period), (built_sales[period], built_charts[period]), version)
+    return {period: sales_data[period] for period in periods}, {period: chart_data[period] for period in periods}
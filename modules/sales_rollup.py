@@ -0,0 +1,95 @@
+from database import db
+from modules.models import Sale, SalesRollup
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def rollup_period(value):
+    return value.strftime('%Y-%m')
+
+def _key_filter(period, product_id, sale_type, duty_station_id):
+    station_filter = SalesRollup.duty_station_id.is_(None) if duty_station_id is None else SalesRollup.duty_station_id == duty_station_id
+    return db.and_(
+        SalesRollup.period == period,
+        SalesRollup.product_id == product_id,
+        SalesRollup.sale_type == sale_type,
+        station_filter
+    )
+
+def apply_sale_to_rollup(sale, sign=1):
+    """Add (or with sign=-1, remove) a Sale's figures on its rollup row.
+
+    Runs in the caller's session and is committed together with the Sale itself.
+    """
+    period = rollup_period(sale.sale_date)
+    product_id = int(sale.product_id)
+    duty_station_id = int(sale.duty_station_id) if sale.duty_station_id else None
+    quantity = float(sale.quantity or 0) * sign
+    total_price = float(sale.total_price or 0) * sign
+    amount = float(sale.amount or 0) * sign
+
+    # Increment in SQL so concurrent writers never overwrite each other's totals
+    updated = db.session.query(SalesRollup).filter(
+        _key_filter(period, product_id, sale.sale_type, duty_station_id)
+    ).update({
+        SalesRollup.quantity: SalesRollup.quantity + quantity,
+        SalesRollup.total_price: SalesRollup.total_price + total_price,
+        SalesRollup.amount: SalesRollup.amount + amount,
+        SalesRollup.sale_count: SalesRollup.sale_count + sign
+    }, synchronize_session=False)
+    if not updated:
+        db.session.add(SalesRollup(
+            period=period,
+            product_id=product_id,
+            sale_type=sale.sale_type,
+            duty_station_id=duty_station_id,
+            quantity=quantity,
+            total_price=total_price,
+            amount=amount,
+            sale_count=sign
+        ))
+
+def rebuild_sales_rollup():
+    """Recompute every rollup row from the sales table in one grouped pass."""
+    period = db.func.strftime('%Y-%m', Sale.sale_date)
+    grouped = db.session.query(
+        period.label('period'),
+        Sale.product_id,
+        Sale.sale_type,
+        Sale.duty_station_id,
+        db.func.coalesce(db.func.sum(Sale.quantity), 0.0),
+        db.func.coalesce(db.func.sum(Sale.total_price), 0.0),
+        db.func.coalesce(db.func.sum(Sale.amount), 0.0),
+        db.func.count(Sale.id)
+    ).group_by(period, Sale.product_id, Sale.sale_type, Sale.duty_station_id)
+
+    db.session.query(SalesRollup).delete(synchronize_session=False)
+    # Databases created before an index was added to the model get it here
+    for index in SalesRollup.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+    db.session.execute(db.insert(SalesRollup).from_select(
+        ['period', 'product_id', 'sale_type', 'duty_station_id', 'quantity', 'total_price', 'amount', 'sale_count'],
+        grouped
+    ))
+    db.session.commit()
+    rows = db.session.query(db.func.count(SalesRollup.id)).scalar()
+    logger.info(f"Sales rollup rebuilt: {rows} rows")
+    return rows
+
+def product_totals(start_period=None, end_period=None):
+    """Map product_id -> {'quantity', 'total_price', 'amount'} over the given (inclusive) period range."""
+    query = db.session.query(
+        SalesRollup.product_id,
+        db.func.coalesce(db.func.sum(SalesRollup.quantity), 0.0),
+        db.func.coalesce(db.func.sum(SalesRollup.total_price), 0.0),
+        db.func.coalesce(db.func.sum(SalesRollup.amount), 0.0)
+    )
+    if start_period:
+        query = query.filter(SalesRollup.period >= start_period)
+    if end_period:
+        query = query.filter(SalesRollup.period <= end_period)
+    return {
+        product_id: {'quantity': float(quantity), 'total_price': float(total_price), 'amount': float(amount)}
+        for product_id, quantity, total_price, amount in query.group_by(SalesRollup.product_id).all()
+    }
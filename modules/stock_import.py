@@ -0,0 +1,143 @@
+from database import db
+from modules.stock_models import StockCategory, StockItem, StockTransaction
+from modules.stock_ledger import TRANSACTION_SIGNS, apply_balance_deltas
+from modules.models import DutyStation
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['Item', 'Duty Station', 'Transaction Type', 'Quantity', 'Date']
+TRANSACTION_TYPES = ('IN', 'OUT', 'ADJUST')
+IN_CHUNK_SIZE = 500
+
+def _in_query(query, column, values):
+    """Run query filtered by column IN values, a chunk at a time to stay under SQLite's variable limit."""
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        rows.extend(query.filter(column.in_(values[start:start + IN_CHUNK_SIZE])).all())
+    return rows
+
+def _clean_sheet(df):
+    """Normalise the sheet and split it into valid rows and a report of rejected ones."""
+    df = df.copy()
+    df['row'] = df.index + 2  # spreadsheet row number, counting the header
+    for column in ['Item', 'Duty Station']:
+        df[column] = df[column].astype('string').str.strip()
+    df['Category'] = df['Category'].astype('string').str.strip() if 'Category' in df else pd.NA
+    df['Category'] = df['Category'].fillna('Uncategorized').replace('', 'Uncategorized')
+    df['Transaction Type'] = df['Transaction Type'].astype('string').str.strip().str.upper()
+    df['quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
+    unit_price = df['Unit Price'] if 'Unit Price' in df else pd.Series(0.0, index=df.index)
+    df['unit_price'] = pd.to_numeric(unit_price, errors='coerce')
+    df['date'] = pd.to_datetime(df['Date'], errors='coerce')
+
+    checks = [
+        (df['Item'].isna() | (df['Item'] == ''), 'Item is missing'),
+        (df['Duty Station'].isna() | (df['Duty Station'] == ''), 'Duty Station is missing'),
+        (~df['Transaction Type'].isin(TRANSACTION_TYPES).fillna(False), f"Transaction Type must be one of {', '.join(TRANSACTION_TYPES)}"),
+        (df['quantity'].isna(), 'Quantity is not a number'),
+        (unit_price.notna() & df['unit_price'].isna(), 'Unit Price is not a number'),
+        (df['date'].isna(), 'Date is not a valid date'),
+    ]
+    errors = pd.Series([[] for _ in range(len(df))], index=df.index)
+    for failed, message in checks:
+        for index in df.index[failed.to_numpy(dtype=bool)]:
+            errors[index].append(message)
+    rejected_mask = errors.map(bool)
+    rejected = [{'row': int(row), 'errors': errors[index]} for index, row in df.loc[rejected_mask, 'row'].items()]
+
+    valid = df.loc[~rejected_mask].copy()
+    valid['unit_price'] = valid['unit_price'].fillna(0.0)
+    valid['period'] = valid['date'].dt.strftime('%Y-%m')
+    return valid, rejected
+
+def _resolve_master_data(valid):
+    """Map names to ids with IN-queries, creating missing stations, categories and items in one flush each."""
+    station_names = set(valid['Duty Station'])
+    stations = {ds.name: ds.id for ds in _in_query(DutyStation.query, DutyStation.name, station_names)}
+    new_stations = [DutyStation(name=name) for name in station_names - set(stations)]
+    if new_stations:
+        db.session.add_all(new_stations)
+        db.session.flush()
+        stations.update({ds.name: ds.id for ds in new_stations})
+
+    category_names = set(valid['Category'])
+    categories = {c.name: c.id for c in _in_query(StockCategory.query, StockCategory.name, category_names)}
+    new_categories = [StockCategory(name=name) for name in category_names - set(categories)]
+    if new_categories:
+        db.session.add_all(new_categories)
+        db.session.flush()
+        categories.update({c.name: c.id for c in new_categories})
+
+    valid['duty_station_id'] = valid['Duty Station'].map(stations).astype('int64')
+    valid['category_id'] = valid['Category'].map(categories).astype('int64')
+
+    station_ids = set(valid['duty_station_id'].tolist())
+    items = {
+        (item.name, item.duty_station_id): item.id
+        for item in _in_query(StockItem.query, StockItem.name, set(valid['Item']))
+        if item.duty_station_id in station_ids
+    }
+    # A new item takes the category of its first row
+    wanted = valid.drop_duplicates(['Item', 'duty_station_id'])
+    new_items = [
+        StockItem(name=name, category_id=int(category_id), unit_of_measure='unit', duty_station_id=int(station_id))
+        for name, station_id, category_id in zip(wanted['Item'], wanted['duty_station_id'], wanted['category_id'])
+        if (name, station_id) not in items
+    ]
+    if new_items:
+        db.session.add_all(new_items)
+        db.session.flush()
+        items.update({(item.name, item.duty_station_id): item.id for item in new_items})
+    valid['item_id'] = [items[key] for key in zip(valid['Item'], valid['duty_station_id'])]
+    return len(new_stations), len(new_categories), len(new_items)
+
+def _balance_deltas(valid):
+    """Signed quantity/value movement per (item, station, period), oldest period first."""
+    sign = valid['Transaction Type'].map(TRANSACTION_SIGNS).fillna(0.0)
+    return valid.assign(
+        quantity_delta=valid['quantity'] * sign,
+        value_delta=valid['quantity'] * valid['unit_price'] * sign
+    ).groupby(['item_id', 'duty_station_id', 'period'], sort=True)[['quantity_delta', 'value_delta']].sum().reset_index()
+
+def import_stock_sheet(df):
+    """Validate and import a stock transaction sheet in a single transaction.
+
+    Returns a summary dict with the rejected rows; nothing is written if any statement fails.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    valid, rejected = _clean_sheet(df)
+    try:
+        new_stations, new_categories, new_items = _resolve_master_data(valid) if len(valid) else (0, 0, 0)
+        if len(valid):
+            db.session.bulk_insert_mappings(StockTransaction, [
+                {'item_id': item_id, 'transaction_type': transaction_type, 'quantity': quantity, 'unit_price': unit_price,
+                 'total_value': quantity * unit_price, 'duty_station_id': station_id, 'transaction_date': date}
+                for item_id, transaction_type, quantity, unit_price, station_id, date in zip(
+                    valid['item_id'], valid['Transaction Type'], valid['quantity'].tolist(), valid['unit_price'].tolist(),
+                    valid['duty_station_id'].tolist(), valid['date'].dt.to_pydatetime()
+                )
+            ])
+            deltas = _balance_deltas(valid)
+            apply_balance_deltas(zip(
+                deltas['item_id'].tolist(), deltas['duty_station_id'].tolist(), deltas['period'],
+                deltas['quantity_delta'].tolist(), deltas['value_delta'].tolist()
+            ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Stock import: {len(valid)} rows imported, {len(rejected)} rejected")
+    return {
+        'imported': len(valid),
+        'rejected_count': len(rejected),
+        'rejected': rejected,
+        'created': {'duty_stations': new_stations, 'categories': new_categories, 'items': new_items}
+    }
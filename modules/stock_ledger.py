@@ -0,0 +1,235 @@
+from database import db
+from modules.stock_models import StockItem, StockTransaction, StockBalance, StockOnHand
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Sign applied to a transaction's quantity and total_value; ADJUST quantities carry their own sign
+TRANSACTION_SIGNS = {'IN': 1.0, 'OUT': -1.0, 'ADJUST': 1.0}
+BALANCE_TOLERANCE = 1e-6
+
+def balance_period(value):
+    return value.strftime('%Y-%m')
+
+def _previous_ending(column):
+    return db.func.coalesce(db.select(column).where(
+        StockBalance.item_id == db.bindparam('key_item_id'),
+        StockBalance.duty_station_id == db.bindparam('key_station_id'),
+        StockBalance.period < db.bindparam('key_period')
+    ).order_by(StockBalance.period.desc()).limit(1).scalar_subquery(), 0.0)
+
+def _statements():
+    """The cascade and upsert statements, built once and executed with bound deltas."""
+    quantity = db.bindparam('delta_quantity', type_=db.Float)
+    value = db.bindparam('delta_value', type_=db.Float)
+
+    # Back-dated movements shift every later period's opening and closing figures by the same amount
+    cascade = db.update(StockBalance).where(
+        StockBalance.item_id == db.bindparam('key_item_id'),
+        StockBalance.duty_station_id == db.bindparam('key_station_id'),
+        StockBalance.period > db.bindparam('key_period')
+    ).values(
+        beginning_quantity=db.func.coalesce(StockBalance.beginning_quantity, 0.0) + quantity,
+        beginning_value=db.func.coalesce(StockBalance.beginning_value, 0.0) + value,
+        ending_quantity=db.func.coalesce(StockBalance.ending_quantity, 0.0) + quantity,
+        ending_value=db.func.coalesce(StockBalance.ending_value, 0.0) + value
+    )
+
+    # The period row itself; a new row opens from the latest earlier period's ending
+    beginning_quantity = _previous_ending(StockBalance.ending_quantity)
+    beginning_value = _previous_ending(StockBalance.ending_value)
+    upsert = sqlite_insert(StockBalance).values(
+        item_id=db.bindparam('key_item_id'),
+        duty_station_id=db.bindparam('key_station_id'),
+        period=db.bindparam('key_period'),
+        beginning_quantity=beginning_quantity,
+        beginning_value=beginning_value,
+        ending_quantity=beginning_quantity + quantity,
+        ending_value=beginning_value + value
+    ).on_conflict_do_update(
+        index_elements=['item_id', 'duty_station_id', 'period'],
+        set_={
+            'ending_quantity': db.func.coalesce(StockBalance.ending_quantity, 0.0) + quantity,
+            'ending_value': db.func.coalesce(StockBalance.ending_value, 0.0) + value
+        }
+    )
+
+    on_hand = sqlite_insert(StockOnHand).values(
+        item_id=db.bindparam('key_item_id'),
+        duty_station_id=db.bindparam('key_station_id'),
+        quantity=quantity,
+        value=value,
+        min_stock_level=db.func.coalesce(db.select(StockItem.min_stock_level).where(
+            StockItem.id == db.bindparam('key_item_id')
+        ).scalar_subquery(), 0.0),
+        updated_at=db.bindparam('updated_at')
+    ).on_conflict_do_update(
+        index_elements=['item_id', 'duty_station_id'],
+        set_={
+            'quantity': StockOnHand.quantity + quantity,
+            'value': StockOnHand.value + value,
+            'updated_at': db.bindparam('updated_at')
+        }
+    )
+    return cascade, upsert, on_hand
+
+CASCADE_STATEMENT, UPSERT_STATEMENT, ON_HAND_STATEMENT = _statements()
+
+def apply_balance_deltas(deltas):
+    """Apply (item_id, duty_station_id, period, quantity, value) movements to the balances and stock on hand.
+
+    Runs in the caller's session and is committed together with the transactions that caused it.
+    Cascading every delta before upserting keeps the result exact for any number of deltas, provided
+    the deltas of one item and station arrive oldest period first.
+    """
+    now = datetime.utcnow()
+    params = [
+        {'key_item_id': item_id, 'key_station_id': duty_station_id, 'key_period': period,
+         'delta_quantity': quantity, 'delta_value': value, 'updated_at': now}
+        for item_id, duty_station_id, period, quantity, value in deltas
+    ]
+    if not params:
+        return
+    connection = db.session.connection()
+    connection.execute(CASCADE_STATEMENT, params)
+    connection.execute(UPSERT_STATEMENT, params)
+
+    # One on-hand upsert per item and station, however many periods moved
+    on_hand = {}
+    for param in params:
+        key = (param['key_item_id'], param['key_station_id'])
+        if key in on_hand:
+            on_hand[key]['delta_quantity'] += param['delta_quantity']
+            on_hand[key]['delta_value'] += param['delta_value']
+        else:
+            on_hand[key] = dict(param)
+    connection.execute(ON_HAND_STATEMENT, list(on_hand.values()))
+
+def apply_balance_delta(item_id, duty_station_id, period, quantity, value):
+    apply_balance_deltas([(item_id, duty_station_id, period, quantity, value)])
+
+def track_item(item):
+    """Give a new item its zero on-hand row at its own station, so it shows in stock and shortage queries at once."""
+    db.session.flush()
+    db.session.connection().execute(ON_HAND_STATEMENT, {
+        'key_item_id': item.id, 'key_station_id': item.duty_station_id,
+        'delta_quantity': 0.0, 'delta_value': 0.0, 'updated_at': datetime.utcnow()
+    })
+
+def transaction_delta(transaction_type, quantity, total_value):
+    sign = TRANSACTION_SIGNS.get(transaction_type, 0.0)
+    return float(quantity or 0) * sign, float(total_value or 0) * sign
+
+def apply_transaction(transaction):
+    quantity, value = transaction_delta(transaction.transaction_type, transaction.quantity, transaction.total_value)
+    apply_balance_delta(int(transaction.item_id), int(transaction.duty_station_id),
+                        balance_period(transaction.transaction_date), quantity, value)
+
+def _transaction_sign():
+    return db.case(
+        *[(StockTransaction.transaction_type == transaction_type, value) for transaction_type, value in TRANSACTION_SIGNS.items()],
+        else_=0.0
+    )
+
+def _expected_balances():
+    """Balances implied by stock_transactions: one grouped pass plus a running sum per item and station."""
+    period = db.func.strftime('%Y-%m', StockTransaction.transaction_date)
+    sign = _transaction_sign()
+    deltas = db.select(
+        StockTransaction.item_id,
+        StockTransaction.duty_station_id,
+        period.label('period'),
+        db.func.sum(StockTransaction.quantity * sign).label('quantity'),
+        db.func.sum(StockTransaction.total_value * sign).label('value')
+    ).group_by(StockTransaction.item_id, StockTransaction.duty_station_id, period).subquery()
+
+    window = {'partition_by': [deltas.c.item_id, deltas.c.duty_station_id], 'order_by': deltas.c.period}
+    ending_quantity = db.func.sum(deltas.c.quantity).over(**window)
+    ending_value = db.func.sum(deltas.c.value).over(**window)
+    return db.select(
+        deltas.c.item_id,
+        deltas.c.duty_station_id,
+        deltas.c.period,
+        (ending_quantity - deltas.c.quantity).label('beginning_quantity'),
+        (ending_value - deltas.c.value).label('beginning_value'),
+        ending_quantity.label('ending_quantity'),
+        ending_value.label('ending_value')
+    )
+
+def _expected_on_hand():
+    """Stock on hand implied by stock_transactions, plus a zero row for every item that has none."""
+    sign = _transaction_sign()
+    moved = db.select(
+        StockTransaction.item_id,
+        StockTransaction.duty_station_id,
+        db.func.sum(StockTransaction.quantity * sign).label('quantity'),
+        db.func.sum(StockTransaction.total_value * sign).label('value')
+    ).group_by(StockTransaction.item_id, StockTransaction.duty_station_id)
+    untouched = db.select(
+        StockItem.id, StockItem.duty_station_id, db.literal(0.0), db.literal(0.0)
+    ).where(~db.exists().where(
+        StockTransaction.item_id == StockItem.id, StockTransaction.duty_station_id == StockItem.duty_station_id
+    ))
+    totals = db.union_all(moved, untouched).subquery()
+    return db.select(
+        totals.c.item_id,
+        totals.c.duty_station_id,
+        totals.c.quantity,
+        totals.c.value,
+        db.func.coalesce(StockItem.min_stock_level, 0.0).label('min_stock_level')
+    ).join(StockItem, StockItem.id == totals.c.item_id)
+
+def rebuild_stock_balances():
+    """Recompute every balance and the stock on hand from the transaction history."""
+    db.session.query(StockBalance).delete(synchronize_session=False)
+    db.session.execute(db.insert(StockBalance).from_select(
+        ['item_id', 'duty_station_id', 'period', 'beginning_quantity', 'beginning_value', 'ending_quantity', 'ending_value'],
+        _expected_balances()
+    ))
+    db.session.query(StockOnHand).delete(synchronize_session=False)
+    on_hand = _expected_on_hand()
+    db.session.execute(db.insert(StockOnHand).from_select(
+        ['item_id', 'duty_station_id', 'quantity', 'value', 'min_stock_level', 'updated_at'],
+        on_hand.add_columns(db.literal(datetime.utcnow(), db.DateTime))
+    ))
+    db.session.commit()
+    rows = db.session.query(db.func.count(StockBalance.id)).scalar()
+    logger.info(f"Stock balances rebuilt: {rows} rows")
+    return rows
+
+def verify_stock_balances():
+    """Compare stored balances and stock on hand with the transaction history and return the differences."""
+    fields = ['beginning_quantity', 'beginning_value', 'ending_quantity', 'ending_value']
+    expected = {
+        (row.item_id, row.duty_station_id, row.period): row
+        for row in db.session.execute(_expected_balances())
+    }
+    stored = {
+        (row.item_id, row.duty_station_id, row.period): row
+        for row in db.session.query(StockBalance.item_id, StockBalance.duty_station_id, StockBalance.period, *[getattr(StockBalance, f) for f in fields])
+    }
+    mismatches = _compare(expected, stored, fields)
+
+    on_hand_fields = ['quantity', 'value', 'min_stock_level']
+    expected = {('on hand', row.item_id, row.duty_station_id): row for row in db.session.execute(_expected_on_hand())}
+    stored = {
+        ('on hand', row.item_id, row.duty_station_id): row
+        for row in db.session.query(StockOnHand.item_id, StockOnHand.duty_station_id, *[getattr(StockOnHand, f) for f in on_hand_fields])
+    }
+    return mismatches + _compare(expected, stored, on_hand_fields)
+
+def _compare(expected, stored, fields):
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None:
+            mismatches.append({'key': key, 'problem': 'missing balance' if have is None else 'balance without transactions'})
+            continue
+        diffs = {f: (getattr(have, f), getattr(want, f)) for f in fields
+                 if abs((getattr(have, f) or 0.0) - (getattr(want, f) or 0.0)) > BALANCE_TOLERANCE}
+        if diffs:
+            mismatches.append({'key': key, 'problem': 'figures differ', 'stored_vs_expected': diffs})
+    return mismatches
@@ -1,31 +1,44 @@
 from flask import Blueprint, render_template, request, jsonify, send_file
 from flask_login import login_required, current_user
 from database import db
-from modules.stock_models import StockCategory, StockItem, StockTransaction, StockBalance
+from modules.stock_models import StockCategory, StockItem, StockTransaction, StockBalance, StockOnHand
 from modules.models import DutyStation
+from modules.excel_export import stream_excel, query_rows
+from modules.report_jobs import report_job, enqueue_job
+from modules.chart_renderer import chart_src
+from modules.pdf_service import render_pdf
+from modules.stock_import import import_stock_sheet
+from modules.stock_ledger import apply_transaction, track_item
+from modules.pagination import paginate, page_args, page_json, wants_page_json
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import pandas as pd
 from io import BytesIO
-import matplotlib.pyplot as plt
-import seaborn as sns
-import base64
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
+import logging
 
 stock_management_bp = Blueprint('stock_management', __name__)
 
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
 @stock_management_bp.route('/')
 @login_required
 def stock_management():
     duty_stations = DutyStation.query.all()
     categories = StockCategory.query.all()
+    # One keyset page of stock on hand per duty station tab
+    on_hand = StockOnHand.query.options(joinedload(StockOnHand.item).joinedload(StockItem.category))
+    cursor, size = page_args()
+    for ds in duty_stations:
+        if wants_page_json(f'station-{ds.id}'):
+            page = paginate(on_hand.filter(StockOnHand.duty_station_id == ds.id), (StockOnHand.item_id,), cursor, size)
+            return page_json(page, 'stock_on_hand_rows.html', on_hand=page.items)
+    pages = {ds.id: paginate(on_hand.filter(StockOnHand.duty_station_id == ds.id), (StockOnHand.item_id,), size=size)
+             for ds in duty_stations}
     items = StockItem.query.all()
-    balances = StockBalance.query.all()
     current_period = datetime.now().strftime('%Y-%m')
     return render_template('stock_management.html', duty_stations=duty_stations, categories=categories, 
-                           items=items, balances=balances, current_period=current_period)
+                           items=items, pages=pages, current_period=current_period)
 
 @stock_management_bp.route('/add_item', methods=['POST'])
 @login_required
@@ -40,9 +53,83 @@ def add_item():
         duty_station_id=int(duty_station_id), min_stock_level=float(min_stock_level)
     )
     db.session.add(item)
+    track_item(item)
     db.session.commit()
     return jsonify({'message': 'Item added successfully', 'item_id': item.id})
 
+ON_HAND_COLUMNS = (StockOnHand.item_id, StockOnHand.duty_station_id, StockOnHand.quantity, StockOnHand.value,
+                   StockOnHand.min_stock_level, StockOnHand.updated_at)
+ON_HAND_BATCH_LIMIT = 1000
+ON_HAND_CHUNK_SIZE = 400  # key pairs per query, keeping both IN lists under SQLite's variable limit
+
+def on_hand_row(row):
+    return {
+        'item_id': row.item_id,
+        'duty_station_id': row.duty_station_id,
+        'quantity': row.quantity,
+        'value': row.value,
+        'min_stock_level': row.min_stock_level,
+        'below_min': row.quantity < row.min_stock_level,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None
+    }
+
+@stock_management_bp.route('/on_hand/<int:item_id>', methods=['GET'])
+@login_required
+def on_hand(item_id):
+    """Current stock of one item, at one station or at every station holding it."""
+    query = db.session.query(*ON_HAND_COLUMNS).filter(StockOnHand.item_id == item_id)
+    duty_station_id = request.args.get('duty_station_id', type=int)
+    if duty_station_id is not None:
+        row = query.filter(StockOnHand.duty_station_id == duty_station_id).first()
+        if row is None:
+            return jsonify({'error': 'No stock record for this item at this duty station'}), 404
+        return jsonify(on_hand_row(row))
+    return jsonify({'item_id': item_id, 'stations': [on_hand_row(row) for row in query.all()]})
+
+@stock_management_bp.route('/on_hand', methods=['POST'])
+@login_required
+def on_hand_batch():
+    """Current stock for a batch of {"keys": [[item_id, duty_station_id], ...]}; unknown keys are listed as missing."""
+    data = request.get_json(silent=True) or {}
+    try:
+        keys = list(dict.fromkeys((int(item_id), int(station_id)) for item_id, station_id in data.get('keys', [])))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'keys must be a list of [item_id, duty_station_id] pairs'}), 400
+    if len(keys) > ON_HAND_BATCH_LIMIT:
+        return jsonify({'error': f'At most {ON_HAND_BATCH_LIMIT} keys per request'}), 400
+
+    # SQLite scans for row-value IN; item_id IN (...) searches the unique key index, and exact pairs are picked here
+    wanted = set(keys)
+    rows = []
+    for start in range(0, len(keys), ON_HAND_CHUNK_SIZE):
+        chunk = keys[start:start + ON_HAND_CHUNK_SIZE]
+        rows.extend(row for row in db.session.query(*ON_HAND_COLUMNS).filter(
+            StockOnHand.item_id.in_({item_id for item_id, _ in chunk}),
+            StockOnHand.duty_station_id.in_({station_id for _, station_id in chunk})
+        ) if (row.item_id, row.duty_station_id) in wanted)
+    found = {(row.item_id, row.duty_station_id) for row in rows}
+    return jsonify({
+        'on_hand': [on_hand_row(row) for row in rows],
+        'missing': [list(key) for key in keys if key not in found]
+    })
+
+@stock_management_bp.route('/alerts/below_min', methods=['GET'])
+@login_required
+def below_min_alerts():
+    # Matches the partial index ix_stock_on_hand_below_min, so only short rows are read
+    query = db.session.query(*ON_HAND_COLUMNS, StockItem.name, StockItem.unit_of_measure).join(
+        StockItem, StockItem.id == StockOnHand.item_id
+    ).filter(StockOnHand.quantity < StockOnHand.min_stock_level)
+    duty_station_id = request.args.get('duty_station_id', type=int)
+    if duty_station_id is not None:
+        query = query.filter(StockOnHand.duty_station_id == duty_station_id)
+    alerts = [
+        dict(on_hand_row(row), name=row.name, unit_of_measure=row.unit_of_measure,
+             shortfall=row.min_stock_level - row.quantity)
+        for row in query.order_by(StockOnHand.duty_station_id, StockOnHand.item_id).all()
+    ]
+    return jsonify({'count': len(alerts), 'alerts': alerts})
+
 @stock_management_bp.route('/record_transaction', methods=['POST'])
 @login_required
 def record_transaction():
@@ -60,24 +147,7 @@ def record_transaction():
         transaction_date=date
     )
     db.session.add(transaction)
-    
-    period = date.strftime('%Y-%m')
-    balance = StockBalance.query.filter_by(item_id=item_id, period=period, duty_station_id=duty_station_id).first()
-    if not balance:
-        prev_period = (date.replace(day=1) - pd.Timedelta(days=1)).strftime('%Y-%m')
-        prev_balance = StockBalance.query.filter_by(item_id=item_id, period=prev_period, duty_station_id=duty_station_id).first()
-        beginning_quantity = prev_balance.ending_quantity if prev_balance else 0.0
-        beginning_value = prev_balance.ending_value if prev_balance else 0.0
-        balance = StockBalance(item_id=item_id, duty_station_id=duty_station_id, period=period,
-                               beginning_quantity=beginning_quantity, beginning_value=beginning_value)
-        db.session.add(balance)
-    
-    if transaction_type == 'IN':
-        balance.ending_quantity = balance.beginning_quantity + quantity
-        balance.ending_value = balance.beginning_value + (quantity * unit_price)
-    elif transaction_type == 'OUT':
-        balance.ending_quantity = balance.beginning_quantity - quantity
-        balance.ending_value = balance.beginning_value - (quantity * unit_price)
+    apply_transaction(transaction)
     db.session.commit()
     return jsonify({'message': 'Transaction recorded successfully'})
 
@@ -90,185 +160,106 @@ def upload_excel():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    df = pd.read_excel(file)
-    for _, row in df.iterrows():
-        item_name = row['Item']
-        duty_station_name = row['Duty Station']
-        category_name = row.get('Category', 'Uncategorized')
-        transaction_type = row['Transaction Type']
-        quantity = float(row['Quantity'])
-        unit_price = float(row.get('Unit Price', 0.0))
-        date_str = row['Date']
-        date = pd.to_datetime(date_str).to_pydatetime()
-
-        duty_station = DutyStation.query.filter_by(name=duty_station_name).first()
-        if not duty_station:
-            duty_station = DutyStation(name=duty_station_name)
-            db.session.add(duty_station)
-            db.session.commit()
-
-        category = StockCategory.query.filter_by(name=category_name).first()
-        if not category:
-            category = StockCategory(name=category_name)
-            db.session.add(category)
-            db.session.commit()
+    try:
+        result = import_stock_sheet(pd.read_excel(file))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Stock import failed: {str(e)}")
+        return jsonify({'error': f'Import failed, no rows were saved: {str(e)}'}), 500
 
-        item = StockItem.query.filter_by(name=item_name, duty_station_id=duty_station.id).first()
-        if not item:
-            item = StockItem(name=item_name, category_id=category.id, unit_of_measure='unit', duty_station_id=duty_station.id)
-            db.session.add(item)
-            db.session.commit()
+    message = f"Excel data uploaded successfully: {result['imported']} rows imported"
+    if result['rejected_count']:
+        message += f", {result['rejected_count']} rows rejected"
+    return jsonify(dict(result, message=message))
 
-        transaction = StockTransaction(
-            item_id=item.id, transaction_type=transaction_type, quantity=quantity,
-            unit_price=unit_price, total_value=quantity * unit_price, duty_station_id=duty_station.id,
-            transaction_date=date
-        )
-        db.session.add(transaction)
-
-        period = date.strftime('%Y-%m')
-        balance = StockBalance.query.filter_by(item_id=item.id, period=period, duty_station_id=duty_station.id).first()
-        if not balance:
-            prev_period = (date.replace(day=1) - pd.Timedelta(days=1)).strftime('%Y-%m')
-            prev_balance = StockBalance.query.filter_by(item_id=item.id, period=prev_period, duty_station_id=duty_station.id).first()
-            beginning_quantity = prev_balance.ending_quantity if prev_balance else 0.0
-            beginning_value = prev_balance.ending_value if prev_balance else 0.0
-            balance = StockBalance(item_id=item.id, duty_station_id=duty_station.id, period=period,
-                                   beginning_quantity=beginning_quantity, beginning_value=beginning_value)
-            db.session.add(balance)
+@report_job('stock_management.report')
+def build_stock_report(params):
+    duty_station_id = params.get('duty_station_id')
+    filter_type = params.get('filter_type', 'month')
+    period = params.get('period', datetime.now().strftime('%Y-%m'))
+    
+    # Same balances as the exports; the month view is also narrowed to the chosen station
+    query = balance_query(duty_station_id, period, filter_type).options(joinedload(StockBalance.item), joinedload(StockBalance.duty_station))
+    if duty_station_id:
+        query = query.filter(StockBalance.duty_station_id == duty_station_id)
+    balances = query.all()
 
-        if transaction_type == 'IN':
-            balance.ending_quantity = balance.beginning_quantity + quantity
-            balance.ending_value = balance.beginning_value + (quantity * unit_price)
-        elif transaction_type == 'OUT':
-            balance.ending_quantity = balance.beginning_quantity - quantity
-            balance.ending_value = balance.beginning_value - (quantity * unit_price)
+    data = [{'Item': b.item.name, 'Duty Station': b.duty_station.name, 'Beginning Qty': b.beginning_quantity,
+             'Beginning Value': b.beginning_value, 'Ending Qty': b.ending_quantity, 'Ending Value': b.ending_value}
+            for b in balances]
+    df = pd.DataFrame(data)
+    
+    bar_chart = chart_src(df, {
+        'kind': 'bar', 'x': 'Duty Station', 'y': 'Ending Value', 'hue': 'Item', 'palette': 'viridis',
+        'figsize': (12, 6), 'grid': True, 'title': f"Stock Value by Duty Station ({period})", 'title_size': 16, 'title_pad': 20,
+        'xlabel': "Duty Station", 'ylabel': "Ending Value (ETB)", 'label_size': 12, 'legend_title': "Item"
+    })
 
-    db.session.commit()
-    return jsonify({'message': 'Excel data uploaded successfully'})
+    return {'data': data, 'bar_chart': bar_chart}, f'stock_report_{period}.json'
 
 @stock_management_bp.route('/report', methods=['GET'])
 @login_required
 def report():
-    duty_station_id = request.args.get('duty_station_id')
-    filter_type = request.args.get('filter_type', 'month')
-    period = request.args.get('period', datetime.now().strftime('%Y-%m'))
-    
+    if request.args.get('async'):
+        return enqueue_job('stock_management.report', request.args.to_dict())
+    result, _ = build_stock_report(request.args)
+    return jsonify(result)
+
+BALANCE_COLUMNS = ['Item', 'Duty Station', 'Beginning Qty', 'Beginning Value', 'Ending Qty', 'Ending Value']
+
+def balance_query(duty_station_id, period, filter_type):
     if filter_type == 'year':
-        balances = StockBalance.query.filter(StockBalance.period.like(f'{period}%'), 
-                                             StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
+        return StockBalance.query.filter(StockBalance.period.like(f'{period}%'), 
+                                         StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id))
     elif filter_type == 'quarter':
         year, quarter = period.split('-Q')
         start_month = (int(quarter) - 1) * 3 + 1
         end_month = start_month + 2
-        balances = StockBalance.query.filter(StockBalance.period.between(f'{year}-{start_month:02d}', f'{year}-{end_month:02d}'),
-                                             StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
+        return StockBalance.query.filter(StockBalance.period.between(f'{year}-{start_month:02d}', f'{year}-{end_month:02d}'),
+                                         StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id))
     elif filter_type == 'daily':
-        balances = StockBalance.query.join(StockTransaction).filter(StockTransaction.transaction_date == period,
-                                                                    StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    else:  # month
-        balances = StockBalance.query.filter_by(period=period, duty_station_id=duty_station_id).all() if duty_station_id else StockBalance.query.filter_by(period=period).all()
+        return StockBalance.query.join(StockTransaction).filter(StockTransaction.transaction_date == period,
+                                                                StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id))
+    return StockBalance.query.filter_by(period=period)
 
-    data = [{'Item': b.item.name, 'Duty Station': b.duty_station.name, 'Beginning Qty': b.beginning_quantity,
-             'Beginning Value': b.beginning_value, 'Ending Qty': b.ending_quantity, 'Ending Value': b.ending_value}
-            for b in balances]
-    df = pd.DataFrame(data)
-    
-    plt.figure(figsize=(12, 6))
-    sns.set_style("whitegrid")
-    sns.barplot(x='Duty Station', y='Ending Value', hue='Item', data=df, palette="viridis")
-    plt.title(f"Stock Value by Duty Station ({period})", fontsize=16, pad=20)
-    plt.xlabel("Duty Station", fontsize=12)
-    plt.ylabel("Ending Value (ETB)", fontsize=12)
-    plt.legend(title="Item", bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    bar_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    plt.close()
-    
-    return jsonify({'data': data, 'bar_chart': bar_chart})
+def balance_row(b):
+    return [b.item.name, b.duty_station.name, b.beginning_quantity, b.beginning_value, b.ending_quantity, b.ending_value]
+
+@report_job('stock_management.export_excel')
+def build_stock_excel(params):
+    duty_station_id = params.get('duty_station_id')
+    period = params.get('period', datetime.now().strftime('%Y-%m'))
+    filter_type = params.get('filter_type', 'month')
+
+    query = balance_query(duty_station_id, period, filter_type).options(joinedload(StockBalance.item), joinedload(StockBalance.duty_station))
+    sheets = [(ds.name, BALANCE_COLUMNS, query_rows(query.filter(StockBalance.duty_station_id == ds.id), balance_row)) for ds in DutyStation.query.all()]
+    sheets.append(('Summary', BALANCE_COLUMNS, query_rows(query, balance_row)))
+    return sheets, f'stock_{period}.xlsx'
 
 @stock_management_bp.route('/export_excel', methods=['GET'])
 @login_required
 def export_excel():
-    duty_station_id = request.args.get('duty_station_id')
-    period = request.args.get('period', datetime.now().strftime('%Y-%m'))
-    filter_type = request.args.get('filter_type', 'month')
-    
-    if filter_type == 'year':
-        balances = StockBalance.query.filter(StockBalance.period.like(f'{period}%'), 
-                                             StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    elif filter_type == 'quarter':
-        year, quarter = period.split('-Q')
-        start_month = (int(quarter) - 1) * 3 + 1
-        end_month = start_month + 2
-        balances = StockBalance.query.filter(StockBalance.period.between(f'{year}-{start_month:02d}', f'{year}-{end_month:02d}'),
-                                             StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    elif filter_type == 'daily':
-        balances = StockBalance.query.join(StockTransaction).filter(StockTransaction.transaction_date == period,
-                                                                    StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    else:
-        balances = StockBalance.query.filter_by(period=period).all()
+    if request.args.get('async'):
+        return enqueue_job('stock_management.export_excel', request.args.to_dict())
+    sheets, download_name = build_stock_excel(request.args)
+    return stream_excel(sheets, download_name)
 
-    data = [{'Item': b.item.name, 'Duty Station': b.duty_station.name, 'Beginning Qty': b.beginning_quantity,
-             'Beginning Value': b.beginning_value, 'Ending Qty': b.ending_quantity, 'Ending Value': b.ending_value}
-            for b in balances]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for ds in DutyStation.query.all():
-            ds_data = df[df['Duty Station'] == ds.name]
-            ds_data.to_excel(writer, sheet_name=ds.name, index=False)
-        df.to_excel(writer, sheet_name='Summary', index=False)
-    output.seek(0)
-    return send_file(output, download_name=f'stock_{period}.xlsx', as_attachment=True)
+@report_job('stock_management.export_pdf')
+def build_stock_pdf(params):
+    duty_station_id = params.get('duty_station_id')
+    period = params.get('period', datetime.now().strftime('%Y-%m'))
+    filter_type = params.get('filter_type', 'month')
+    
+    query = balance_query(duty_station_id, period, filter_type).options(joinedload(StockBalance.item), joinedload(StockBalance.duty_station))
+    data = [BALANCE_COLUMNS] + [balance_row(b) for b in query]
+    output = BytesIO(render_pdf(title=f"Stock Report ({period})", tables=[{'rows': data, 'header_font_size': 14}]))
+    return output, f'stock_{period}.pdf'
 
 @stock_management_bp.route('/export_pdf', methods=['GET'])
 @login_required
 def export_pdf():
-    duty_station_id = request.args.get('duty_station_id')
-    period = request.args.get('period', datetime.now().strftime('%Y-%m'))
-    filter_type = request.args.get('filter_type', 'month')
-    
-    if filter_type == 'year':
-        balances = StockBalance.query.filter(StockBalance.period.like(f'{period}%'), 
-                                             StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    elif filter_type == 'quarter':
-        year, quarter = period.split('-Q')
-        start_month = (int(quarter) - 1) * 3 + 1
-        end_month = start_month + 2
-        balances = StockBalance.query.filter(StockBalance.period.between(f'{year}-{start_month:02d}', f'{year}-{end_month:02d}'),
-                                             StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    elif filter_type == 'daily':
-        balances = StockBalance.query.join(StockTransaction).filter(StockTransaction.transaction_date == period,
-                                                                    StockBalance.duty_station_id == (duty_station_id if duty_station_id else StockBalance.duty_station_id)).all()
-    else:
-        balances = StockBalance.query.filter_by(period=period).all()
-
-    data = [['Item', 'Duty Station', 'Beginning Qty', 'Beginning Value', 'Ending Qty', 'Ending Value']]
-    data.extend([b.item.name, b.duty_station.name, b.beginning_quantity, b.beginning_value, b.ending_quantity, b.ending_value] for b in balances)
-
-    output = BytesIO()
-    doc = SimpleDocTemplate(output, pagesize=letter)
-    elements = []
-
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph(f"Stock Report ({period})", styles['Title']))
-    elements.append(Spacer(1, 12))
-
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(table)
-    doc.build(elements)
-    output.seek(0)
-    return send_file(output, download_name=f'stock_{period}.pdf', as_attachment=True)
\ No newline at end of file
+    if request.args.get('async'):
+        return enqueue_job('stock_management.export_pdf', request.args.to_dict())
+    output, download_name = build_stock_pdf(request.args)
+    return send_file(output, download_name=download_name, as_attachment=True)
\ No newline at end of file
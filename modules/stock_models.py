@@ -51,4 +51,26 @@ class StockBalance(db.Model):
     ending_quantity = db.Column(db.Float, default=0.0)
     ending_value = db.Column(db.Float, default=0.0)
     item = db.relationship('StockItem', backref='balances')
-    duty_station = db.relationship('DutyStation', backref='balances')
\ No newline at end of file
+    duty_station = db.relationship('DutyStation', backref='balances')
+    __table_args__ = (
+        db.UniqueConstraint('item_id', 'duty_station_id', 'period', name='uq_stock_balance_key'),
+    )
+
+# Current quantity per item and station, kept in step with every stock transaction (see modules/stock_ledger.py)
+class StockOnHand(db.Model):
+    __tablename__ = 'stock_on_hand'
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('stock_items.id'), nullable=False)
+    duty_station_id = db.Column(db.Integer, db.ForeignKey('duty_stations.id'), nullable=False)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    value = db.Column(db.Float, nullable=False, default=0.0)
+    min_stock_level = db.Column(db.Float, nullable=False, default=0.0)  # copied from the item so alerts need no join
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    item = db.relationship('StockItem', backref='on_hand')
+    duty_station = db.relationship('DutyStation')
+    __table_args__ = (
+        db.UniqueConstraint('item_id', 'duty_station_id', name='uq_stock_on_hand_key'),
+        db.Index('ix_stock_on_hand_station_item', 'duty_station_id', 'item_id'),
+        # Partial index holding only the rows below their minimum, so the alert query reads nothing else
+        db.Index('ix_stock_on_hand_below_min', 'duty_station_id', 'item_id', sqlite_where=db.text('quantity < min_stock_level')),
+    )
@@ -0,0 +1,7 @@
+from main import app, db
+from modules.machine_capacity import rebuild_machine_capacity
+
+with app.app_context():
+    db.create_all()
+    rows = rebuild_machine_capacity()
+    print(f"Machine capacity rebuilt with {rows} rows.")
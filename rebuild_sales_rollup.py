@@ -0,0 +1,7 @@
+from main import app, db
+from modules.sales_rollup import rebuild_sales_rollup
+
+with app.app_context():
+    db.create_all()
+    rows = rebuild_sales_rollup()
+    print(f"Sales rollup rebuilt with {rows} rows.")
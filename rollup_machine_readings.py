@@ -0,0 +1,11 @@
+from main import app, db
+from modules.machine_readings import rollup_machine_readings
+from modules.production_rollups import rollup_production, prune_production_rollups
+
+with app.app_context():
+    db.create_all()
+    readings = rollup_machine_readings()
+    print(f"Rolled up {readings} machine readings into production records.")
+    readings = rollup_production()
+    print(f"Rolled up {readings} machine readings into production rollups.")
+    print(f"Pruned: {prune_production_rollups()}")
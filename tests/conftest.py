@@ -0,0 +1,21 @@
+import pytest
+from flask import Flask
+from database import db
+import modules.models  # noqa: F401 - registers the tables
+import modules.production_models  # noqa: F401
+import modules.purchasing_models  # noqa: F401
+import modules.stock_models  # noqa: F401
+
+@pytest.fixture
+def app(tmp_path):
+    """A bare app on its own sqlite file, without the blueprints main.py wires up."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'test.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,36 @@
+from datetime import date
+from modules.machine_capacity import machine_period_capacity, periods_between
+
+MACHINE = {'installed_capacity': 100.0, 'efficiency_factor': 0.8, 'manual_capacity': None}
+CONFIG_ONLY = {'config': {'working_hours': 8.0, 'working_days': 25}, 'weekday_hours': {}, 'holidays': set()}
+
+def planned(period_type, start_date, end_date, station=CONFIG_ONLY):
+    return sum(machine_period_capacity(MACHINE, station, period_type, period)[1]
+               for period in periods_between(period_type, start_date, end_date))
+
+def test_config_plan_scales_with_period_length():
+    # March 2024 runs Friday 1st to Sunday 31st: 26 working days, and ISO weeks 9-13 cover Feb 26 - Mar 31
+    monthly = planned('Monthly', date(2024, 3, 1), date(2024, 3, 31))
+    assert monthly == 100.0 * 0.8 * 8.0 * 26
+    assert planned('Daily', date(2024, 3, 1), date(2024, 3, 31)) == monthly
+    assert planned('Weekly', date(2024, 3, 4), date(2024, 3, 31)) == planned('Daily', date(2024, 3, 4), date(2024, 3, 31))
+    assert machine_period_capacity(MACHINE, CONFIG_ONLY, 'Daily', '2024-03-03')[1] == 0.0  # Sunday
+
+def test_shifts_and_holidays_apply_to_every_period_type():
+    station = {'config': None, 'weekday_hours': {0: 16.0, 1: 16.0, 2: 16.0, 3: 16.0, 4: 16.0}, 'holidays': {date(2024, 3, 8)}}
+    monthly = planned('Monthly', date(2024, 3, 1), date(2024, 3, 31), station)
+    assert monthly == 100.0 * 0.8 * 16.0 * 20
+    assert planned('Daily', date(2024, 3, 1), date(2024, 3, 31), station) == monthly
+
+def test_manual_capacity_is_monthly_and_scales_with_period():
+    manual = dict(MACHINE, manual_capacity=520.0)
+    assert machine_period_capacity(manual, CONFIG_ONLY, 'Monthly', '2024-03') == (8.0 * 26, 520.0)
+    # March 2024 has 26 working days, so each one plans a 26th of the month
+    assert machine_period_capacity(manual, CONFIG_ONLY, 'Daily', '2024-03-01') == (8.0, 20.0)
+    assert machine_period_capacity(manual, CONFIG_ONLY, 'Daily', '2024-03-03') == (0.0, 0.0)
+    daily = sum(machine_period_capacity(manual, CONFIG_ONLY, 'Daily', period)[1] for period in periods_between('Daily', date(2024, 3, 1), date(2024, 3, 31)))
+    assert round(daily, 6) == 520.0
+    assert machine_period_capacity(manual, CONFIG_ONLY, 'Quarterly', '2024-Q1')[1] == 3 * 520.0
+
+def test_missing_plan():
+    assert machine_period_capacity(MACHINE, {'config': None, 'weekday_hours': {}, 'holidays': set()}, 'Monthly', '2024-03') is None
@@ -0,0 +1,54 @@
+from database import db
+from modules.models import DutyStation
+from modules.stock_models import StockCategory, StockItem
+from modules.pagination import paginate, cached_count
+
+LEVELS = [5.0, None, 3.0, 5.0, None, 3.0, 3.0, 8.0, None, 5.0, 1.0]
+
+def add_items(levels):
+    # db.null() because a plain None would take the column's 0.0 default
+    station = DutyStation(name='Sendafa')
+    category = StockCategory(name='Consumables')
+    db.session.add_all([station, category])
+    db.session.flush()
+    db.session.add_all([
+        StockItem(name=f'Item {number}', unit_of_measure='Pcs', category_id=category.id,
+                  duty_station_id=station.id, min_stock_level=db.null() if level is None else level)
+        for number, level in enumerate(levels)
+    ])
+    db.session.commit()
+
+def walk(query, order_by, size, descending):
+    seen, cursor = [], None
+    while True:
+        page = paginate(query, order_by, cursor=cursor, size=size, descending=descending)
+        seen.extend(item.id for item in page.items)
+        if not page.has_more:
+            return seen
+        cursor = page.next_cursor
+
+def test_keyset_walk_with_ties_and_nulls_visits_every_row_once(app):
+    add_items(LEVELS)
+    items = StockItem.query.all()
+    assert sum(item.min_stock_level is None for item in items) == 3
+    order_by = (StockItem.min_stock_level, StockItem.id)
+    # SQLite sorts NULLs first ascending and last descending
+    ascending = [item.id for item in sorted(items, key=lambda item: (item.min_stock_level is not None, item.min_stock_level or 0, item.id))]
+    for size in (1, 2, 3, 4, len(items)):
+        assert walk(StockItem.query, order_by, size, descending=True) == ascending[::-1]
+        assert walk(StockItem.query, order_by, size, descending=False) == ascending
+
+def test_count_refreshes_after_core_update(app):
+    add_items(LEVELS)
+    query = StockItem.query.filter(StockItem.min_stock_level >= 3.0)
+    assert cached_count(query) == 7
+    assert paginate(query, (StockItem.id,), size=2).total == 7
+
+    db.session.execute(db.update(StockItem).where(StockItem.min_stock_level.is_(None)).values(min_stock_level=4.0))
+    assert cached_count(query) == 7  # not committed yet
+    db.session.commit()
+    assert cached_count(query) == 10
+
+    db.session.execute(db.delete(StockItem).where(StockItem.min_stock_level == 5.0))
+    db.session.commit()
+    assert paginate(query, (StockItem.id,), size=2).total == 7
@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta
+import pytest
+from database import db
+from modules.models import DutyStation
+from modules.production_models import Machine, MachineReading, ProductionRollup
+from modules.production_rollups import rollup_cover, rollup_filter, metered_window, prune_production_rollups, bucket
+from modules.machine_readings import buffer_readings, flush_readings
+
+KEEP_EVERYTHING = 100000
+
+def covered_days(spans):
+    days = []
+    for granularity, first, last in spans:
+        day = date.fromisoformat(first + {'year': '-01-01', 'month': '-01', 'day': ''}[granularity])
+        while bucket(granularity, day) <= last:
+            days.append(day)
+            day += timedelta(days=1)
+    return days
+
+def test_rollup_cover_is_exact_and_short():
+    starts = [date(2021, 1, 1), date(2021, 1, 31), date(2021, 3, 15), date(2021, 12, 31)]
+    ends = [date(2021, 12, 30), date(2022, 1, 1), date(2023, 2, 28), date(2023, 12, 31), date(2024, 6, 9)]
+    for start in starts:
+        for end in ends:
+            spans = rollup_cover(start, end)
+            assert len(spans) <= 5
+            assert sorted(covered_days(spans)) == [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+@pytest.fixture
+def metered(app):
+    app.config.update(MACHINE_READING_BATCH_SIZE=KEEP_EVERYTHING, MACHINE_READING_FLUSH_SECONDS=3600,
+                      MACHINE_READING_RETENTION_DAYS=KEEP_EVERYTHING, PRODUCTION_HOUR_RETENTION_DAYS=KEEP_EVERYTHING,
+                      PRODUCTION_DAY_RETENTION_DAYS=KEEP_EVERYTHING)
+    station = DutyStation(name='Kality')
+    db.session.add(station)
+    db.session.flush()
+    machines = [Machine(name=name, duty_station_id=station.id, process_type='Extrusion', installed_capacity=100.0)
+                for name in ('Extruder 1', 'Extruder 2')]
+    db.session.add_all(machines)
+    db.session.commit()
+
+    # A reading every five hours per machine from late 2022 into 2024, sent in two batches
+    readings, moment = [], datetime(2022, 12, 20, 3)
+    while moment < datetime(2024, 2, 10):
+        for machine in machines:
+            readings.append({'machine_id': machine.id, 'timestamp': moment, 'quantity': float(moment.hour + machine.id)})
+        moment += timedelta(hours=5)
+    half = len(readings) // 2
+    for batch in (readings[:half], readings[half:]):
+        assert buffer_readings(batch) == len(batch)
+        assert flush_readings() == len(batch)
+    return readings
+
+def raw_total(readings, start_date, end_date):
+    return sum(reading['quantity'] for reading in readings if start_date <= reading['timestamp'].date() <= end_date)
+
+def rollup_total(start_date, end_date, today):
+    return db.session.query(db.func.coalesce(db.func.sum(ProductionRollup.quantity), 0.0)).filter(
+        rollup_filter(start_date, end_date, today)).scalar()
+
+def level_totals(granularity):
+    return dict(db.session.query(ProductionRollup.bucket, db.func.sum(ProductionRollup.quantity)).filter(
+        ProductionRollup.granularity == granularity).group_by(ProductionRollup.bucket).all())
+
+def test_buffered_readings_roll_up_to_every_level(metered):
+    for granularity in ('day', 'month', 'year'):
+        expected = {}
+        for reading in metered:
+            key = bucket(granularity, reading['timestamp'].date())
+            expected[key] = expected.get(key, 0.0) + reading['quantity']
+        assert level_totals(granularity) == pytest.approx(expected)
+    assert db.session.query(db.func.sum(ProductionRollup.reading_count)).filter(
+        ProductionRollup.granularity == 'year').scalar() == len(metered)
+
+    today = date(2024, 3, 1)
+    for start, end in ((date(2023, 12, 10), date(2024, 1, 20)), (date(2022, 12, 25), date(2024, 2, 5)),
+                       (date(2023, 1, 1), date(2023, 12, 31)), (date(2022, 12, 31), date(2024, 1, 1))):
+        assert rollup_total(start, end, today) == pytest.approx(raw_total(metered, start, end))
+
+def test_totals_survive_pruning(app, metered):
+    months, years = level_totals('month'), level_totals('year')
+    app.config.update(PRODUCTION_DAY_RETENTION_DAYS=730, PRODUCTION_HOUR_RETENTION_DAYS=30, MACHINE_READING_RETENTION_DAYS=90)
+    today = date(2024, 1, 15) + timedelta(days=730)
+    removed = prune_production_rollups(today=today)
+    assert removed['readings'] == len(metered)
+    assert db.session.query(MachineReading).count() == 0
+    assert min(level_totals('day')) == '2024-01-15'
+    assert level_totals('month') == months and level_totals('year') == years
+
+    # Pruned days of partial months are clipped off; everything else still matches the raw readings
+    for start, end, window in ((date(2022, 12, 25), date(2024, 2, 5), (date(2023, 1, 1), date(2024, 2, 5))),
+                               (date(2023, 12, 10), date(2024, 1, 20), (date(2024, 1, 15), date(2024, 1, 20))),
+                               (date(2023, 6, 1), date(2024, 1, 20), (date(2023, 6, 1), date(2023, 12, 31))),
+                               (date(2023, 1, 1), date(2024, 1, 31), (date(2023, 1, 1), date(2024, 1, 31)))):
+        assert metered_window(start, end, today) == window
+        assert rollup_total(start, end, today) == pytest.approx(raw_total(metered, *window))
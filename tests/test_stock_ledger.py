@@ -0,0 +1,47 @@
+from datetime import datetime
+from database import db
+from modules.models import DutyStation
+from modules.stock_models import StockCategory, StockItem, StockTransaction, StockBalance, StockOnHand
+from modules.stock_ledger import apply_transaction, track_item, verify_stock_balances
+
+def post(item, transaction_type, quantity, unit_price, when):
+    transaction = StockTransaction(item_id=item.id, duty_station_id=item.duty_station_id, transaction_type=transaction_type,
+                                   quantity=quantity, unit_price=unit_price, total_value=quantity * unit_price,
+                                   transaction_date=when)
+    db.session.add(transaction)
+    apply_transaction(transaction)
+    db.session.commit()
+
+def balances(item):
+    return {
+        balance.period: (balance.beginning_quantity, balance.beginning_value, balance.ending_quantity, balance.ending_value)
+        for balance in StockBalance.query.filter_by(item_id=item.id, duty_station_id=item.duty_station_id)
+    }
+
+def test_back_dated_transactions_cascade_into_later_periods(app):
+    station = DutyStation(name='Sendafa')
+    category = StockCategory(name='Raw Material')
+    db.session.add_all([station, category])
+    db.session.flush()
+    item = StockItem(name='Resin', unit_of_measure='Kg', category_id=category.id, duty_station_id=station.id, min_stock_level=5.0)
+    db.session.add(item)
+    track_item(item)
+    db.session.commit()
+
+    post(item, 'IN', 10, 2.0, datetime(2024, 3, 5))
+    post(item, 'OUT', 4, 2.0, datetime(2024, 5, 20))
+    assert balances(item) == {'2024-03': (0, 0, 10, 20), '2024-05': (10, 20, 6, 12)}
+
+    # A receipt dated before every stored period, then one landing between them
+    post(item, 'IN', 20, 1.5, datetime(2024, 1, 15))
+    post(item, 'ADJUST', -2, 1.5, datetime(2024, 4, 1))
+    assert balances(item) == {
+        '2024-01': (0, 0, 20, 30),
+        '2024-03': (20, 30, 30, 50),
+        '2024-04': (30, 50, 28, 47),
+        '2024-05': (28, 47, 24, 39),
+    }
+
+    on_hand = StockOnHand.query.filter_by(item_id=item.id, duty_station_id=station.id).one()
+    assert (on_hand.quantity, on_hand.value, on_hand.min_stock_level) == (24, 39, 5.0)
+    assert verify_stock_balances() == []
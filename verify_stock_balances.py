@@ -0,0 +1,13 @@
+import sys
+from main import app, db
+from modules.stock_ledger import verify_stock_balances, rebuild_stock_balances
+
+with app.app_context():
+    db.create_all()
+    mismatches = verify_stock_balances()
+    for mismatch in mismatches:
+        print(mismatch)
+    print(f"{len(mismatches)} stock balance mismatches found.")
+    if mismatches and '--fix' in sys.argv:
+        rows = rebuild_stock_balances()
+        print(f"Stock balances rebuilt with {rows} rows.")